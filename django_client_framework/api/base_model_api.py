@@ -9,6 +9,7 @@ from uuid import UUID
 import orjson
 from django.conf import settings
 from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import InvalidPage, Page
 from django.db.models.base import Model
 from django.db.models.fields import Field
 from django.db.models.fields.related import ForeignKey, ManyToManyField
@@ -39,9 +40,22 @@ from django_client_framework.models.abstract.user import DCFAbstractUser
 from .. import exceptions as e
 from ..models.abstract.rate_limited import RateLimited
 from ..models.abstract.serializable import ISerializable
+from ..permissions.context import permission_context
 from ..permissions.site_permission import has_perms_shortcut
 from ..serializers import DCFSerializer, SerializerContext
-from .filter_backend import DCFFilterBackend
+from .count_strategy import (
+    COUNT_QUERY_PARAM,
+    ESTIMATE,
+    EXACT,
+    NONE,
+    capped_count,
+    estimate_count,
+    get_count_cap,
+    get_count_strategy,
+)
+from .cursor_pagination import CURSOR_QUERY_PARAM, CursorPage, paginate_by_cursor
+from .filter_backend import DCFFilterBackend, get_ordering
+from .parallel_count import count_in_background, parallel_count_enabled
 
 LOG = getLogger(__name__)
 
@@ -65,12 +79,164 @@ class ApiPagination(PageNumberPagination):
     page_size = 50
     max_page_size = 200
 
+    # the page when paginating by cursor, see cursor_pagination
+    cursor_page: Optional[CursorPage] = None
+    # see count_strategy
+    count_strategy: str = EXACT
+    page_number: int = 1
+    has_next: bool = False
+    objects_count: int = 0
+    # whether objects_count stopped at get_count_cap()
+    count_capped: bool = False
+    # whether objects_count is an estimate of the query planner
+    count_estimated: bool = False
+
+    @overrides(PageNumberPagination)
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view: Optional[APIView] = None
+    ) -> Optional[List[Any]]:
+        if CURSOR_QUERY_PARAM in request.query_params:
+            self.request = request
+            limit = self.get_page_size(request)
+            assert limit is not None
+            self.cursor_page = paginate_by_cursor(
+                queryset,
+                request.query_params[CURSOR_QUERY_PARAM],
+                get_ordering(request),
+                limit,
+            )
+            return self.cursor_page.objects
+        self.count_strategy = get_count_strategy(request, queryset.model)
+        if self.count_strategy != EXACT:
+            return self.__paginate_without_exact_count(queryset, request)
+        if parallel_count_enabled(queryset):
+            return self.__paginate_with_parallel_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def __paginate_with_parallel_count(
+        self, queryset: QuerySet, request: Request
+    ) -> List[Any]:
+        """Counts the objects on another thread while fetching the page,
+        assuming that the page number is valid, which is checked after."""
+        self.request = request
+        limit = self.get_page_size(request)
+        assert limit is not None
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if (count := count_in_background(queryset)) is None:
+            # every worker is busy
+            return super().paginate_queryset(queryset, request)
+        objects = None
+        try:
+            number = int(page_number)
+        except ValueError:
+            # such as "last", which needs the count
+            number = 0
+        if number > 0:
+            objects = list(queryset[(number - 1) * limit : number * limit])
+        paginator = self.django_paginator_class(queryset, limit)
+        # the paginator reuses the count
+        paginator.count = count.result()
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        if objects is None:
+            self.page = paginator.page(number)
+        else:
+            self.page = Page(objects, number, paginator)
+        return list(self.page)
+
+    def __paginate_without_exact_count(
+        self, queryset: QuerySet, request: Request
+    ) -> List[Any]:
+        """Fetches one object past the page to tell if there is a next page,
+        and counts the objects as little as the count strategy allows."""
+        self.request = request
+        limit = self.get_page_size(request)
+        assert limit is not None
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            raise e.ParseError(
+                f"{self.page_query_param}={page_number} needs "
+                f"{COUNT_QUERY_PARAM}={EXACT}"
+            )
+        try:
+            self.page_number = int(page_number)
+        except ValueError:
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound("Invalid page.")
+        offset = (self.page_number - 1) * limit
+        objects = list(queryset[offset : offset + limit + 1])
+        self.has_next = len(objects) > limit
+        objects = objects[:limit]
+        if not objects and self.page_number > 1:
+            raise NotFound("Invalid page.")
+        if self.count_strategy == NONE:
+            return objects
+        if not self.has_next:
+            # the last page tells the exact count
+            self.objects_count = offset + len(objects)
+            return objects
+        cap = get_count_cap()
+        seen = offset + len(objects) + 1
+        if self.count_strategy == ESTIMATE:
+            count, self.count_estimated = estimate_count(queryset, cap)
+        elif seen > cap:
+            # past the cap, counting cannot tell more than the page did
+            count = cap + 1
+        else:
+            count = capped_count(queryset, cap)
+        if not self.count_estimated and count > cap:
+            count = cap
+            self.count_capped = True
+        # an estimate or a cap can be below the objects already seen
+        self.objects_count = max(count, seen)
+        return objects
+
     @overrides(PageNumberPagination)
     def get_paginated_response(self, data: Any) -> Response:
-        assert self.page is not None
+        if self.cursor_page is not None:
+            assert self.request is not None
+            return Response(
+                {
+                    "limit": self.get_page_size(self.request),
+                    "next_cursor": self.cursor_page.next_cursor,
+                    "objects": data,
+                }
+            )
         assert self.request is not None
         limit = self.get_page_size(self.request)
         assert limit is not None
+        if self.count_strategy == NONE:
+            return Response(
+                {
+                    "page": self.page_number,
+                    "limit": limit,
+                    "has_next": self.has_next,
+                    "objects": data,
+                }
+            )
+        if self.count_strategy != EXACT:
+            return Response(
+                {
+                    "page": self.page_number,
+                    "limit": limit,
+                    "objects_count": self.objects_count,
+                    "objects_count_capped": self.count_capped,
+                    "objects_count_estimated": self.count_estimated,
+                    "pages_count": math.ceil(self.objects_count / limit),
+                    "has_next": self.has_next,
+                    "objects": data,
+                }
+            )
+        assert self.page is not None
         total = self.page.paginator.count
         return Response(
             {
@@ -136,13 +302,15 @@ class BaseModelAPI(GenericAPIView):
 
     @overrides(APIView)
     def dispatch(self, request: Any, *args: Any, **kwargs: Any) -> HttpResponse:
-        try:
-            if request.method not in self.allowed_methods:
-                raise MethodNotAllowed(request.method or "")
-            return super().dispatch(request, *args, **kwargs)
-        except APIPermissionDenied as error:
-            self.__handle_permission_denied(error)
-            raise NotImplementedError("Not reachable")
+        # Permission lookups are memoized for the duration of the request.
+        with permission_context():
+            try:
+                if request.method not in self.allowed_methods:
+                    raise MethodNotAllowed(request.method or "")
+                return super().dispatch(request, *args, **kwargs)
+            except APIPermissionDenied as error:
+                self.__handle_permission_denied(error)
+                raise NotImplementedError("Not reachable")
 
     def get_request_data(self, request: Request) -> dict:
         """
@@ -154,6 +322,8 @@ class BaseModelAPI(GenericAPIView):
                 "_limit",
                 "_order_by",
                 "_page",
+                "_cursor",
+                "_count",
                 "_fulltext",
                 "csrfmiddlewaretoken",
             ]
@@ -339,11 +509,12 @@ class BaseModelAPI(GenericAPIView):
     ) -> None:
         """For each object in the queryset, check whether the user has write
         permission on the field."""
-        has_perm = p.filter_queryset_by_perms_shortcut(
-            perms, user, queryset, field_name
+        verdicts = p.bulk_has_perms(
+            user, queryset.model, queryset.values("pk"), perms, field_name
         )
-        no_perm = queryset.difference(has_perm).first()
-        if no_perm:
+        denied = [pk for pk, allowed in verdicts.items() if not allowed]
+        if denied:
+            no_perm = QuerySet(model=queryset.model).get(pk=denied[0])
             raise APIPermissionDenied(no_perm, perms, field_name)
 
     @classmethod
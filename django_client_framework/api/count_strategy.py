@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+from logging import getLogger
+from typing import Tuple, Type
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Model
+from django.db.models.query import QuerySet
+from rest_framework.request import Request
+
+from .. import exceptions as e
+
+LOG = getLogger(__name__)
+
+COUNT_QUERY_PARAM = "_count"
+
+# counts every object
+EXACT = "exact"
+# counts up to get_count_cap() objects
+CAPPED = "capped"
+# uses the row estimate of the query planner, on PostgreSQL only, otherwise
+# counts up to get_count_cap() objects
+ESTIMATE = "estimate"
+# does not count, only tells if there is a next page
+NONE = "none"
+
+COUNT_STRATEGIES = (EXACT, CAPPED, ESTIMATE, NONE)
+
+
+def get_count_strategy(request: Request, model: Type[Model]) -> str:
+    """
+    Returns how to count the objects of a paginated response: the _count
+    query param, or the strategy of model in settings.DCF_COUNT_STRATEGIES, a
+    dict keyed by "app_label.ModelName", or settings.DCF_COUNT_STRATEGY, which
+    defaults to exact.
+    """
+    strategy = request.query_params.get(COUNT_QUERY_PARAM)
+    if not strategy:
+        by_model = {
+            label.lower(): value
+            for label, value in getattr(settings, "DCF_COUNT_STRATEGIES", {}).items()
+        }
+        strategy = by_model.get(
+            model._meta.label_lower, getattr(settings, "DCF_COUNT_STRATEGY", EXACT)
+        )
+    if strategy not in COUNT_STRATEGIES:
+        raise e.ParseError(
+            f"{COUNT_QUERY_PARAM} must be one of {', '.join(COUNT_STRATEGIES)}"
+        )
+    return strategy
+
+
+def get_count_cap() -> int:
+    """Returns settings.DCF_COUNT_CAP, the largest number of objects counted
+    by the capped strategy (1000 by default)."""
+    return getattr(settings, "DCF_COUNT_CAP", 1000)
+
+
+def capped_count(queryset: QuerySet, cap: int) -> int:
+    """Returns the number of objects in queryset, or cap + 1 if there are more
+    than cap. The database stops scanning after cap + 1 rows."""
+    return queryset.order_by()[: cap + 1].count()
+
+
+def estimate_count(queryset: QuerySet, cap: int) -> Tuple[int, bool]:
+    """
+    Returns the number of objects in queryset estimated by the query planner,
+    without running the query, and True. The estimate is only available on
+    PostgreSQL, elsewhere returns the capped_count() and False.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return capped_count(queryset, cap), False
+    sql, params = queryset.order_by().query.get_compiler(using=queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"]), True
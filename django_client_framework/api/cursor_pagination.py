@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from functools import reduce
+from logging import getLogger
+from operator import or_
+from typing import Any, List, NamedTuple, Optional, Sequence, Type
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Field, Model, Q
+from django.db.models.query import QuerySet
+
+from .. import exceptions as e
+
+LOG = getLogger(__name__)
+
+CURSOR_QUERY_PARAM = "_cursor"
+
+
+class SortKey(NamedTuple):
+    name: str
+    descending: bool
+    field: Field
+
+    @property
+    def order_by(self) -> str:
+        return f"-{self.name}" if self.descending else self.name
+
+
+class CursorPage:
+    """A page of objects, and the cursor of the next page, or None if it is
+    the last page."""
+
+    def __init__(self, objects: List[Any], next_cursor: Optional[str]) -> None:
+        self.objects = objects
+        self.next_cursor = next_cursor
+
+
+def paginate_by_cursor(
+    queryset: QuerySet, cursor: str, ordering: Sequence[str], limit: int
+) -> CursorPage:
+    """
+    Returns the limit objects of queryset that follow cursor in ordering,
+    which is extended with the pk as a tie-breaker. An empty cursor starts
+    from the first object. Instead of an OFFSET, the query seeks past the sort
+    values of the last object of the previous page, so that deep pages are as
+    fast as the first one, and objects written meanwhile never shift pages.
+    """
+    keys = get_sort_keys(queryset.model, ordering)
+    queryset = queryset.order_by(*[key.order_by for key in keys])
+    if cursor:
+        queryset = queryset.filter(_seek(keys, decode_cursor(cursor, keys)))
+    objects = list(queryset[: limit + 1])
+    next_cursor = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        next_cursor = encode_cursor(keys, objects[-1])
+    return CursorPage(objects, next_cursor)
+
+
+def get_sort_keys(model: Type[Model], ordering: Sequence[str]) -> List[SortKey]:
+    keys: List[SortKey] = []
+    for name in ordering:
+        descending = name.startswith("-")
+        name = name.lstrip("-+")
+        try:
+            field: Any = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise e.ParseError(f"Cannot paginate with a cursor by {name}")
+        # a null never compares, the objects after it could not be sought
+        if not field.concrete or field.null:
+            raise e.ParseError(
+                f"Cannot paginate with a cursor by {name}, it can be null"
+            )
+        keys.append(SortKey(name, descending, field))
+    if not any(key.field.primary_key for key in keys):
+        # make the order total
+        descending = keys[-1].descending if keys else False
+        keys.append(SortKey("pk", descending, model._meta.pk))
+    return keys
+
+
+def encode_cursor(keys: Sequence[SortKey], instance: Model) -> str:
+    payload = {
+        "o": [key.order_by for key in keys],
+        "v": [key.field.value_to_string(instance) for key in keys],
+    }
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[SortKey]) -> List[Any]:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(data)
+        ordering, values = payload["o"], payload["v"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise e.ParseError("Invalid cursor")
+    if ordering != [key.order_by for key in keys]:
+        raise e.ParseError("The cursor was created with a different _order_by")
+    # encode_cursor() writes one string per key, never null
+    if (
+        not isinstance(values, list)
+        or len(values) != len(keys)
+        or not all(isinstance(value, str) for value in values)
+    ):
+        raise e.ParseError("Invalid cursor")
+    try:
+        return [key.field.to_python(value) for key, value in zip(keys, values)]
+    except (ValidationError, TypeError, ValueError):
+        raise e.ParseError("Invalid cursor")
+
+
+def _seek(keys: Sequence[SortKey], values: Sequence[Any]) -> Q:
+    """Keeps the objects after values in the order of keys, eg, for
+    (-created_at, -pk): created_at < v0 OR (created_at = v0 AND pk < v1)."""
+    clauses = []
+    for i, key in enumerate(keys):
+        lookup = "lt" if key.descending else "gt"
+        clauses.append(
+            Q(
+                **{keys[j].name: values[j] for j in range(i)},
+                **{f"{key.name}__{lookup}": values[i]},
+            )
+        )
+    return reduce(or_, clauses)
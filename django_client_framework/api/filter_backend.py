@@ -1,22 +1,18 @@
 from __future__ import annotations
 
-import re
 from logging import getLogger
-from typing import TYPE_CHECKING, Any, Dict, List, TypeVar
+from typing import TYPE_CHECKING, List, Type, TypeVar, cast
 
-from django.core.exceptions import FieldDoesNotExist
-from django.db.models.fields.related import RelatedField
-from django.db.models.fields.reverse_related import ForeignObjectRel
 from django.db.models.query import QuerySet
 from django.db.models.query_utils import Q
 from rest_framework import filters
 
 from django_client_framework.models.abstract.model import DCFModel
-from django_client_framework.models.abstract.user import DCFAbstractUser
 
 from .. import exceptions as e
 from .. import permissions as p
 from ..models.abstract import Searchable
+from .filter_plan import FilterPlan, ordering_is_multi_valued
 
 LOG = getLogger(__name__)
 
@@ -29,6 +25,12 @@ if TYPE_CHECKING:
 T = TypeVar("T", bound="DCFModel")
 
 
+def get_ordering(request: Request) -> List[str]:
+    """Returns the fields in _order_by, eg: /products/?_order_by=-priority,name"""
+    by = request.query_params.getlist("_order_by", ["-created_at"])
+    return by[0].strip().split(",")
+
+
 class DCFFilterBackend(filters.BaseFilterBackend):
     """
     Implements DRF filter backend.
@@ -42,84 +44,64 @@ class DCFFilterBackend(filters.BaseFilterBackend):
         Support generic filtering, eg: /products?name__in[]=abc&name__in[]=def
         """
         queryset = self.__filter_queryset_by_read_perm(request, queryset, view)
-        queryset = self.__filter_queryset_by_param(request, queryset, view)
-        queryset = self.__filter_by_visible_relations(request, queryset, view)
-        queryset = self.__order_queryset_by_param(request, queryset, view)
-        return queryset.distinct()
+        plan = FilterPlan.from_request(request, queryset)
+        queryset = self.__filter_queryset_by_param(plan, queryset, view)
+        if plan.fulltext:
+            queryset = self.__filter_by_fulltext(plan.fulltext, queryset)
+        queryset = self.__filter_by_visible_relations(plan, queryset, view)
+        ordering = get_ordering(request)
+        queryset = self.__order_queryset_by_param(ordering, queryset, view)
+        # The permission filters never join, only the filters or the ordering
+        # can return an object several times, by joining a multi-valued
+        # relation. DISTINCT is expensive on wide rows, so it is only applied
+        # then.
+        if plan.multi_valued or ordering_is_multi_valued(
+            queryset.model, tuple(ordering)
+        ):
+            queryset = queryset.distinct()
+        return queryset
 
     def __order_queryset_by_param(
-        self, request: Request, queryset: QuerySet[T], view: BaseModelAPI
+        self, ordering: List[str], queryset: QuerySet[T], view: BaseModelAPI
     ) -> QuerySet[T]:
         """
         Support generic filtering, eg: /products/?_order_by=name
         """
-        by = request.query_params.getlist("_order_by", ["-created_at"])
-        by_arr = by[0].strip().split(",")
         try:
-            return queryset.order_by(*by_arr)
+            return queryset.order_by(*ordering)
         except Exception as execpt:
             raise e.ParseError(str(execpt))
 
     def __filter_queryset_by_read_perm(
         self, request: Request, queryset: QuerySet[T], view: BaseModelAPI
     ) -> QuerySet[T]:
-        return p.filter_queryset_by_perms_shortcut("r", view.user_object, queryset)
+        # the collection is evaluated right away
+        return p.filter_queryset_by_perms_shortcut(
+            "r", view.user_object, queryset, adaptive=True
+        )
 
     def __filter_queryset_by_param(
-        self, request: Request, queryset: QuerySet[T], view: BaseModelAPI
+        self, plan: FilterPlan, queryset: QuerySet[T], view: BaseModelAPI
     ) -> QuerySet[T]:
-        querydict = self.__build_query_dict(request, queryset, view)
         try:
-            return queryset.filter(**querydict)
+            return queryset.filter(**plan.filters)
         except Exception as exept:
             raise e.ParseError(str(exept))
 
-    def __build_query_dict(
-        self, request: Request, queryset: QuerySet[T], view: BaseModelAPI
-    ) -> Dict[str, Any]:
-        querydict = {}
-        for key in request.query_params:
-            # test if the pattern is xxxx_[??]=
-            if re.match(r"\w+\[\w*\]", key):
-                ###
-                # Here are some cases
-                # Could be products?id__in[]=1,2,3 or
-                # products?id__in[]=1&id__in[]=2. These are just different ways
-                # to encode a list in the query param. They mean the same thing.
-                # The querylist could be ["1,2,3", "1", "1"] in this case.
-                querylist = request.query_params.getlist(key, [])
-                normalized_querylist: List[str] = []  # normalize to ["1","2","3"]
-                # "products?id__in[]=" gets translated to <QueryDict:
-                # {'id__in[]': ['']}> this is a compromise we want to make,
-                # because there is no way standard way to represent an empty
-                # list in the query string.
-                if len(querylist) == 1 and querylist[0] == "":
-                    normalized_querylist = []
-                else:
-                    for q in querylist:
-                        normalized_querylist += q.split(",")
-                querydict[key[:-2]] = normalized_querylist
-
-            elif key == "_fulltext" and (searchtext := request.query_params.get(key)):
-                if issubclass(view.model, Searchable):
-                    queryset = view.model.filter_by_text_search(
-                        searchtext, queryset=queryset
-                    )
-                else:
-                    raise e.ParseError(
-                        f"{view.model.__name__} does not support full text search"
-                    )
-            elif key and key[0] != "_":  # ignore pagination keys
-                val: Any = request.query_params.get(key, None)
-                if val == "true":
-                    val = True
-                elif val == "false":
-                    val = False
-                querydict[key] = val
-        return querydict
+    def __filter_by_fulltext(
+        self, searchtext: str, queryset: QuerySet[T]
+    ) -> QuerySet[T]:
+        """
+        Support full text search on Searchable models, eg: /products?_fulltext=abc
+        """
+        model = cast(Type[Searchable], queryset.model)
+        try:
+            return model.filter_by_text_search(searchtext, queryset=queryset)
+        except ValueError as error:
+            raise e.ParseError(str(error))
 
     def __filter_by_visible_relations(
-        self, request: Request, queryset: QuerySet[T], view: BaseModelAPI
+        self, plan: FilterPlan, queryset: QuerySet[T], view: BaseModelAPI
     ) -> QuerySet[T]:
         """
         When searching a publicly readable resource such as Product, anyone can
@@ -143,52 +125,16 @@ class DCFFilterBackend(filters.BaseFilterBackend):
 
         The null objects are included so that the following works:
             Product.objects.filter(seller__user__token__isnull=True)
-        """
-
-        def build_queries(
-            user: DCFAbstractUser,
-            queryset: QuerySet[DCFModel],
-            # query is Query(Product)
-            # optimization
-            original: List[str],
-            # original is ["seller", "user", "token", "startwith"]
-        ) -> Q:
-            node = Q()
-            cur_model = queryset.model
-            # cur_model is Product, Seller, User, Token...
-            for i in range(len(original)):
-                prefix = "__".join(original[: i + 1])
-                # prefix is "seller", "seller__user", "seller__user__auth", ...
-                try:
-                    field = cur_model._meta.get_field(original[i])
-                    # for Product, field is "seller", for Seller, field is
-                    # "user"
-                except FieldDoesNotExist:
-                    # when original[i] is startwith, it's not a field but a
-                    # lookup.
-                    return node
-                else:
-                    if isinstance(field, ForeignObjectRel) or isinstance(
-                        field, RelatedField
-                    ):
-                        assert field.related_model is not None
-                        cur_model = DCFModel.from_model_type(
-                            field.related_model
-                        )  # set cur_model to Seller
-                        visible: QuerySet = p.filter_queryset_by_perms_shortcut(
-                            "r",
-                            user,
-                            QuerySet(model=cur_model).all(),
-                        )
-                        node &= Q(**{prefix + "__in": visible}) | Q(
-                            **{prefix + "__isnull": True}
-                        )
-                        # adds Q(seller__in=visible_sellers)
-            return node
 
+        The relations traversed by the filters are resolved by the FilterPlan.
+        """
         user = view.user_object
-        querydict = self.__build_query_dict(request, queryset, view)
         node = Q()
-        for key in querydict.keys():
-            node &= build_queries(user, queryset, key.split("__"))
+        for prefix, related_model in plan.relations.items():
+            # prefix is "seller", "seller__user", "seller__user__auth", ...
+            visible: QuerySet = p.filter_queryset_by_perms_shortcut(
+                "r", user, QuerySet(model=related_model).all(), adaptive=True
+            )
+            node &= Q(**{prefix + "__in": visible}) | Q(**{prefix + "__isnull": True})
+            # adds Q(seller__in=visible_sellers)
         return queryset.filter(node)
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from logging import getLogger
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    FrozenSet,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+)
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Field, Model
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.fields.related import RelatedField
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from django.db.models.query import QuerySet
+
+from django_client_framework.models.abstract.model import DCFModel
+
+from .. import exceptions as e
+from ..models.abstract import Searchable
+
+if TYPE_CHECKING:
+    from rest_framework.request import Request
+
+LOG = getLogger(__name__)
+
+FILTER_PLAN_CACHE_SIZE = 1024
+
+# lookups whose value has the type of the field, and is converted to it
+COERCED_LOOKUPS = {"exact", "iexact", "gt", "gte", "lt", "lte", "in"}
+
+LIST_KEY = re.compile(r"\w+\[\w*\]")
+
+
+class FilterPath(NamedTuple):
+    """A query param key resolved against the model metadata, eg,
+    "brand__name__in" on Product."""
+
+    lookup: str
+    # the field the value is compared to, None if it cannot be coerced
+    field: Optional[Field]
+    lookup_name: str
+    # every relation traversed, as (prefix, related model), eg,
+    # ("brand", Brand)
+    relations: Tuple[Tuple[str, Type[Model]], ...]
+    # whether a relation traversed can match several rows, which duplicates
+    # the objects in the result
+    multi_valued: bool = False
+
+    def coerce(self, value: Any) -> Any:
+        if self.lookup_name == "isnull":
+            if not isinstance(value, bool):
+                raise e.ParseError(f"{self.lookup} must be true or false")
+            return value
+        if self.field is None or self.lookup_name not in COERCED_LOOKUPS:
+            return value
+        try:
+            if isinstance(value, list):
+                return [self.field.to_python(v) for v in value]
+            return self.field.to_python(value)
+        except ValidationError as error:
+            raise e.ParseError({self.lookup: error.messages})
+
+
+class FilterPlan:
+    """
+    The filters of a collection request, parsed once from the query params.
+    Every key is validated against the model metadata and its value coerced
+    to the type of the field. Resolving the keys only depends on the model and
+    the set of keys, so it is cached, see compile_paths().
+    """
+
+    def __init__(
+        self,
+        paths: Tuple[FilterPath, ...],
+        values: Dict[str, Any],
+        fulltext: Optional[str] = None,
+    ) -> None:
+        self.paths = paths
+        self.filters = {path.lookup: path.coerce(values[path.lookup]) for path in paths}
+        self.fulltext = fulltext
+
+    @classmethod
+    def from_request(cls, request: Request, queryset: QuerySet) -> FilterPlan:
+        values: Dict[str, Any] = {}
+        fulltext = None
+        for key in request.query_params:
+            # test if the pattern is xxxx_[??]=
+            if LIST_KEY.match(key):
+                ###
+                # Here are some cases
+                # Could be products?id__in[]=1,2,3 or
+                # products?id__in[]=1&id__in[]=2. These are just different ways
+                # to encode a list in the query param. They mean the same thing.
+                # The querylist could be ["1,2,3", "1", "1"] in this case.
+                querylist = request.query_params.getlist(key, [])
+                normalized_querylist: List[str] = []  # normalize to ["1","2","3"]
+                # "products?id__in[]=" gets translated to <QueryDict:
+                # {'id__in[]': ['']}> this is a compromise we want to make,
+                # because there is no way standard way to represent an empty
+                # list in the query string.
+                if len(querylist) == 1 and querylist[0] == "":
+                    normalized_querylist = []
+                else:
+                    for q in querylist:
+                        normalized_querylist += q.split(",")
+                values[key[:-2]] = normalized_querylist
+            elif key == "_fulltext" and (searchtext := request.query_params.get(key)):
+                if not issubclass(queryset.model, Searchable):
+                    raise e.ParseError(
+                        f"{queryset.model.__name__} does not support full text search"
+                    )
+                fulltext = searchtext
+            elif key and key[0] != "_":  # ignore pagination keys
+                val: Any = request.query_params.get(key, None)
+                if val == "true":
+                    val = True
+                elif val == "false":
+                    val = False
+                values[key] = val
+        paths = compile_paths(
+            queryset.model,
+            tuple(sorted(values)),
+            frozenset(queryset.query.annotations),
+        )
+        return cls(paths, values, fulltext)
+
+    @property
+    def multi_valued(self) -> bool:
+        return any(path.multi_valued for path in self.paths)
+
+    @property
+    def relations(self) -> Dict[str, Type[Model]]:
+        """Returns every relation traversed by the filters, by prefix."""
+        relations: Dict[str, Type[Model]] = {}
+        for path in self.paths:
+            relations.update(path.relations)
+        return relations
+
+    def __repr__(self) -> str:
+        return f"<FilterPlan {self.filters}>"
+
+
+@lru_cache(maxsize=FILTER_PLAN_CACHE_SIZE)
+def compile_paths(
+    model: Type[Model], keys: Tuple[str, ...], annotations: FrozenSet[str]
+) -> Tuple[FilterPath, ...]:
+    """Resolves the filter keys of a request on model, raising ParseError for
+    an unknown field or lookup."""
+    return tuple(_resolve(model, key, annotations) for key in keys)
+
+
+def _resolve(model: Type[Model], key: str, annotations: FrozenSet[str]) -> FilterPath:
+    parts = key.split(LOOKUP_SEP)
+    if parts[0] in annotations:
+        # annotations have no field to validate the path against
+        return FilterPath(key, None, parts[-1], ())
+    field: Any = None
+    relations: List[Tuple[str, Type[Model]]] = []
+    multi_valued = False
+    cur_model = model
+    for i, part in enumerate(parts):
+        try:
+            field = (
+                cur_model._meta.pk if part == "pk" else cur_model._meta.get_field(part)
+            )
+        except FieldDoesNotExist:
+            if field is None:
+                raise e.ParseError(
+                    f"{cur_model.__name__} has no field named {part!r}: {key}"
+                )
+            return _resolve_lookups(key, field, parts[i:], relations, multi_valued)
+        if isinstance(field, (ForeignObjectRel, RelatedField)):
+            assert field.related_model is not None
+            cur_model = DCFModel.from_model_type(field.related_model)
+            relations.append((LOOKUP_SEP.join(parts[: i + 1]), cur_model))
+            multi_valued = multi_valued or _is_multi_valued(field)
+        elif i < len(parts) - 1:
+            # the rest of the path can only be lookups on the field
+            return _resolve_lookups(key, field, parts[i + 1 :], relations, multi_valued)
+    return FilterPath(key, _coercible(field), "exact", tuple(relations), multi_valued)
+
+
+def _resolve_lookups(
+    key: str,
+    field: Any,
+    lookups: List[str],
+    relations: List[Tuple[str, Type[Model]]],
+    multi_valued: bool,
+) -> FilterPath:
+    for lookup in lookups:
+        if not _is_lookup(field, lookup):
+            raise e.ParseError(f"Unsupported lookup {lookup!r}: {key}")
+    # the value of a transform, such as created_at__year, is not a datetime
+    coercible = _coercible(field) if len(lookups) == 1 else None
+    return FilterPath(key, coercible, lookups[-1], tuple(relations), multi_valued)
+
+
+@lru_cache(maxsize=FILTER_PLAN_CACHE_SIZE)
+def ordering_is_multi_valued(model: Type[Model], ordering: Tuple[str, ...]) -> bool:
+    """Returns whether ordering by ordering, as passed to order_by(), joins
+    a relation that can match several rows. Unknown fields count as
+    multi-valued."""
+    for name in ordering:
+        if name == "?":
+            continue
+        cur_model = model
+        for part in name.lstrip("-+").split(LOOKUP_SEP):
+            try:
+                field: Any = (
+                    cur_model._meta.pk
+                    if part == "pk"
+                    else cur_model._meta.get_field(part)
+                )
+            except FieldDoesNotExist:
+                if cur_model is model:
+                    return True
+                break
+            if not isinstance(field, (ForeignObjectRel, RelatedField)):
+                break
+            if _is_multi_valued(field):
+                return True
+            assert field.related_model is not None
+            cur_model = field.related_model
+    return False
+
+
+def _is_multi_valued(field: Any) -> bool:
+    return bool(field.many_to_many or field.one_to_many)
+
+
+def _is_lookup(field: Any, name: str) -> bool:
+    return any(
+        (get := getattr(field, method, None)) is not None and get(name)
+        for method in ["get_lookup", "get_transform"]
+    )
+
+
+def _coercible(field: Any) -> Optional[Field]:
+    # reverse relations cannot convert values
+    return field if isinstance(field, Field) else None
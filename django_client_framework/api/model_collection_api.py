@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from logging import getLogger
-from typing import Any, Iterable, List, Type
+from typing import Any, Dict, Iterable, List, Tuple, Type
 
-from django.db.models import QuerySet
+from django.db.models import Model, QuerySet
 from django.db.models.fields.related import ForeignKey
 from django.http.request import HttpRequest
 from django.http.response import HttpResponse
@@ -67,7 +67,9 @@ class ModelCollectionAPI(BaseModelAPI):
         serializer = self.get_serializer(data=self.request_data)
         serializer.is_valid(raise_exception=True)
         # Make sure user has related field's write permission for each related
-        # object
+        # object. The related objects are checked together, one query per
+        # related model.
+        related_pks: Dict[Tuple[Type[Model], str], List[Any]] = {}
         for field_name, field_value in serializer.validated_data.items():
             field = self.get_model_field(field_name)
             if field and isinstance(field, ForeignKey) and field_value:
@@ -77,30 +79,32 @@ class ModelCollectionAPI(BaseModelAPI):
                 #   2. brand_id
                 # If the field_name is brand then field_val is usually a brand
                 # object. If the field name is brand_id, then field val is UUID.
-                new_related_obj: None | DCFModel
                 if isinstance(field_value, DCFModel):
-                    new_related_obj = field_value
-                else:
-                    new_related_obj = (
-                        QuerySet(model=field.related_model)
-                        .filter(pk=field_value)
-                        .first()
-                    )
-                if new_related_obj is None:
+                    pk = field_value.pk
+                elif (
+                    pk := QuerySet(model=field.related_model)
+                    .filter(pk=field_value)
+                    .values_list("pk", flat=True)
+                    .first()
+                ) is None:
                     raise e.NotFound(f"Related object {field_value} does not exist.")
-                else:
-                    # Make sure the related object's related name can be
-                    # written. For example, for product/<id>/brand, this is
-                    # checking if brand.products can be written.
-                    if not p.has_perms_shortcut(
-                        self.user_object,
-                        new_related_obj,
+                related_pks.setdefault(
+                    (field.related_model, field.remote_field.name), []
+                ).append(pk)
+        for (related_model, remote_name), pks in related_pks.items():
+            # Make sure the related object's related name can be written. For
+            # example, for product/<id>/brand, this is checking if
+            # brand.products can be written.
+            verdicts = p.bulk_has_perms(
+                self.user_object, related_model, pks, "w", field_name=remote_name
+            )
+            for pk in pks:
+                if not verdicts[pk]:
+                    raise APIPermissionDenied(
+                        QuerySet(model=related_model).get(pk=pk),
                         "w",
-                        field_name=field.remote_field.name,
-                    ):
-                        raise APIPermissionDenied(
-                            new_related_obj, "w", field=field.remote_field.name
-                        )
+                        field=remote_name,
+                    )
 
         instance = serializer.save()
         if p.has_perms_shortcut(self.user_object, instance, "r"):
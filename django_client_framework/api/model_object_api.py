@@ -64,7 +64,9 @@ class ModelObjectAPI(BaseModelAPI):
             partial=True,
         )
         serializer.is_valid(raise_exception=True)
-        # User must have write permission on the field being modified.
+        # User must have write permission on the field being modified. The
+        # writable fields are loaded at once.
+        writable_fields = p.get_permitted_fields(self.user_object, instance, "w")
         for field_name, field_val in serializer.validated_data.items():
             # Note that in case field_name is a foreign key, there are two
             # cases:
@@ -95,9 +97,7 @@ class ModelObjectAPI(BaseModelAPI):
                     new_related_obj,
                     "w",
                 )
-            elif not p.has_perms_shortcut(
-                self.user_object, self.model_object, "w", field_name
-            ):
+            elif field_name not in writable_fields:
                 raise APIPermissionDenied(self.model_object, "w", field=field_name)
         # when permited
         serializer.save()
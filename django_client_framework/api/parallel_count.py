@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import getLogger
+from threading import BoundedSemaphore, Lock
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models.query import QuerySet
+
+LOG = getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+# the free workers, so that a count never waits in the queue of the pool
+_idle: Optional[BoundedSemaphore] = None
+
+
+def parallel_count_enabled(queryset: QuerySet) -> bool:
+    """
+    Returns whether the objects of queryset can be counted on another thread
+    while the page is fetched, if settings.DCF_PARALLEL_COUNT is True (False by
+    default). The count runs on another connection, so it is only enabled out
+    of transactions, whose writes the other connection would not see, and when
+    the other connection opens the same database.
+    """
+    if not getattr(settings, "DCF_PARALLEL_COUNT", False):
+        return False
+    connection = connections[queryset.db]
+    if connection.in_atomic_block:
+        return False
+    if connection.vendor == "sqlite" and connection.is_in_memory_db():
+        # each connection to a private in-memory database has its own copy
+        return "cache=shared" in str(connection.settings_dict["NAME"])
+    return True
+
+
+def count_in_background(queryset: QuerySet) -> Optional[Future[int]]:
+    """Counts the objects of queryset on the thread pool of
+    settings.DCF_PARALLEL_COUNT_WORKERS threads. Returns None if every worker
+    is busy, the caller should then count on its own thread rather than wait
+    for a worker."""
+    executor, idle = _get_executor()
+    if not idle.acquire(blocking=False):
+        return None
+    try:
+        return executor.submit(_count, queryset, idle)
+    except BaseException:
+        idle.release()
+        raise
+
+
+def _get_executor() -> Tuple[ThreadPoolExecutor, BoundedSemaphore]:
+    global _executor, _idle
+    with _executor_lock:
+        if _executor is None or _idle is None:
+            workers = getattr(settings, "DCF_PARALLEL_COUNT_WORKERS", 4)
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="dcf-count"
+            )
+            _idle = BoundedSemaphore(workers)
+        return _executor, _idle
+
+
+def _count(queryset: QuerySet, idle: BoundedSemaphore) -> int:
+    try:
+        return queryset.count()
+    finally:
+        # like at the end of a request, the connections of the worker are kept
+        # for CONN_MAX_AGE, and closed if broken
+        close_old_connections()
+        idle.release()
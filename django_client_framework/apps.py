@@ -23,6 +23,7 @@ class DefaultApp(AppConfig):
         from . import models  # noqa
 
         signals.post_migrate.connect(post_migrate, sender=self)
+        connect_rule_models()
 
         if settings.DEBUG:
             from . import api, serializers
@@ -32,10 +33,27 @@ class DefaultApp(AppConfig):
             serializers.check_integrity()
 
 
+def connect_rule_models() -> None:
+    """Invalidates the permission context after writes to the models that
+    permission rules traverse."""
+    from .permissions.context import connect_permission_context
+    from .permissions.reset import access_controlled_models
+    from .permissions.site_permission import get_rule_models
+
+    for model in access_controlled_models():
+        for related_model in get_rule_models(model):
+            connect_permission_context(related_model)
+
+
 def post_migrate(*args: Any, **kwargs: Any) -> None:
     from .permissions import default_groups, default_users
-    from .permissions.site_permission import _get_permission_for_model
-
-    _get_permission_for_model.cache_clear()
+    from .permissions.identities import identity_registry
+    from .permissions.registry import permission_registry
+
+    identity_registry.clear()
+    permission_registry.clear()
+    # creates the permissions of the registered models, like the permissions
+    # of django.contrib.auth
+    permission_registry.load()
     default_groups.setup()
     default_users.setup()
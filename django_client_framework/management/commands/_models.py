@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Type
+
+from django.apps import apps
+from django.core.management.base import CommandError
+from django.db import models as m
+
+from ...permissions.visibility import visibility_index_enabled
+
+
+def get_indexed_models(labels: Sequence[str]) -> Optional[List[Type[m.Model]]]:
+    """Returns the models named by labels, or None for every indexed model."""
+    if not labels:
+        return None
+    models = []
+    for label in labels:
+        try:
+            model = apps.get_model(label)
+        except (LookupError, ValueError) as error:
+            raise CommandError(str(error))
+        if not visibility_index_enabled(model):
+            raise CommandError(f"{label} is not in settings.DCF_VISIBILITY_INDEX")
+        models.append(model)
+    return models
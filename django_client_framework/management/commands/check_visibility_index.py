@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from ...permissions.visibility import check_visibility_index
+from ._models import get_indexed_models
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the read visibility index with the object permissions, and "
+        "fails if they differ."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "models",
+            nargs="*",
+            metavar="app_label.ModelName",
+            help="Models to check, defaults to every model in "
+            "settings.DCF_VISIBILITY_INDEX.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        problems = check_visibility_index(get_indexed_models(options["models"]))
+        for label, counts in problems.items():
+            self.stdout.write(
+                f"{label}: {counts['missing']} missing, {counts['extra']} extra rows"
+            )
+        if problems:
+            raise CommandError(
+                "The read visibility index is inconsistent, run "
+                "rebuild_visibility_index to fix it."
+            )
+        self.stdout.write("The read visibility index is consistent.")
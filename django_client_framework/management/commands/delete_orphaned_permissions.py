@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from time import monotonic
+from typing import Any
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from ...permissions.orphans import DEFAULT_GC_CHUNK_SIZE, collect_orphaned_permissions
+
+
+class Command(BaseCommand):
+    help = "Deletes the object permissions of objects that no longer exist."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "models",
+            nargs="*",
+            metavar="app_label.ModelName",
+            help="Models to collect, defaults to every model with permissions.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_GC_CHUNK_SIZE)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the orphaned permissions.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        models = []
+        for label in options["models"]:
+            try:
+                models.append(apps.get_model(label))
+            except (LookupError, ValueError) as error:
+                raise CommandError(str(error))
+        started = monotonic()
+        counts = collect_orphaned_permissions(
+            models or None,
+            chunk_size=options["chunk_size"],
+            dry_run=options["dry_run"],
+        )
+        verb = "Found" if options["dry_run"] else "Deleted"
+        for label, count in counts.items():
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(
+            f"{verb} {sum(counts.values())} orphaned permissions"
+            f" in {monotonic() - started:.1f}s."
+        )
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from time import monotonic
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from ...permissions.visibility import rebuild_visibility_index
+from ._models import get_indexed_models
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the read visibility index from the object permissions."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "models",
+            nargs="*",
+            metavar="app_label.ModelName",
+            help="Models to rebuild, defaults to every model in "
+            "settings.DCF_VISIBILITY_INDEX.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        started = monotonic()
+        total = rebuild_visibility_index(get_indexed_models(options["models"]))
+        elapsed = monotonic() - started
+        self.stdout.write(f"Indexed {total} read permissions in {elapsed:.1f}s.")
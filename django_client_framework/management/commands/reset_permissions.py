@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from time import monotonic
+from typing import Any
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from ...models import AccessControlled
+from ...permissions import reset_permissions
+from ...permissions.reset import DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Resets the object permissions of AccessControlled models."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "models",
+            nargs="*",
+            metavar="app_label.ModelName",
+            help="Models to reset, defaults to every AccessControlled model.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes, each processing a range of pks.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--checkpoint-dir",
+            help="Directory to save the progress in, so that an interrupted run "
+            "can be resumed by running the command again.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        models = []
+        for label in options["models"]:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as error:
+                raise CommandError(str(error))
+            if not issubclass(model, AccessControlled):
+                raise CommandError(f"{label} is not AccessControlled")
+            models.append(model)
+        started = monotonic()
+        try:
+            total = reset_permissions(
+                models or None,
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+                checkpoint_dir=options["checkpoint_dir"],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        elapsed = monotonic() - started
+        self.stdout.write(
+            f"Reset permissions of {total} objects in {elapsed:.1f}s"
+            f" ({total / max(elapsed, 1e-6):.0f} rows/sec)."
+        )
@@ -6,7 +6,9 @@ from django.db.models import *
 from .abstract import (
     AccessControlled,
     DCFAbstractUser,
+    DCFManager,
     DCFModel,
+    DCFQuerySet,
     DjangoModel,
     RateLimited,
     Searchable,
@@ -19,6 +21,7 @@ from .lookup import *
 from .object_permissions import (
     DCFPermission,
     GroupObjectPermission,
+    ReadVisibility,
     UserGroup,
     UserObjectPermission,
 )
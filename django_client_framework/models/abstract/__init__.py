@@ -1,5 +1,6 @@
 from .access_controlled import AccessControlled
 from .model import DCFModel, DjangoModel
+from .queryset import DCFManager, DCFQuerySet
 from .rate_limited import RateLimited
 from .searchable import Searchable
 from .serializable import Serializable
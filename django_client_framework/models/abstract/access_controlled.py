@@ -2,14 +2,28 @@ from __future__ import annotations
 
 from abc import abstractmethod
 from logging import getLogger
-from typing import Any, Generic, Type, TypeVar
+from typing import (
+    TYPE_CHECKING,
+    AbstractSet,
+    Any,
+    Generic,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 from django.db.models import Model as DjangoModel
 from django.db.models.manager import BaseManager
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 
 from django_client_framework.models.abstract.model import DCFModel, IDCFModel
 
+if TYPE_CHECKING:
+    from ...permissions.site_permission import PermissionGrant, PermissionRule
+
 LOG = getLogger(__name__)
 
 
@@ -34,17 +48,41 @@ class AccessControlled(DjangoModel, IAccessControlled[T]):
     objects: BaseManager[T]
 
     class PermissionManager(Generic[_T]):
+        # Names of the model fields that the permissions depend on. When set,
+        # saving an instance only resets its permissions if one of these
+        # fields changed. None means the permissions may depend on anything.
+        depends_on: Optional[Sequence[str]] = None
+
+        # Permissions evaluated in SQL when they are checked, instead of being
+        # stored by add_perms() or get_perms(), eg,
+        # [PermissionRule("rw", Q(owner=USER))]. A manager that only declares
+        # rules never resets permissions when an instance is saved.
+        rules: Sequence[PermissionRule] = ()
+
         def add_perms(self, instance: _T) -> None:
+            if self.rules:
+                # the rules alone define the permissions
+                return
             raise NotImplementedError()
 
-        def reset_perms(self, instance: _T) -> None:
-            from ..object_permissions import UserObjectPermission
+        def get_perms(self, instance: _T) -> Optional[Iterable[PermissionGrant]]:
+            """
+            Returns every object permission that should be granted on instance,
+            or None to let reset_perms() delete and re-add all permissions with
+            add_perms(). When grants are returned, reset_perms() only writes
+            the permissions that changed.
+            """
+            return None
 
-            UserObjectPermission.objects.filter(
-                permission__model_name=instance._meta.model_name,
-                permission__app_name=instance._meta.app_label,
-                object_pk=instance.pk,
-            ).delete()
+        def reset_perms(self, instance: _T) -> None:
+            from ...permissions.reset import delete_user_object_perms
+            from ...permissions.site_permission import sync_object_perms
+
+            grants = self.get_perms(instance)
+            if grants is not None:
+                sync_object_perms(instance._meta.model, {instance.pk: grants})
+                return
+            delete_user_object_perms(instance._meta.model, [instance.pk])
             self.add_perms(instance)
 
     @classmethod
@@ -73,18 +111,100 @@ class AccessControlled(DjangoModel, IAccessControlled[T]):
         self.get_permissionmanager_class()().reset_perms(self)
 
     def __init_subclass__(cls) -> None:
+        post_init.connect(
+            remember_permission_state,
+            sender=cls,
+            dispatch_uid=f"{cls.__name__}.remember_permission_state",
+        )
         post_save.connect(
             update_permission_on_change,
             sender=cls,
             dispatch_uid=f"{cls.__name__}.update_permission_on_change",
         )
+        post_delete.connect(
+            delete_permissions_on_delete,
+            sender=cls,
+            dispatch_uid=f"{cls.__name__}.delete_permissions_on_delete",
+        )
         return super().__init_subclass__()
 
 
+_UNKNOWN = object()
+
+
+def _permission_state(instance: Any) -> Optional[Tuple[Any, ...]]:
+    """Returns the values of the fields declared in PermissionManager.depends_on,
+    without loading deferred fields."""
+    depends_on = instance.get_permissionmanager_class().depends_on
+    if depends_on is None:
+        return None
+    return tuple(
+        instance.__dict__.get(instance._meta.get_field(name).attname, _UNKNOWN)
+        for name in depends_on
+    )
+
+
+def _stores_permissions(manager: Type[Any]) -> bool:
+    """Returns False if manager only declares rules, and so has no stored
+    permissions to reset."""
+    base = AccessControlled.PermissionManager
+    return not manager.rules or any(
+        getattr(manager, name) is not getattr(base, name)
+        for name in ["add_perms", "get_perms", "reset_perms"]
+    )
+
+
+def remember_permission_state(sender: Any, instance: Any, **kwargs: Any) -> None:
+    instance._dcf_permission_state = _permission_state(instance)
+
+
+def _permission_fields_changed(
+    instance: Any, update_fields: Optional[AbstractSet[str]]
+) -> bool:
+    depends_on = instance.get_permissionmanager_class().depends_on
+    if depends_on is None:
+        return True
+    if update_fields is not None:
+        names = set()
+        for name in depends_on:
+            field = instance._meta.get_field(name)
+            names.update([field.name, field.attname])
+        if not names & update_fields:
+            return False
+    saved = getattr(instance, "_dcf_permission_state", None)
+    current = _permission_state(instance)
+    return saved is None or any(
+        old is _UNKNOWN or old != new for old, new in zip(saved, current or ())
+    )
+
+
 def update_permission_on_change(
-    sender: Any, instance: IAccessControlled, **kwargs: Any
+    sender: Any,
+    instance: IAccessControlled,
+    created: bool = False,
+    update_fields: Optional[AbstractSet[str]] = None,
+    **kwargs: Any,
 ) -> None:
-    instance.get_permissionmanager_class()().reset_perms(instance=instance)
+    from ...permissions.context import invalidate_permission_context
+    from ...permissions.updates import schedule_permission_update
+
+    # the permission manager may grant permissions based on the data
+    invalidate_permission_context()
+    manager = instance.get_permissionmanager_class()
+    if _stores_permissions(manager) and (
+        created or _permission_fields_changed(instance, update_fields)
+    ):
+        schedule_permission_update(instance)
+    remember_permission_state(sender, instance)
+
+
+def delete_permissions_on_delete(sender: Any, instance: Any, **kwargs: Any) -> None:
+    from ...permissions.context import invalidate_permission_context
+    from ...permissions.orphans import delete_object_permissions
+
+    invalidate_permission_context()
+    # object_pk has no foreign key, the rows would otherwise stay behind
+    delete_object_permissions(sender, [instance.pk])
 
 
 def check_integrity() -> None:
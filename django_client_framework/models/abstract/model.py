@@ -5,11 +5,14 @@ from abc import abstractmethod
 from typing import *
 from uuid import UUID, uuid4
 
+from django.db.models import Index
 from django.db.models import Model as DjangoModel
 from django.db.models.fields import DateTimeField, UUIDField
 from django.db.models.manager import BaseManager
 from django.db.models.options import Options
 
+from .queryset import DCFManager
+
 T = TypeVar("T", bound="DjangoModel")
 
 
@@ -59,8 +62,12 @@ class __implements__:
 class DCFModel(DjangoModel, __implements__, IDCFModel[T]):
     class Meta:
         abstract = True
+        # serves the default "-created_at" ordering of collections, and
+        # seeking past a cursor, see api.cursor_pagination. A model that
+        # declares its own Meta keeps it by subclassing DCFModel.Meta.
+        indexes = [Index(fields=["created_at", "id"])]
 
-    objects: BaseManager[T]
+    objects: BaseManager[T] = DCFManager()
     id = UUIDField(unique=True, primary_key=True, default=uuid4, editable=False)
     created_at = DateTimeField(auto_now_add=True)
 
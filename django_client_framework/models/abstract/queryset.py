@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Generic, Optional, TypeVar
+
+from django.db.models import Manager, QuerySet
+
+if TYPE_CHECKING:
+    from ..object_permissions import UserGroup
+    from .model import DCFModel
+    from .user import DCFAbstractUser
+
+T = TypeVar("T", bound="DCFModel")
+
+
+class DCFQuerySet(QuerySet[T]):
+    def visible_to(
+        self,
+        identity: DCFAbstractUser | UserGroup,
+        perms: str = "r",
+        field_name: Optional[str] = None,
+    ) -> DCFQuerySet[T]:
+        """
+        Keeps the objects that identity has all permissions in perms on, like
+        filter_queryset_by_perms_shortcut(). The permissions are added to the
+        query as a filter, so the queryset remains lazy and keeps its ordering,
+        annotations, select_related and prefetch_related, and can be used as a
+        subquery.
+        """
+        from ...permissions import filter_queryset_by_perms_shortcut
+
+        return filter_queryset_by_perms_shortcut(perms, identity, self, field_name)
+
+
+class DCFManager(Manager.from_queryset(DCFQuerySet), Generic[T]):  # type: ignore
+    """The default manager of DCFModel."""
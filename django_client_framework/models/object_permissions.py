@@ -11,6 +11,17 @@ from django.utils.translation import gettext_lazy as _
 from .abstract import DCFModel
 
 
+def delete_rows(queryset: m.QuerySet) -> int:
+    """
+    Deletes the rows of queryset with a single DELETE, and returns their
+    number. Unlike queryset.delete(), the rows are not loaded and no signal is
+    sent, even when receivers are connected to the model. Only for the
+    permission tables and the visibility index, which have no relations to
+    cascade to, and whose callers update the caches and the index themselves.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
 class DCFPermission(DCFModel):
     app_name = m.CharField(max_length=32)
     model_name = m.CharField(max_length=32)
@@ -27,6 +38,10 @@ class DCFPermission(DCFModel):
 
 
 class UserGroup(DCFModel):
+    class Meta:
+        # never paginated, does not need the (created_at, id) index
+        pass
+
     name = m.CharField(max_length=32, unique=True)
     model_permissions = m.ManyToManyField(DCFPermission)
 
@@ -67,3 +82,33 @@ class GroupObjectPermission(BaseGenericObjectPermission):
                 name="Make sure no duplicated group object permission entry is saved.",
             ),
         ]
+
+
+class ReadVisibility(m.Model):
+    """
+    One row per object on which a user or a group has an object read
+    permission, maintained from UserObjectPermission and GroupObjectPermission
+    for the models listed in settings.DCF_VISIBILITY_INDEX. Model permissions
+    and group memberships are applied when querying, so changing them never
+    rewrites this table.
+    """
+
+    USER = "u"
+    GROUP = "g"
+
+    id = m.BigAutoField(primary_key=True)
+    model = m.CharField(max_length=100)
+    identity_kind = m.CharField(
+        max_length=1, choices=[(USER, "user"), (GROUP, "group")]
+    )
+    identity_id = m.UUIDField()
+    object_pk = m.UUIDField()
+
+    class Meta:
+        constraints = [
+            m.UniqueConstraint(
+                fields=["model", "identity_kind", "identity_id", "object_pk"],
+                name="Make sure no duplicated read visibility entry is saved.",
+            ),
+        ]
+        indexes = [m.Index(fields=["model", "object_pk"])]
@@ -1,3 +1,9 @@
 from .groups import DefaultGroups, default_groups, register_default_group
+from .identities import anyone_group_id, is_root
 from .site_permission import *
+from .snapshot import (
+    PermissionSnapshot,
+    get_permission_snapshot,
+    load_permission_snapshot,
+)
 from .users import DefaultUsers, default_users, register_default_user
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+from hashlib import blake2b
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Tuple, Type
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import models as m
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from ..models import (
+    DCFAbstractUser,
+    GroupObjectPermission,
+    UserGroup,
+    UserObjectPermission,
+    get_dcf_user_model,
+)
+from .context import memoize
+
+if TYPE_CHECKING:
+    from .snapshot import PermissionSnapshot
+
+LOG = getLogger(__name__)
+
+GLOBAL_VERSION_KEY = "dcf_perm_ver:global"
+
+
+class PermissionCache:
+    """
+    Optional cache shared by all workers, enabled by setting
+    settings.DCF_PERMISSION_CACHE to the alias of a cache in settings.CACHES.
+    Cached permissions are keyed by version tokens of the identities and models
+    they depend on. Any change to the permission tables replaces the affected
+    tokens, so stale entries are simply never read again.
+    """
+
+    def __init__(self, alias: str, timeout: Optional[int]) -> None:
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self) -> BaseCache:
+        return caches[self.alias]
+
+    def get_versions(self, keys: List[str]) -> Tuple[str, ...]:
+        """Returns the version token of each key, creating missing ones. A
+        token evicted by the cache backend is replaced by a new one, which only
+        causes cache misses."""
+        found = self.cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                self.cache.add(key, uuid4().hex, timeout=None)
+                found[key] = self.cache.get(key)
+        return tuple(found[key] for key in keys)
+
+    def bump(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+        self.cache.set_many({key: uuid4().hex for key in keys}, timeout=None)
+
+
+def get_permission_cache() -> Optional[PermissionCache]:
+    """Returns the shared permission cache, or None if it is disabled."""
+    alias = getattr(settings, "DCF_PERMISSION_CACHE", None)
+    if not alias:
+        return None
+    return PermissionCache(
+        alias, getattr(settings, "DCF_PERMISSION_CACHE_TIMEOUT", 300)
+    )
+
+
+def identity_version_key(label: str, pk: Any) -> str:
+    return f"dcf_perm_ver:{label}:{pk}"
+
+
+def hashed_key(prefix: str, *parts: Any) -> str:
+    """Returns a key of fixed length for parts, which include a version token
+    per group of the user and are otherwise unbounded, while cache backends
+    such as memcached limit keys to 250 characters."""
+    digest = blake2b(":".join(map(str, parts)).encode(), digest_size=20)
+    return f"{prefix}:{digest.hexdigest()}"
+
+
+def cached_snapshot(
+    identity: DCFAbstractUser | UserGroup,
+    anyone_pk: Any,
+    load: Callable[[], PermissionSnapshot],
+) -> PermissionSnapshot:
+    if (pcache := get_permission_cache()) is None:
+        return load()
+    label = identity._meta.label_lower
+    versions = pcache.get_versions(
+        [
+            GLOBAL_VERSION_KEY,
+            identity_version_key(label, identity.pk),
+            identity_version_key(UserGroup._meta.label_lower, anyone_pk),
+        ]
+    )
+    key = hashed_key("dcf_perm:snapshot", label, identity.pk, *versions)
+    # The snapshot also depends on the version of every group the user belongs
+    # to, which are only known once the snapshot is loaded.
+    if (entry := pcache.cache.get(key)) is not None:
+        snapshot, group_versions = entry
+        if _group_versions(pcache, snapshot) == group_versions:
+            return snapshot
+    snapshot = load()
+    pcache.cache.set(
+        key, (snapshot, _group_versions(pcache, snapshot)), timeout=pcache.timeout
+    )
+    return snapshot
+
+
+def cached_verdict(
+    identity: DCFAbstractUser | UserGroup,
+    snapshot: PermissionSnapshot,
+    anyone_pk: Any,
+    model: Type[m.Model],
+    pk: Any,
+    perms: str,
+    field_name: Optional[str],
+    compute: Callable[[], bool],
+) -> bool:
+    if (pcache := get_permission_cache()) is None:
+        return compute()
+    label = identity._meta.label_lower
+    fingerprint = memoize(
+        ("fingerprint", label, identity.pk),
+        lambda: hashed_key(
+            "",
+            *pcache.get_versions(
+                [
+                    GLOBAL_VERSION_KEY,
+                    identity_version_key(label, identity.pk),
+                    identity_version_key(UserGroup._meta.label_lower, anyone_pk),
+                ]
+            ),
+            *_group_versions(pcache, snapshot),
+        ),
+    )
+    key = hashed_key(
+        "dcf_perm:object",
+        label,
+        identity.pk,
+        fingerprint,
+        model._meta.label_lower,
+        pk,
+        perms,
+        field_name or "",
+    )
+    if (verdict := pcache.cache.get(key)) is not None:
+        return verdict
+    verdict = compute()
+    pcache.cache.set(key, verdict, timeout=pcache.timeout)
+    return verdict
+
+
+def _group_versions(
+    pcache: PermissionCache, snapshot: PermissionSnapshot
+) -> Tuple[str, ...]:
+    label = UserGroup._meta.label_lower
+    return pcache.get_versions(
+        [identity_version_key(label, pk) for pk in sorted(snapshot.group_pks)]
+    )
+
+
+def bump_versions(keys: Iterable[str]) -> None:
+    """Replaces the version tokens now, and again when the current transaction
+    commits, so that no other worker can cache data read before the commit
+    under the new tokens."""
+    if (pcache := get_permission_cache()) is None:
+        return
+    keys = list(keys)
+    pcache.bump(keys)
+    transaction.on_commit(lambda: pcache.bump(keys))
+
+
+def bump_identity_version(identity: DCFAbstractUser | UserGroup) -> None:
+    bump_versions([identity_version_key(identity._meta.label_lower, identity.pk)])
+
+
+def bump_global_version() -> None:
+    bump_versions([GLOBAL_VERSION_KEY])
+
+
+@receiver(post_save, sender=UserObjectPermission)
+@receiver(post_delete, sender=UserObjectPermission)
+def bump_on_user_object_permission_change(
+    sender: Any, instance: UserObjectPermission, **kwargs: Any
+) -> None:
+    bump_versions(
+        [identity_version_key(get_dcf_user_model()._meta.label_lower, instance.user_id)]  # type: ignore
+    )
+
+
+@receiver(post_save, sender=GroupObjectPermission)
+@receiver(post_delete, sender=GroupObjectPermission)
+def bump_on_group_object_permission_change(
+    sender: Any, instance: GroupObjectPermission, **kwargs: Any
+) -> None:
+    bump_versions(
+        [identity_version_key(UserGroup._meta.label_lower, instance.group_id)]  # type: ignore
+    )
+
+
+@receiver(m2m_changed)
+def bump_on_m2m_changed(
+    sender: Any,
+    instance: Any,
+    action: str,
+    reverse: bool,
+    model: Type[m.Model],
+    pk_set: Optional[Iterable[Any]],
+    **kwargs: Any,
+) -> None:
+    """Handles changes to the model_permissions of users and groups, and to
+    the groups of users, from either side of the relation."""
+    if not action.startswith("post_"):
+        return
+    User = get_dcf_user_model()
+    if sender is User.model_permissions.through:
+        identity_model: Type[m.Model] = User
+    elif sender is UserGroup.model_permissions.through:
+        identity_model = UserGroup
+    elif sender is User.groups.through:
+        identity_model = User
+    else:
+        return
+    label = identity_model._meta.label_lower
+    if not reverse:
+        bump_versions([identity_version_key(label, instance.pk)])
+    elif pk_set is None:
+        # cleared from the reverse side, the affected identities are unknown
+        bump_global_version()
+    else:
+        bump_versions([identity_version_key(label, pk) for pk in pk_set])
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging import getLogger
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, TypeVar
+
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+LOG = getLogger(__name__)
+
+V = TypeVar("V")
+
+
+class PermissionContext:
+    """
+    Memoizes permission lookups (model level grants, group memberships and
+    per-object verdicts) for the lifetime of one request. Everything is dropped
+    as soon as permissions, users, groups, AccessControlled objects or the
+    models that permission rules traverse are written, so a verdict is never
+    served after the data it was computed from has changed.
+    """
+
+    def __init__(self) -> None:
+        self.__cache: Dict[Hashable, Any] = {}
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], V]) -> V:
+        if key in self.__cache:
+            return self.__cache[key]
+        value = self.__cache[key] = compute()
+        return value
+
+    def clear(self) -> None:
+        self.__cache.clear()
+
+    def __len__(self) -> int:
+        return len(self.__cache)
+
+
+_current: ContextVar[Optional[PermissionContext]] = ContextVar(
+    "dcf_permission_context", default=None
+)
+
+
+def get_permission_context() -> Optional[PermissionContext]:
+    """Returns the active permission context, or None outside of a request."""
+    return _current.get()
+
+
+@contextmanager
+def permission_context() -> Iterator[PermissionContext]:
+    """Activates a permission context. Nested calls share the outer context."""
+    if (context := _current.get()) is not None:
+        yield context
+        return
+    context = PermissionContext()
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def memoize(key: Hashable, compute: Callable[[], V]) -> V:
+    """Returns the memoized value for key if a permission context is active,
+    otherwise simply calls compute()."""
+    if (context := _current.get()) is None:
+        return compute()
+    return context.get_or_compute(key, compute)
+
+
+def invalidate_permission_context() -> None:
+    if (context := _current.get()) is not None:
+        context.clear()
+
+
+def invalidate_permission_context_on_write(sender: Any, **kwargs: Any) -> None:
+    """
+    Drops the memoized permissions after a write to the permission tables, the
+    users and groups, an AccessControlled model, whose permission manager may
+    grant permissions based on its data, or a model that the lookups of a
+    permission rule traverse. Writes to other models, such as the models
+    queried by an Exists(...) in a rule, and bulk operations, which do not
+    send signals, must call invalidate_permission_context() instead.
+    """
+    invalidate_permission_context()
+
+
+def connect_permission_context(sender: Any) -> None:
+    """Invalidates the permission context when an instance of sender is saved
+    or deleted. The receivers are only connected to the models permissions
+    depend on, a post_delete receiver prevents the fast delete of sender."""
+    label = sender if isinstance(sender, str) else sender._meta.label_lower
+    for signal in [post_save, post_delete]:
+        signal.connect(
+            invalidate_permission_context_on_write,
+            sender=sender,
+            dispatch_uid=f"{label}.invalidate_permission_context",
+        )
+
+
+for _sender in [
+    "django_client_framework.DCFPermission",
+    "django_client_framework.UserObjectPermission",
+    "django_client_framework.GroupObjectPermission",
+    "django_client_framework.UserGroup",
+    settings.AUTH_USER_MODEL,
+]:
+    connect_permission_context(_sender)
+
+# m2m_changed has no effect on deletes, the relations of any model, such as
+# the groups of users, can grant permissions
+m2m_changed.connect(invalidate_permission_context_on_write)
@@ -1,6 +1,7 @@
 from typing import Callable, Dict, TypeVar
 
 from ..models import UserGroup
+from .identities import identity_registry
 
 T = TypeVar("T", bound="Callable")
 
@@ -26,7 +27,7 @@ class DefaultGroups:
 
     def __getattr__(self, name: str) -> UserGroup:
         if name in self.group_names:
-            return UserGroup.objects.get_or_create(name=name)[0]
+            return identity_registry.get(UserGroup, "name", name)
         else:
             raise AttributeError(f"{name} is not a default group")
 
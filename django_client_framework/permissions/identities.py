@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import copy
+from logging import getLogger
+from threading import Lock
+from typing import Any, Dict, Tuple, Type
+
+from django.conf import settings
+from django.db import models as m
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models import DCFAbstractUser, UserGroup, get_dcf_user_model
+
+LOG = getLogger(__name__)
+
+
+class IdentityRegistry:
+    """
+    Process-wide cache of the default users and groups, such as
+    default_users.root and default_groups.anyone, which are otherwise looked up
+    with get_or_create() on every access. An entry is dropped when its row is
+    saved or deleted, and everything is dropped after migrations.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._instances: Dict[Tuple[str, str], m.Model] = {}
+
+    def get(self, model: Type[m.Model], field: str, name: str) -> Any:
+        """Returns a copy of the instance of model whose field equals name,
+        creating it if needed."""
+        key = (model._meta.label_lower, name)
+        instance = self._instances.get(key)
+        if instance is None:
+            instance, created = model._default_manager.get_or_create(**{field: name})
+            if created:
+                # a rolled back row must not be remembered
+                transaction.on_commit(lambda: self._store(key, instance))
+            else:
+                self._store(key, instance)
+        return copy.copy(instance)
+
+    def get_id(self, model: Type[m.Model], field: str, name: str) -> Any:
+        key = (model._meta.label_lower, name)
+        instance = self._instances.get(key)
+        if instance is None:
+            return self.get(model, field, name).pk
+        return instance.pk
+
+    def forget(self, model: Type[m.Model], pk: Any) -> None:
+        label = model._meta.label_lower
+        with self._lock:
+            for key, instance in list(self._instances.items()):
+                if key[0] == label and instance.pk == pk:
+                    del self._instances[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._instances.clear()
+
+    def _store(self, key: Tuple[str, str], instance: m.Model) -> None:
+        with self._lock:
+            self._instances[key] = instance
+
+
+identity_registry = IdentityRegistry()
+
+
+def root_user_id() -> Any:
+    return identity_registry.get_id(get_dcf_user_model(), "username", "root")
+
+
+def anyone_group_id() -> Any:
+    return identity_registry.get_id(UserGroup, "name", "anyone")
+
+
+def is_root(user: DCFAbstractUser) -> bool:
+    return user.pk == root_user_id()
+
+
+@receiver(post_save, sender=UserGroup)
+@receiver(post_delete, sender=UserGroup)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_identity_on_change(sender: Any, instance: Any, **kwargs: Any) -> None:
+    identity_registry.forget(sender, instance.pk)
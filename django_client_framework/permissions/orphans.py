@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from logging import getLogger
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from django.apps import apps
+from django.db import models as m
+from django.db import transaction
+
+from ..models import (
+    DCFPermission,
+    GroupObjectPermission,
+    ReadVisibility,
+    UserObjectPermission,
+)
+from ..models.object_permissions import delete_rows
+from .context import invalidate_permission_context
+from .registry import permission_registry
+
+LOG = getLogger(__name__)
+
+DEFAULT_GC_CHUNK_SIZE = 1000
+
+
+def delete_object_permissions(model: Type[m.Model], pks: Iterable[Any]) -> int:
+    """Deletes the object permissions of the objects of model whose pks are
+    pks, and returns the number of rows deleted."""
+    pks = list(pks)
+    permission_pks = [perm.pk for perm in permission_registry.for_model(model)]
+    count = 0
+    for perm_model in [UserObjectPermission, GroupObjectPermission]:
+        rows = perm_model.objects.filter(  # type: ignore
+            permission_id__in=permission_pks, object_pk__in=pks
+        )
+        count += delete_rows(rows)
+    delete_rows(
+        ReadVisibility.objects.filter(model=model._meta.label_lower, object_pk__in=pks)
+    )
+    if count:
+        invalidate_permission_context()
+    return count
+
+
+def collect_orphaned_permissions(
+    models: Optional[Iterable[Type[m.Model]]] = None,
+    *,
+    chunk_size: int = DEFAULT_GC_CHUNK_SIZE,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    Deletes the object permissions whose object no longer exists, for models,
+    which defaults to every model that has permissions, including models that
+    were removed from the project. Returns the number of orphaned rows of each
+    model. Orphans are found with an anti-join on the object table and deleted
+    in chunks of chunk_size, each in its own short transaction, so that the
+    permission tables are never locked for long. With dry_run, the orphans are
+    only counted.
+    """
+    counts: Dict[str, int] = {}
+    for label, model, permission_pks in _permission_groups(models):
+        count = 0
+        for perm_model in [UserObjectPermission, GroupObjectPermission]:
+            orphans = perm_model.objects.filter(  # type: ignore
+                permission_id__in=permission_pks
+            )
+            if model is not None:
+                orphans = orphans.exclude(_object_exists(model))
+            if dry_run:
+                count += orphans.count()
+            else:
+                count += _delete_in_chunks(orphans, chunk_size)
+        if model is not None and not dry_run:
+            _delete_in_chunks(
+                ReadVisibility.objects.filter(model=model._meta.label_lower).exclude(
+                    _object_exists(model)
+                ),
+                chunk_size,
+            )
+        if count:
+            LOG.info(f"{'found' if dry_run else 'deleted'} {count} orphans of {label}")
+            counts[label] = count
+    if counts and not dry_run:
+        invalidate_permission_context()
+    return counts
+
+
+def _object_exists(model: Type[m.Model]) -> m.Exists:
+    # the base manager never hides rows, unlike custom default managers
+    return m.Exists(model._base_manager.filter(pk=m.OuterRef("object_pk")))
+
+
+def _permission_groups(
+    models: Optional[Iterable[Type[m.Model]]],
+) -> List[Tuple[str, Optional[Type[m.Model]], List[Any]]]:
+    """Returns the label, the model (None if it no longer exists) and the
+    permission pks of each model to collect."""
+    if models is not None:
+        return [
+            (
+                model._meta.label,
+                model,
+                [perm.pk for perm in permission_registry.for_model(model)],
+            )
+            for model in models
+        ]
+    groups: Dict[Tuple[str, str], List[Any]] = {}
+    for pk, app_name, model_name in DCFPermission.objects.values_list(
+        "pk", "app_name", "model_name"
+    ):
+        groups.setdefault((app_name, model_name), []).append(pk)
+    result: List[Tuple[str, Optional[Type[m.Model]], List[Any]]] = []
+    for (app_name, model_name), permission_pks in sorted(groups.items()):
+        try:
+            model: Optional[Type[m.Model]] = apps.get_model(app_name, model_name)
+        except LookupError:
+            model = None
+        label = model._meta.label if model else f"{app_name}.{model_name}"
+        result.append((label, model, permission_pks))
+    return result
+
+
+def _delete_in_chunks(orphans: m.QuerySet, chunk_size: int) -> int:
+    count = 0
+    last_pk = None
+    while True:
+        chunk = orphans.order_by("pk")
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return count
+        with transaction.atomic():
+            count += delete_rows(orphans.model.objects.filter(pk__in=pks))
+        last_pk = pks[-1]
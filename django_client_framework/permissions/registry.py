@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+from logging import getLogger
+from threading import RLock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from django.db import models as m
+from django.db import transaction
+
+from ..models import DCFPermission
+from ..models.abstract.access_controlled import AccessControlled
+
+LOG = getLogger(__name__)
+
+ACTION_SHORTCUTS = {
+    "r": "read",
+    "w": "write",
+    "c": "create",
+    "d": "delete",
+}
+
+# Must match the max_length of the columns of DCFPermission.
+MAX_NAME_LENGTH = 32
+
+PermissionKey = Tuple[str, str, str, Optional[str]]
+
+
+class PermissionRegistry:
+    """
+    Holds every DCFPermission row in memory. All rows are loaded in one query
+    at first use, together with the rows implied by the registered models and
+    their fields, which are created in bulk if missing. Permissions of models
+    or fields that are not known in advance are created on demand. Created
+    rows are only held once their transaction commits, a rolled back row must
+    not be remembered.
+    """
+
+    def __init__(self) -> None:
+        self._lock = RLock()
+        self._permissions: Optional[Dict[PermissionKey, DCFPermission]] = None
+        self._by_pk: Dict[Any, DCFPermission] = {}
+        # pks of the rows created in transactions that are not committed yet
+        self._uncommitted: Set[Any] = set()
+
+    def get(
+        self, shortcut: str, model: Type[m.Model], field_name: Optional[str]
+    ) -> DCFPermission:
+        action = ACTION_SHORTCUTS[shortcut]
+        if field_name:
+            if not model._meta.get_field(field_name):
+                raise AttributeError(
+                    f'field named "{field_name}" not found on model {model}'
+                )
+        key = (model._meta.app_label, model._meta.model_name, action, field_name)
+        permissions = self._permissions
+        if permissions is None:
+            permissions = self.load()
+        if (perm := permissions.get(key)) is not None:
+            return perm
+        with self._lock:
+            permissions = self.load()
+            if (perm := permissions.get(key)) is not None:
+                return perm
+            LOG.debug(f"creating permission {key}")
+            perm, created = DCFPermission.objects.get_or_create(
+                app_name=key[0], model_name=key[1], action=key[2], field_name=key[3]
+            )
+            if created:
+                self._uncommitted.add(perm.pk)
+            if perm.pk in self._uncommitted:
+                transaction.on_commit(lambda: self._store(key, perm))
+            else:
+                self._store(key, perm)
+            return perm
+
+    def get_by_pk(self, pk: Any) -> Optional[DCFPermission]:
+        """Returns the loaded permission whose pk is pk, or None if it is not
+        loaded, such as a duplicated row."""
+        self.load()
+        return self._by_pk.get(pk)
+
+    def for_model(self, model: Type[m.Model]) -> List[DCFPermission]:
+        """Returns the loaded permissions of model and of its fields."""
+        app_name, model_name = model._meta.app_label, model._meta.model_name
+        return [
+            perm
+            for key, perm in self.load().items()
+            if key[0] == app_name and key[1] == model_name
+        ]
+
+    def load(self) -> Dict[PermissionKey, DCFPermission]:
+        """Returns the loaded permissions, loading them if needed."""
+        if (permissions := self._permissions) is not None:
+            return permissions
+        with self._lock:
+            if self._permissions is None:
+                permissions = self._fetch()
+                missing = [
+                    key for key in _implied_permission_keys() if key not in permissions
+                ]
+                if missing:
+                    LOG.debug(f"creating {len(missing)} permissions")
+                    existing = {perm.pk for perm in permissions.values()}
+                    DCFPermission.objects.bulk_create(
+                        [
+                            DCFPermission(
+                                app_name=app_name,
+                                model_name=model_name,
+                                action=action,
+                                field_name=field_name,
+                            )
+                            for app_name, model_name, action, field_name in missing
+                        ],
+                        ignore_conflicts=True,
+                    )
+                    # rows inserted concurrently by another worker win
+                    permissions = self._fetch()
+                    self._uncommitted.update(
+                        perm.pk
+                        for perm in permissions.values()
+                        if perm.pk not in existing
+                    )
+                # a rolled back row must not be remembered, including a row
+                # created earlier in the same transaction
+                if any(perm.pk in self._uncommitted for perm in permissions.values()):
+                    transaction.on_commit(lambda: self._publish(permissions))
+                    return permissions
+                self._publish(permissions)
+            assert self._permissions is not None
+            return self._permissions
+
+    def _publish(self, permissions: Dict[PermissionKey, DCFPermission]) -> None:
+        with self._lock:
+            for perm in permissions.values():
+                self._uncommitted.discard(perm.pk)
+            if self._permissions is None:
+                self._by_pk = {perm.pk: perm for perm in permissions.values()}
+                self._permissions = permissions
+
+    def _store(self, key: PermissionKey, perm: DCFPermission) -> None:
+        with self._lock:
+            self._uncommitted.discard(perm.pk)
+            if self._permissions is not None:
+                self._permissions.setdefault(key, perm)
+                self._by_pk[perm.pk] = perm
+
+    def clear(self) -> None:
+        """Drops the loaded permissions, they are loaded again at next use."""
+        with self._lock:
+            self._permissions = None
+            self._by_pk = {}
+
+    def _fetch(self) -> Dict[PermissionKey, DCFPermission]:
+        permissions: Dict[PermissionKey, DCFPermission] = {}
+        # The unique constraint doesn't prevent duplicated rows with a null
+        # field_name, the oldest one is always picked.
+        for perm in DCFPermission.objects.order_by("created_at", "id"):
+            key = (perm.app_name, perm.model_name, perm.action, perm.field_name)
+            permissions.setdefault(key, perm)
+        return permissions
+
+
+def _registered_models() -> List[Type[m.Model]]:
+    from ..api.base_model_api import BaseModelAPI
+
+    models: List[Type[m.Model]] = []
+    seen: Set[Type[m.Model]] = set()
+    for model in [*BaseModelAPI.models, *_subclasses(AccessControlled)]:
+        if model._meta.abstract or model in seen:
+            continue
+        seen.add(model)
+        models.append(model)
+    return models
+
+
+def _subclasses(cls: Type[Any]) -> Iterable[Type[Any]]:
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
+
+
+def _implied_permission_keys() -> Iterable[PermissionKey]:
+    for model in _registered_models():
+        app_name, model_name = model._meta.app_label, model._meta.model_name
+        if len(app_name) > MAX_NAME_LENGTH or len(model_name) > MAX_NAME_LENGTH:
+            continue
+        field_names: List[Optional[str]] = [None]
+        for field in model._meta.get_fields():
+            if len(field.name) <= MAX_NAME_LENGTH:
+                field_names.append(field.name)
+        for action in ACTION_SHORTCUTS.values():
+            for field_name in field_names:
+                yield (app_name, model_name, action, field_name)
+
+
+permission_registry = PermissionRegistry()
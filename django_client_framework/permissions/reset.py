@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+from time import monotonic
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Type
+from uuid import UUID
+
+from django.apps import apps
+from django.db import connections
+from django.db import models as m
+from django.db import transaction
+
+from ..models import AccessControlled, UserObjectPermission, get_dcf_user_model
+
+LOG = getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class ResetTask:
+    """
+    Resets the permissions of the objects of a model whose pks are within
+    [start, end). Objects are streamed in pk order and processed in chunks,
+    each in its own transaction. When a checkpoint_dir is given, the last
+    processed pk is saved after every chunk, and a new task for the same range
+    resumes from there. The checkpoint records the range, and the number of
+    ranges the model was split into, so that it is never resumed by a task of
+    another split.
+    """
+
+    def __init__(
+        self,
+        model: Type[m.Model],
+        start: Optional[Any] = None,
+        end: Optional[Any] = None,
+        *,
+        index: int = 0,
+        ranges: int = 1,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checkpoint_dir: Optional[str] = None,
+    ) -> None:
+        self.model = model
+        self.start = start
+        self.end = end
+        self.index = index
+        self.ranges = ranges
+        self.chunk_size = chunk_size
+        self.checkpoint_dir = checkpoint_dir
+
+    def __repr__(self) -> str:
+        return f"<ResetTask {self.model._meta.label} #{self.index}>"
+
+    @property
+    def checkpoint_path(self) -> Optional[str]:
+        if self.checkpoint_dir is None:
+            return None
+        return os.path.join(
+            self.checkpoint_dir, f"{self.model._meta.label_lower}.{self.index}.json"
+        )
+
+    @property
+    def split(self) -> Dict[str, Any]:
+        return {
+            "start": None if self.start is None else str(self.start),
+            "end": None if self.end is None else str(self.end),
+            "ranges": self.ranges,
+        }
+
+    def load_checkpoint(self) -> Dict[str, Any]:
+        """Returns the saved progress. Raises ValueError if the checkpoint was
+        saved by a task of another split, such as another number of
+        workers."""
+        path = self.checkpoint_path
+        if path is None or not os.path.exists(path):
+            return {"last_pk": None, "rows": 0, "done": False}
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if {key: checkpoint.get(key) for key in self.split} != self.split:
+            raise ValueError(
+                f"{path} was saved by a run with another number of workers,"
+                " resume with the same number of workers or delete the"
+                " checkpoints to start over"
+            )
+        return checkpoint
+
+    def save_checkpoint(self, last_pk: Any, rows: int, done: bool) -> None:
+        path = self.checkpoint_path
+        if path is None:
+            return
+        # write then rename, so that an interrupted write never loses progress
+        with open(path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    **self.split,
+                    "last_pk": None if last_pk is None else str(last_pk),
+                    "rows": rows,
+                    "done": done,
+                },
+                f,
+            )
+        os.replace(path + ".tmp", path)
+
+    def run(self) -> int:
+        """Returns the number of objects processed by this run."""
+        checkpoint = self.load_checkpoint()
+        if checkpoint["done"]:
+            LOG.info(f"{self} already done")
+            return 0
+        last_pk = checkpoint["last_pk"]
+        rows = checkpoint["rows"]
+        processed = 0
+        started = monotonic()
+        for chunk in self.chunks(last_pk):
+            with transaction.atomic():
+                reset_objects(self.model, chunk)
+            last_pk = chunk[-1].pk
+            rows += len(chunk)
+            processed += len(chunk)
+            self.save_checkpoint(last_pk, rows, done=False)
+            elapsed = monotonic() - started
+            LOG.info(
+                f"{self}: {rows} rows, {processed / max(elapsed, 1e-6):.0f} rows/sec"
+            )
+        self.save_checkpoint(last_pk, rows, done=True)
+        return processed
+
+    def chunks(self, after: Optional[Any]) -> Iterator[List[Any]]:
+        queryset = self.model._default_manager.order_by("pk")
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        elif self.start is not None:
+            queryset = queryset.filter(pk__gte=self.start)
+        if self.end is not None:
+            queryset = queryset.filter(pk__lt=self.end)
+        chunk: List[Any] = []
+        for instance in queryset.iterator(chunk_size=self.chunk_size):
+            chunk.append(instance)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def reset_objects(model: Type[m.Model], instances: Sequence[Any]) -> None:
+    """Resets the permissions of many objects of model. Managers that override
+    reset_perms() are called on each object. Managers that implement
+    get_perms() are synced in bulk, other managers fall back to deleting the
+    user object permissions of the objects in one query and calling
+    add_perms() on each object."""
+    from .site_permission import sync_object_perms
+
+    manager = model.get_permissionmanager_class()()  # type: ignore
+    if type(manager).reset_perms is not AccessControlled.PermissionManager.reset_perms:
+        for instance in instances:
+            manager.reset_perms(instance)
+        return
+    grants = {instance.pk: manager.get_perms(instance) for instance in instances}
+    sync_object_perms(
+        model,
+        {
+            pk: object_grants
+            for pk, object_grants in grants.items()
+            if object_grants is not None
+        },
+    )
+    legacy = [instance for instance in instances if grants[instance.pk] is None]
+    if not legacy:
+        return
+    delete_user_object_perms(model, [instance.pk for instance in legacy])
+    for instance in legacy:
+        manager.add_perms(instance)
+
+
+def delete_user_object_perms(model: Type[m.Model], pks: Sequence[Any]) -> None:
+    """Deletes the user object permissions of the objects of model whose pks
+    are pks in one query, before add_perms() grants them again, and updates
+    the caches and the visibility index, which are not told by signals."""
+    from ..models.object_permissions import delete_rows
+    from .cache import bump_versions, identity_version_key
+    from .context import invalidate_permission_context
+    from .visibility import refresh_visibility
+
+    rows = UserObjectPermission.objects.filter(
+        permission__model_name=model._meta.model_name,
+        permission__app_name=model._meta.app_label,
+        object_pk__in=pks,
+    )
+    user_pks = set(rows.values_list("user_id", flat=True))
+    if not user_pks:
+        return
+    delete_rows(rows)
+    refresh_visibility(model, pks)
+    invalidate_permission_context()
+    label = get_dcf_user_model()._meta.label_lower
+    bump_versions(identity_version_key(label, user_pk) for user_pk in user_pks)
+
+
+def access_controlled_models() -> List[Type[m.Model]]:
+    """Returns every concrete model extending AccessControlled."""
+    return [
+        model
+        for model in apps.get_models()
+        if issubclass(model, AccessControlled) and not model._meta.proxy
+    ]
+
+
+def plan_reset(
+    models: Iterable[Type[m.Model]],
+    *,
+    ranges: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    checkpoint_dir: Optional[str] = None,
+) -> List[ResetTask]:
+    """Splits the work into tasks. UUID primary keys are random, so splitting
+    the UUID space into equal ranges gives tasks of about the same size."""
+    tasks: List[ResetTask] = []
+    for model in models:
+        if ranges > 1 and isinstance(model._meta.pk, m.UUIDField):
+            bounds: List[Optional[UUID]] = [
+                UUID(int=(2**128) * i // ranges) for i in range(ranges)
+            ]
+            bounds[0] = None
+            bounds.append(None)
+        else:
+            bounds = [None, None]
+        for index in range(len(bounds) - 1):
+            tasks.append(
+                ResetTask(
+                    model,
+                    bounds[index],
+                    bounds[index + 1],
+                    index=index,
+                    ranges=len(bounds) - 1,
+                    chunk_size=chunk_size,
+                    checkpoint_dir=checkpoint_dir,
+                )
+            )
+    return tasks
+
+
+def run_reset(
+    models: Iterable[Type[m.Model]],
+    *,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    checkpoint_dir: Optional[str] = None,
+) -> int:
+    """
+    Resets the permissions of every object of models, and returns the number of
+    objects processed. With workers > 1, the pk range of every model is split
+    into several tasks run on a pool of processes. With a checkpoint_dir, an
+    interrupted run resumes where it stopped; delete the directory to start
+    over. Raises ValueError if the checkpoints were saved by a run with
+    another number of workers.
+    """
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    tasks = plan_reset(
+        models,
+        ranges=workers * 4 if workers > 1 else 1,
+        chunk_size=chunk_size,
+        checkpoint_dir=checkpoint_dir,
+    )
+    for task in tasks:
+        # fail before any work is done
+        task.load_checkpoint()
+    started = monotonic()
+    if workers > 1:
+        # the forked processes must not share the connections of this one
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as pool:
+            total = sum(pool.map(_run_task, tasks))
+    else:
+        total = sum(task.run() for task in tasks)
+    elapsed = monotonic() - started
+    LOG.info(
+        f"reset permissions of {total} objects in {elapsed:.1f}s"
+        f" ({total / max(elapsed, 1e-6):.0f} rows/sec)"
+    )
+    return total
+
+
+def _run_task(task: ResetTask) -> int:
+    try:
+        return task.run()
+    finally:
+        connections.close_all()
@@ -1,14 +1,35 @@
 from __future__ import annotations
 
-from functools import lru_cache, reduce
+import copy
+from itertools import islice
 from logging import getLogger
-from operator import concat
-from typing import Any, Iterable, List, Optional, Sequence, Type, TypeVar, cast
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 from deprecation import deprecated
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
 from django.db import models as m
-from django.db import transaction
+from django.db import router, transaction
+from django.db.models import BooleanField, Case, Value, When
 from django.db.models.base import ModelBase
+from django.db.models.constants import LOOKUP_SEP
 from django.db.models.query import QuerySet
 
 from django_client_framework.models.abstract.model import DCFModel, IDCFModel
@@ -18,14 +39,38 @@ from ..models import (
     DCFAbstractUser,
     DCFPermission,
     GroupObjectPermission,
+    ReadVisibility,
     UserGroup,
     UserObjectPermission,
+    get_dcf_user_model,
+)
+from ..models.object_permissions import BaseGenericObjectPermission, delete_rows
+from .cache import (
+    bump_global_version,
+    bump_identity_version,
+    bump_versions,
+    cached_verdict,
+    identity_version_key,
+)
+from .context import invalidate_permission_context, memoize
+from .identities import anyone_group_id, is_root
+from .registry import ACTION_SHORTCUTS, permission_registry
+from .reset import DEFAULT_CHUNK_SIZE, access_controlled_models, run_reset
+from .snapshot import PermissionSnapshot, _through, get_permission_snapshot
+from .statistics import INLINE, SKIP, SUBQUERY, get_inline_limit, grant_statistics
+from .updates import flush_permission_updates
+from .visibility import (
+    flush_visibility_refreshes,
+    refresh_visibility,
+    visibility_index_enabled,
+    visibility_predicate,
 )
-from .groups import default_groups
 
 LOG = getLogger(__name__)
 
 T = TypeVar("T", bound=IDCFModel)
+ADD_PERMS_CHUNK_SIZE = 2000
+
 M = TypeVar("M", bound=DCFModel)
 
 
@@ -34,39 +79,11 @@ def get_permission_for_model(
     model: Type[m.Model],
     *,
     field_name: str | None,
-) -> DCFPermission:
-    return _get_permission_for_model(shortcut, model, field_name=field_name)
-
-
-@lru_cache
-def _get_permission_for_model(
-    shortcut: str,
-    model: Type[m.Model],
-    *,
-    field_name: str | None,
 ) -> DCFPermission:
     """
     Returns permission object for model and field.
     """
-    action_shortcuts = {
-        "r": "read",
-        "w": "write",
-        "c": "create",
-        "d": "delete",
-    }
-    action = action_shortcuts[shortcut]
-    if field_name:
-        if not model._meta.get_field(field_name):
-            raise AttributeError(
-                f'field named "{field_name}" not found on model {model}'
-            )
-    p, _created = DCFPermission.objects.get_or_create(
-        app_name=model._meta.app_label,
-        model_name=model._meta.model_name,
-        action=action,
-        field_name=field_name,
-    )
-    return p
+    return permission_registry.get(shortcut, model, field_name)
 
 
 def filter_queryset_by_perms_shortcut(
@@ -74,6 +91,8 @@ def filter_queryset_by_perms_shortcut(
     identity: DCFAbstractUser | UserGroup,
     queryset: QuerySet[M],
     field_name: str | None = None,
+    *,
+    adaptive: bool = False,
 ) -> QuerySet[M]:
     """Filters queryset by keeping objects that identity has all
     permissions specified by perms. If field_name is specified, additionally
@@ -101,91 +120,38 @@ def filter_queryset_by_perms_shortcut(
     The goal is to find the maximal subset of O such each node is connected to
     every nodes in the input P nodes via one of the determined GOP nodes, or is
     directly connected to P.
-    """
-    required_permissions: List[List[DCFPermission]] = []
-    for s in perms:
-        any_of = [get_permission_for_model(s, queryset.model, field_name=None)]
-        if field_name is not None:
-            any_of.append(
-                get_permission_for_model(s, queryset.model, field_name=field_name)
-            )
-        required_permissions.append(any_of)
-
-    if isinstance(identity, UserGroup):
-        return _filter_for_groups(
-            required_permissions,
-            UserGroup.objects.filter(pk__in=[identity.pk, default_groups.anyone.pk]),
-            queryset,
-        )
-    else:
-        if _user_has_superpower(identity):
-            return queryset
-        qs_user = _filter_for_user(required_permissions, identity, queryset)
-        qs_grp = _filter_for_groups(
-            required_permissions,
-            UserGroup.objects.filter(
-                pk__in=[
-                    *identity.groups.values_list("pk", flat=True),
-                    default_groups.anyone.pk,
-                ]
-            ),
-            queryset,
-        )
-        return QuerySet(model=queryset.model).filter(
-            id__in=qs_user.union(qs_grp).values_list("id", flat=True)
-        )
-
 
-def _filter_for_groups(
-    required_perms: Sequence[Sequence[DCFPermission]],
-    groups: QuerySet[UserGroup],
-    queryset: QuerySet[M],
-) -> QuerySet[M]:
-    """Build a query for filtering by permission (in conjunctive normal
-    form: disjunctive for the nested list, conjunctive for outer list) of
-    the groups (disjunctive)."""
-    gops = GroupObjectPermission.objects.filter(
-        group__in=groups,
-        permission__in=reduce(concat, required_perms),
-    )  # shouldn't hit db
-    check_gop = False
-    for pls in required_perms:
-        # if user has model level permission then remove the corresponding GOP.
-        if groups.filter(model_permissions__in=pls).exists():
-            gops = gops.exclude(permission__in=pls)  # shouldn't hit db
-        else:
-            check_gop = True
-    if check_gop:
-        # should hit db once for fetching gops
-        return queryset.filter(id__in=gops.values_list("object_pk"))
-    else:
+    All of this is compiled into a single predicate on the object
+    permissions, see _perms_predicate(), and the queryset remains lazy. With
+    adaptive, for callers that evaluate the queryset right away, the granted
+    objects are fetched first, and small sets are written inline as IN lists
+    instead of correlated EXISTS subqueries, see _object_grants_clause().
+    """
+    flush_permission_updates()
+    if isinstance(identity, DCFAbstractUser) and is_root(identity):
         return queryset
-
-
-def _filter_for_user(
-    required_perms: Sequence[Sequence[DCFPermission]],
-    user: DCFAbstractUser,
-    queryset: QuerySet[M],
-) -> QuerySet[M]:
-    """Build a query for filtering by permission (in conjunctive normal
-    form: disjunctive for the nested list, conjunctive for outer list) of
-    the user."""
-    uops = UserObjectPermission.objects.filter(
-        user=user,
-        permission__in=reduce(concat, required_perms),
-    )  # shouldn't hit db
-    check_gop = False
-    for pls in required_perms:
-        # if user has model level permission then remove the corresponding UOP.
-        if user.model_permissions.filter(id__in=[p.pk for p in pls]).exists():
-            uops = uops.exclude(permission__in=pls)  # shouldn't hit db
-        else:
-            check_gop = True
-    if check_gop:
-        # should hit db once for fetching uops
-        return queryset.filter(id__in=uops.values_list("object_pk"))
-    else:
+    model = queryset.model
+    required_permissions = _get_required_permissions(perms, model, field_name)
+    snapshot = get_permission_snapshot(identity)
+    indexed = perms == "r" and field_name is None and visibility_index_enabled(model)
+    predicate = _perms_predicate(
+        required_permissions,
+        identity,
+        snapshot,
+        model,
+        adaptive=adaptive and not indexed,
+    )
+    if predicate is None:
+        # public models never need a UOP/GOP subquery
         return queryset
+    if indexed:
+        flush_visibility_refreshes()
+        predicate = visibility_predicate(identity, snapshot.group_pks, model)
+        for condition in _rule_conditions(model, identity, required_permissions[0]):
+            predicate |= m.Q(
+                m.Exists(QuerySet(model=model).filter(condition, pk=m.OuterRef("pk")))
+            )
+    return queryset.filter(predicate)
 
 
 def add_perms_shortcut(
@@ -233,31 +199,72 @@ def _add_for_queryset(
     queryset: QuerySet,
     perms: Iterable[DCFPermission],
 ) -> None:
+    """Grants perms on every object of queryset without loading the objects.
+    On PostgreSQL the rows are inserted with a single INSERT ... SELECT,
+    other databases insert the pks in chunks."""
+    perms = list(perms)
+    perm_model: Type[BaseGenericObjectPermission]
     if isinstance(identity, UserGroup):
-        GroupObjectPermission.objects.bulk_create(
-            [
-                GroupObjectPermission(
-                    group=identity,
-                    permission=p,
-                    object_pk=o.id,
-                )
-                for o in queryset
-                for p in perms
-            ],
-            ignore_conflicts=True,
-        )
+        perm_model, identity_field = GroupObjectPermission, "group"
     else:
-        UserObjectPermission.objects.bulk_create(
-            [
-                UserObjectPermission(
-                    user=identity,  # type:ignore
-                    permission=p,
-                    object_pk=o.id,
-                )
-                for o in queryset
-                for p in perms
-            ],
-            ignore_conflicts=True,
+        perm_model, identity_field = UserObjectPermission, "user"
+    using = router.db_for_write(perm_model)
+    connection = connections[using]
+    if (
+        queryset.db == using
+        and connection.vendor == "postgresql"
+        and connection.pg_version >= 130000  # for gen_random_uuid()
+    ):
+        _insert_from_select(perm_model, identity_field, identity.pk, perms, queryset)
+    else:
+        pks = (
+            queryset.order_by()
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=ADD_PERMS_CHUNK_SIZE)
+        )
+        while chunk := list(islice(pks, ADD_PERMS_CHUNK_SIZE)):
+            perm_model.objects.bulk_create(
+                [
+                    perm_model(
+                        **{f"{identity_field}_id": identity.pk},
+                        permission=p,
+                        object_pk=object_pk,
+                    )
+                    for object_pk in chunk
+                    for p in perms
+                ],
+                ignore_conflicts=True,
+            )
+    # bulk_create() sends no signals
+    refresh_visibility(queryset.model, queryset.order_by().values("pk"), identity)
+    invalidate_permission_context()
+    bump_identity_version(identity)
+
+
+def _insert_from_select(
+    perm_model: Type[BaseGenericObjectPermission],
+    identity_field: str,
+    identity_pk: Any,
+    perms: Sequence[DCFPermission],
+    queryset: QuerySet,
+) -> None:
+    opts = perm_model._meta
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    columns = ", ".join(
+        qn(opts.get_field(name).column)
+        for name in ["id", "created_at", identity_field, "permission", "object_pk"]
+    )
+    query = queryset.order_by().values("pk").query
+    select_sql, select_params = query.get_compiler(using=queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(opts.db_table)} ({columns})"
+            " SELECT gen_random_uuid(), now(), %s, perm.id, objects.pk"
+            f" FROM ({select_sql}) AS objects(pk)"
+            " CROSS JOIN unnest(%s::uuid[]) AS perm(id)"
+            " ON CONFLICT DO NOTHING",
+            [identity_pk, *select_params, [p.pk for p in perms]],
         )
 
 
@@ -271,6 +278,260 @@ def _add_for_model(
         identity.model_permissions.add(*perms)
 
 
+def remove_perms_shortcut(
+    identity: DCFAbstractUser | UserGroup,
+    instance: Type[m.Model] | m.Model | QuerySet,
+    perms: str,
+    field_name: Optional[str] = None,
+) -> int:
+    """
+    Removes model or object permissions granted by add_perms_shortcut(), and
+    returns the number of permissions removed. For a queryset, the object
+    permissions of every object are removed with a single DELETE. Permissions
+    that identity gets from its groups are not affected.
+    """
+    model: Type[m.Model]
+    if isinstance(instance, ModelBase):
+        model = instance  # type: ignore
+    elif isinstance(instance, m.Model):
+        model = instance._meta.model
+    elif isinstance(instance, QuerySet):
+        model = instance.model
+    else:
+        raise TypeError(f"Unexpected type: {type(instance)}")
+    permission_pks = [
+        get_permission_for_model(p, model, field_name=field_name).pk for p in perms
+    ]
+    rows: QuerySet
+    if isinstance(instance, ModelBase):
+        through = _through(identity._meta.model, "model_permissions")
+        rows = through.model.objects.filter(
+            **{through.source: identity.pk, f"{through.target}__in": permission_pks}
+        )
+    else:
+        if isinstance(identity, UserGroup):
+            rows = GroupObjectPermission.objects.filter(group_id=identity.pk)
+        else:
+            rows = UserObjectPermission.objects.filter(user_id=identity.pk)
+        if isinstance(instance, m.Model):
+            rows = rows.filter(object_pk=instance.pk)
+        else:
+            rows = rows.filter(object_pk__in=instance.order_by().values("pk"))
+        rows = rows.filter(permission_id__in=permission_pks)
+    # the caches are invalidated below
+    count = delete_rows(rows)
+    if count and not isinstance(instance, ModelBase):
+        refresh_visibility(
+            model,
+            [instance.pk]
+            if isinstance(instance, m.Model)
+            else instance.order_by().values("pk"),
+            identity,
+        )
+    if count:
+        invalidate_permission_context()
+        bump_identity_version(identity)
+    return count
+
+
+class PermissionGrant(NamedTuple):
+    """Permissions that an identity should have on an object, as returned by
+    PermissionManager.get_perms()."""
+
+    identity: DCFAbstractUser | UserGroup
+    perms: str
+    field_name: Optional[str] = None
+
+
+class _User:
+    def __repr__(self) -> str:
+        return "USER"
+
+
+# Stands for the user whose permissions are checked in a PermissionRule.
+USER: Any = _User()
+
+
+class PermissionRule(NamedTuple):
+    """
+    Permissions that a user has on every object matching condition, as
+    declared in PermissionManager.rules. The condition is a Q expression on the
+    model in which USER stands for the user, eg, Q(owner=USER). Rules are
+    evaluated in SQL together with the object permissions, so nothing is
+    stored or reset when an object is saved. Rules never apply to groups.
+    """
+
+    perms: str
+    condition: m.Q
+    field_name: Optional[str] = None
+
+    def resolve(self, user: DCFAbstractUser) -> m.Q:
+        """Returns the condition with USER replaced by the pk of user."""
+        return _resolve_user(self.condition, user.pk)
+
+
+def _resolve_user(condition: m.Q, user_pk: Any) -> m.Q:
+    resolved = copy.copy(condition)
+    children = []
+    for child in condition.children:
+        if isinstance(child, m.Q):
+            children.append(_resolve_user(child, user_pk))
+        elif isinstance(child, tuple):
+            children.append((child[0], _resolve_value(child[1], user_pk)))
+        else:
+            # an expression, eg, Exists(...)
+            _check_no_user(child)
+            children.append(child)
+    resolved.children = children
+    return resolved
+
+
+def _resolve_value(value: Any, user_pk: Any) -> Any:
+    """Replaces USER in the value of a lookup, eg, owner=USER or
+    owner__in=[USER, ...]."""
+    if value is USER:
+        return user_pk
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return type(value)(_resolve_value(item, user_pk) for item in value)
+    _check_no_user(value)
+    return value
+
+
+def _check_no_user(value: Any) -> None:
+    if _contains_user(value):
+        raise ValueError(
+            f"USER is only supported as the value of a lookup, or in a list of "
+            f"values, not in {value!r}"
+        )
+
+
+def _contains_user(value: Any) -> bool:
+    if value is USER:
+        return True
+    if isinstance(value, m.Q):
+        return any(_contains_user(child) for child in value.children)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return any(_contains_user(item) for item in value)
+    if isinstance(value, m.F):
+        return value.name is USER
+    if isinstance(value, Value):
+        return value.value is USER
+    if hasattr(value, "get_source_expressions"):
+        return any(_contains_user(child) for child in value.get_source_expressions())
+    return False
+
+
+def get_permission_rules(model: Type[m.Model]) -> Sequence[PermissionRule]:
+    """Returns the rules declared by the PermissionManager of model."""
+    manager = getattr(model, "PermissionManager", None)
+    return getattr(manager, "rules", ())
+
+
+def get_rule_models(model: Type[m.Model]) -> Set[Type[m.Model]]:
+    """
+    Returns the models that the lookups of the rules of model traverse, eg,
+    Team and the user model for Q(team__leader=USER). Writing to them can
+    change a rule verdict. An explicit through model is included, writes to
+    an auto-created one only send m2m_changed. The models that expression
+    children, such as Exists(...), query are unknown.
+    """
+    models: Set[Type[m.Model]] = set()
+    for rule in get_permission_rules(model):
+        for lookup in _rule_lookups(rule.condition):
+            current = model
+            for name in lookup.split(LOOKUP_SEP):
+                try:
+                    field: Any = current._meta.get_field(name)
+                except FieldDoesNotExist:
+                    # a lookup or a transform, eg, __in
+                    break
+                if not field.is_relation:
+                    break
+                if field.many_to_many:
+                    remote = field if field.concrete else field.remote_field
+                    through = remote.remote_field.through
+                    if not through._meta.auto_created:
+                        models.add(through)
+                current = field.related_model
+                models.add(current)
+    return models
+
+
+def _rule_lookups(condition: m.Q) -> Iterator[str]:
+    for child in condition.children:
+        if isinstance(child, m.Q):
+            yield from _rule_lookups(child)
+        elif isinstance(child, tuple):
+            yield child[0]
+
+
+def sync_object_perms(
+    model: Type[m.Model], grants: Mapping[Any, Iterable[PermissionGrant]]
+) -> None:
+    """
+    Makes the object permissions of the objects of model match grants, which
+    maps each object pk to every permission that should be granted on the
+    object. Only missing rows are inserted and only stale rows are deleted, so
+    nothing is written when the permissions are unchanged. Both user and group
+    object permissions are synced.
+    """
+    if not grants:
+        return
+    desired_uops: Set[Tuple[Any, Any, Any]] = set()
+    desired_gops: Set[Tuple[Any, Any, Any]] = set()
+    for object_pk, object_grants in grants.items():
+        for grant in object_grants:
+            for s in grant.perms:
+                perm = get_permission_for_model(s, model, field_name=grant.field_name)
+                if isinstance(grant.identity, UserGroup):
+                    desired_gops.add((grant.identity.pk, perm.pk, object_pk))
+                else:
+                    desired_uops.add((grant.identity.pk, perm.pk, object_pk))
+    changed_keys: Set[str] = set()
+    for perm_model, identity_field, identity_label, desired in [
+        (
+            UserObjectPermission,
+            "user_id",
+            get_dcf_user_model()._meta.label_lower,
+            desired_uops,
+        ),
+        (GroupObjectPermission, "group_id", UserGroup._meta.label_lower, desired_gops),
+    ]:
+        existing = {
+            (identity_pk, permission_pk, object_pk): pk
+            for pk, identity_pk, permission_pk, object_pk in perm_model.objects.filter(
+                object_pk__in=list(grants),
+                permission__app_name=model._meta.app_label,
+                permission__model_name=model._meta.model_name,
+            ).values_list("pk", identity_field, "permission_id", "object_pk")
+        }
+        stale = [row for row in existing if row not in desired]
+        missing = [row for row in desired if row not in existing]
+        if stale:
+            # the caches are invalidated below
+            delete_rows(perm_model.objects.filter(pk__in=[existing[r] for r in stale]))
+        if missing:
+            perm_model.objects.bulk_create(
+                [
+                    perm_model(
+                        **{identity_field: identity_pk},
+                        permission_id=permission_pk,
+                        object_pk=object_pk,
+                    )
+                    for identity_pk, permission_pk, object_pk in missing
+                ],
+                ignore_conflicts=True,
+            )
+        changed_keys.update(
+            identity_version_key(identity_label, identity_pk)
+            for identity_pk, _, _ in [*stale, *missing]
+        )
+    if changed_keys:
+        refresh_visibility(model, list(grants))
+        invalidate_permission_context()
+        bump_versions(changed_keys)
+
+
 @deprecated(details="use add_perms_shortcut(...) instead")
 def set_perms_shortcut(
     identity: DCFAbstractUser | UserGroup,
@@ -294,6 +555,7 @@ def has_perms_shortcut(
     perms="rw", returns True only if the user has both read and write
     permissions. Model permission > object permission > field permission.
     """
+    flush_permission_updates()
     model: Type[m.Model]
     if isinstance(instance, ModelBase):
         model = instance  # type: ignore
@@ -303,114 +565,424 @@ def has_perms_shortcut(
         model = instance.model
     else:
         raise TypeError(instance)
-    required_permissions: List[List[DCFPermission]] = []
-    for s in perms:
-        any_of = [get_permission_for_model(s, model, field_name=None)]
-        if field_name is not None:
-            any_of.append(get_permission_for_model(s, model, field_name=field_name))
-        required_permissions.append(any_of)
+    required_permissions = _get_required_permissions(perms, model, field_name)
 
     if isinstance(instance, ModelBase):
+        snapshot = get_permission_snapshot(identity)
         if isinstance(identity, DCFAbstractUser):
             return (
-                _user_has_superpower(identity)
-                or _check_model_for_groups(
-                    default_groups.anyone,
-                    required_permissions,
-                )
-                or _check_model_for_groups(
-                    identity.groups.all(),
-                    required_permissions,
-                )
-                or _check_model_for_user(
-                    identity,
-                    required_permissions,
-                )
+                is_root(identity)
+                or _check_model_for_groups(snapshot.anyone, required_permissions)
+                or _check_model_for_groups(snapshot.groups, required_permissions)
+                or _check_model_for_user(snapshot.own, required_permissions)
             )
         elif isinstance(identity, UserGroup):
-            return _check_model_for_groups(
-                identity,
-                required_permissions,
-            )
+            return _check_model_for_groups(snapshot.own, required_permissions)
         else:
             raise TypeError(identity)
+    elif isinstance(instance, m.Model):
+
+        def compute() -> bool:
+            return _has_perms_for_object(
+                identity, model, instance.pk, required_permissions
+            )
+
+        if get_permission_rules(model):
+            # the verdict depends on the object, which the shared cache of
+            # verdicts doesn't track
+            return memoize(
+                _object_verdict_key(identity, model, instance.pk, perms, field_name),
+                compute,
+            )
+        return memoize(
+            _object_verdict_key(identity, model, instance.pk, perms, field_name),
+            lambda: cached_verdict(
+                identity,
+                get_permission_snapshot(identity),
+                anyone_group_id(),
+                model,
+                instance.pk,
+                perms,
+                field_name,
+                compute,
+            ),
+        )
+    elif isinstance(instance, QuerySet):
+        return _has_perms_for_queryset(identity, instance, required_permissions)
     else:
-        if isinstance(instance, QuerySet):
-            input_queryset = instance
-        elif isinstance(instance, m.Model):
-            input_queryset = QuerySet(model=model).filter(pk=instance.pk)
-        else:
-            raise TypeError(instance)
-        result_queryset = filter_queryset_by_perms_shortcut(
-            perms,
-            identity,
-            input_queryset,
-            field_name=field_name,
+        raise TypeError(instance)
+
+
+def bulk_has_perms(
+    identity: DCFAbstractUser | UserGroup,
+    model: Type[m.Model],
+    pks: Iterable[Any] | QuerySet,
+    perms: str,
+    field_name: Optional[str] = None,
+) -> Dict[Any, bool]:
+    """
+    Checks the permissions on many objects of model at once, and returns a
+    dictionary mapping each pk to whether identity has all permissions
+    indicated by perms, with the same rules as has_perms_shortcut(). pks may
+    also be a queryset of pks, which is evaluated as a subquery. The pks are
+    converted to the type of the pk field, eg, strings to UUIDs, so the keys
+    of the dictionary are consistent. Costs at most one query regardless of
+    the number of objects.
+    """
+    flush_permission_updates()
+    required_permissions = _get_required_permissions(perms, model, field_name)
+    if isinstance(identity, DCFAbstractUser) and is_root(identity):
+        predicate = None
+    else:
+        predicate = _perms_predicate(
+            required_permissions, identity, get_permission_snapshot(identity), model
+        )
+    verdicts: Dict[Any, bool] = {}
+    if isinstance(pks, QuerySet):
+        queryset = QuerySet(model=model).filter(pk__in=pks)
+    else:
+        to_python = model._meta.pk.to_python
+        verdicts = {to_python(pk): predicate is None for pk in pks}
+        if predicate is None or not verdicts:
+            return verdicts
+        queryset = QuerySet(model=model).filter(pk__in=list(verdicts))
+    if predicate is None:
+        rows = queryset.values_list("pk", Value(True))
+    else:
+        rows = queryset.values_list(
+            "pk",
+            Case(
+                When(predicate, then=True), default=False, output_field=BooleanField()
+            ),
+        )
+    for pk, verdict in rows:
+        verdicts[pk] = verdict
+        # later has_perms_shortcut() calls on these objects are free
+        memoize(
+            _object_verdict_key(identity, model, pk, perms, field_name),
+            lambda: verdict,
         )
-        return input_queryset.count() == result_queryset.count()
+    return verdicts
 
 
-def _user_has_superpower(user: DCFAbstractUser) -> bool:
-    from .users import default_users
+class PermittedFields:
+    """
+    The fields of an object on which an identity has a permission, as returned
+    by get_permitted_fields(). When the permission is granted on the whole
+    object or model (all_fields), every field is permitted.
+    """
 
-    return user.id == default_users.root.id
+    def __init__(self, all_fields: bool, fields: AbstractSet[str]) -> None:
+        self.all_fields = all_fields
+        self.fields: FrozenSet[str] = frozenset(fields)
 
+    def __contains__(self, field_name: object) -> bool:
+        return self.all_fields or field_name in self.fields
 
-def _check_model_for_groups(
-    group: UserGroup | QuerySet[UserGroup], perms: List[List[DCFPermission]]
-) -> bool:
-    if isinstance(group, UserGroup):
-        return all(
-            [
-                group.model_permissions.filter(pk__in=[p.pk for p in ps]).exists()
-                for ps in perms
-            ]
+    def __repr__(self) -> str:
+        if self.all_fields:
+            return "<PermittedFields all>"
+        return f"<PermittedFields {sorted(self.fields)}>"
+
+
+def get_permitted_fields(
+    identity: DCFAbstractUser | UserGroup, instance: m.Model, perm: str = "w"
+) -> PermittedFields:
+    """
+    Returns the fields of instance on which identity has the permission perm
+    (a single letter), with the same rules as has_perms_shortcut(). Costs one
+    query regardless of the number of fields, memoized for the request.
+    """
+    flush_permission_updates()
+    model = instance._meta.model
+    return memoize(
+        ("fields", _identity_key(identity), model._meta.label_lower, instance.pk, perm),
+        lambda: _load_permitted_fields(identity, model, instance.pk, perm),
+    )
+
+
+def _load_permitted_fields(
+    identity: DCFAbstractUser | UserGroup, model: Type[m.Model], pk: Any, perm: str
+) -> PermittedFields:
+    if isinstance(identity, DCFAbstractUser) and is_root(identity):
+        return PermittedFields(True, set())
+    snapshot = get_permission_snapshot(identity)
+    if isinstance(identity, UserGroup):
+        granted = snapshot.own | snapshot.anyone
+        object_grant = m.Q(
+            m.Exists(
+                GroupObjectPermission.objects.filter(
+                    object_pk=pk,
+                    permission=m.OuterRef("pk"),
+                    group_id__in=[identity.pk, anyone_group_id()],
+                )
+            )
         )
     else:
-        return all([group.filter(model_permissions__in=ps).exists() for ps in perms])
+        granted = snapshot.own | snapshot.groups | snapshot.anyone
+        object_grant = m.Q(
+            m.Exists(
+                UserObjectPermission.objects.filter(
+                    object_pk=pk, permission=m.OuterRef("pk"), user_id=identity.pk
+                )
+            )
+        ) | m.Q(
+            m.Exists(
+                GroupObjectPermission.objects.filter(
+                    object_pk=pk,
+                    permission=m.OuterRef("pk"),
+                    group_id__in=[*snapshot.group_pks, anyone_group_id()],
+                )
+            )
+        )
+        for rule in get_permission_rules(model):
+            if perm in rule.perms:
+                object_grant |= m.Q(
+                    pk=get_permission_for_model(
+                        perm, model, field_name=rule.field_name
+                    ).pk
+                ) & m.Q(
+                    m.Exists(
+                        QuerySet(model=model).filter(rule.resolve(identity), pk=pk)
+                    )
+                )
+    if PermissionSnapshot.grants_all(
+        granted, _get_required_permissions(perm, model, None)
+    ):
+        return PermittedFields(True, set())
+    field_names = set(
+        DCFPermission.objects.filter(
+            m.Q(pk__in=granted) | object_grant,
+            app_name=model._meta.app_label,
+            model_name=model._meta.model_name,
+            action=ACTION_SHORTCUTS[perm],
+        ).values_list("field_name", flat=True)
+    )
+    if None in field_names:
+        return PermittedFields(True, set())
+    return PermittedFields(False, field_names)
 
 
-def _check_model_for_user(
-    user: DCFAbstractUser, perms: List[List[DCFPermission]]
+def _has_perms_for_queryset(
+    identity: DCFAbstractUser | UserGroup,
+    queryset: QuerySet,
+    required_perms: Sequence[Sequence[DCFPermission]],
+) -> bool:
+    """Checks that no object of queryset is denied, in one query."""
+    if isinstance(identity, DCFAbstractUser) and is_root(identity):
+        return True
+    predicate = _perms_predicate(
+        required_perms, identity, get_permission_snapshot(identity), queryset.model
+    )
+    if predicate is None:
+        return True
+    return not queryset.exclude(predicate).exists()
+
+
+def _has_perms_for_object(
+    identity: DCFAbstractUser | UserGroup,
+    model: Type[m.Model],
+    pk: Any,
+    required_perms: Sequence[Sequence[DCFPermission]],
 ) -> bool:
-    return all(
-        [
-            user.model_permissions.filter(id__in=[p.pk for p in pls]).exists()
-            for pls in perms
+    """Evaluates the permissions on a single object in one EXISTS query."""
+    if isinstance(identity, DCFAbstractUser) and is_root(identity):
+        return True
+    predicate = _perms_predicate(
+        required_perms, identity, get_permission_snapshot(identity), model
+    )
+    if predicate is None:
+        return True
+    return QuerySet(model=model).filter(pk=pk).filter(predicate).exists()
+
+
+def _perms_predicate(
+    required_perms: Sequence[Sequence[DCFPermission]],
+    identity: DCFAbstractUser | UserGroup,
+    snapshot: PermissionSnapshot,
+    model: Type[m.Model],
+    *,
+    adaptive: bool = False,
+) -> Optional[m.Q]:
+    """Builds a predicate, correlated to the pk of the outer query, that keeps
+    the objects on which identity has all required_perms. Like
+    filter_queryset_by_perms_shortcut, either the user or the groups (including
+    anyone) must grant every permission, each through a model level or an
+    object permission, or for the user, a PermissionRule of model. Returns None
+    if model level permissions alone grant every permission. When adaptive,
+    small sets of object grants are fetched and inlined, see
+    _object_grants_clause()."""
+    branches: List[Tuple[Type[m.Model], dict, AbstractSet[Any], bool]]
+    if isinstance(identity, UserGroup):
+        branches = [
+            (
+                GroupObjectPermission,
+                {"group_id__in": [identity.pk, anyone_group_id()]},
+                snapshot.own | snapshot.anyone,
+                False,
+            )
         ]
+    else:
+        branches = [
+            (UserObjectPermission, {"user_id": identity.pk}, snapshot.own, True),
+            (
+                GroupObjectPermission,
+                {"group_id__in": [*snapshot.group_pks, anyone_group_id()]},
+                snapshot.groups | snapshot.anyone,
+                False,
+            ),
+        ]
+    predicate: Optional[m.Q] = None
+    for perm_model, grantee, granted, with_rules in branches:
+        branch = m.Q()
+        for any_of in required_perms:
+            if PermissionSnapshot.grants_all(granted, [any_of]):
+                if adaptive:
+                    LOG.debug(f"{perm_model.__name__} of {model.__name__}: {SKIP}")
+                continue
+            clause = _object_grants_clause(perm_model, grantee, any_of, model, adaptive)
+            if with_rules:
+                for condition in _rule_conditions(model, identity, any_of):
+                    clause |= m.Q(
+                        m.Exists(
+                            QuerySet(model=model).filter(condition, pk=m.OuterRef("pk"))
+                        )
+                    )
+            branch &= clause
+        if not branch:
+            return None
+        predicate = branch if predicate is None else predicate | branch
+    return predicate
+
+
+def _object_grants_clause(
+    perm_model: Type[m.Model],
+    grantee: Dict[str, Any],
+    any_of: Sequence[DCFPermission],
+    model: Type[m.Model],
+    adaptive: bool,
+) -> m.Q:
+    """Keeps the objects on which grantee has an object permission in any_of.
+    When adaptive, the granted pks are fetched first and written inline as an
+    IN list if there are at most get_inline_limit() of them, otherwise the
+    objects are matched with a correlated subquery. Sets found too large are
+    remembered in grant_statistics, and not fetched again."""
+    grants = perm_model.objects.filter(permission__in=any_of, **grantee)  # type: ignore
+    if adaptive and (limit := get_inline_limit()) > 0:
+        key = (perm_model._meta.label_lower, repr(sorted(grantee.items())), *any_of)
+        if not grant_statistics.is_large(key):
+            pks = memoize(
+                ("grants", key),
+                lambda: list(grants.values_list("object_pk", flat=True)[: limit + 1]),
+            )
+            if len(pks) <= limit:
+                LOG.debug(
+                    f"{perm_model.__name__} of {model.__name__}: {INLINE} ({len(pks)})"
+                )
+                return m.Q(pk__in=pks)
+            grant_statistics.record_large(key)
+        LOG.debug(f"{perm_model.__name__} of {model.__name__}: {SUBQUERY}")
+    return m.Q(m.Exists(grants.filter(object_pk=m.OuterRef("pk"))))
+
+
+def _rule_conditions(
+    model: Type[m.Model],
+    user: DCFAbstractUser | UserGroup,
+    any_of: Sequence[DCFPermission],
+) -> List[m.Q]:
+    """Returns the conditions of the rules of model granting any of any_of to
+    user."""
+    if not isinstance(user, DCFAbstractUser):
+        return []
+    pks = {perm.pk for perm in any_of}
+    return [
+        rule.resolve(user)
+        for rule in get_permission_rules(model)
+        if any(
+            get_permission_for_model(s, model, field_name=rule.field_name).pk in pks
+            for s in rule.perms
+        )
+    ]
+
+
+def _get_required_permissions(
+    perms: str, model: Type[m.Model], field_name: Optional[str]
+) -> List[List[DCFPermission]]:
+    """Returns the permissions in conjunctive normal form: every letter of perms
+    is required, either on the object or on the field."""
+    required_permissions: List[List[DCFPermission]] = []
+    for s in perms:
+        any_of = [get_permission_for_model(s, model, field_name=None)]
+        if field_name is not None:
+            any_of.append(get_permission_for_model(s, model, field_name=field_name))
+        required_permissions.append(any_of)
+    return required_permissions
+
+
+def _identity_key(identity: DCFAbstractUser | UserGroup) -> Tuple[str, Any]:
+    return (identity._meta.label_lower, identity.pk)
+
+
+def _object_verdict_key(
+    identity: DCFAbstractUser | UserGroup,
+    model: Type[m.Model],
+    pk: Any,
+    perms: str,
+    field_name: Optional[str],
+) -> Tuple[Hashable, ...]:
+    return (
+        "object",
+        _identity_key(identity),
+        model._meta.label_lower,
+        pk,
+        perms,
+        field_name,
     )
 
 
+def _check_model_for_groups(
+    group_perm_pks: AbstractSet[Any], perms: List[List[DCFPermission]]
+) -> bool:
+    return PermissionSnapshot.grants_all(group_perm_pks, perms)
+
+
+def _check_model_for_user(
+    user_perm_pks: AbstractSet[Any], perms: List[List[DCFPermission]]
+) -> bool:
+    return PermissionSnapshot.grants_all(user_perm_pks, perms)
+
+
 def clear_permissions() -> None:
     LOG.info("clearing permissions...")
-    _get_permission_for_model.cache_clear()
+    permission_registry.clear()
+    invalidate_permission_context()
+    bump_global_version()
     with transaction.atomic():
         DCFPermission.objects.all().delete()
         UserObjectPermission.objects.all().delete()
         GroupObjectPermission.objects.all().delete()
+        ReadVisibility.objects.all().delete()
 
 
 def reset_permissions(
-    for_classes: List[Type["AccessControlled"]] = AccessControlled.__subclasses__(),
-) -> None:
-    # set user self permission
-    # must be done after all default users are added
-    _get_permission_for_model.cache_clear()
-    total_model_count = len(for_classes)
-    current_model_count = 0
-    for model in for_classes:
-        current_model_count += 1
-        LOG.warn(f"Resetting permissions for model {model.__name__}")
-        total = model.objects.count()
-        current = 0
-        for instance in cast(
-            Iterable[AccessControlled[Any]],
-            model.objects.all(),
-        ):
-            current += 1
-            percentage = current * 100 / total
-            LOG.info(
-                f"{current_model_count}/{total_model_count} {model.__name__}({instance.id}) %{percentage:.2f}"
-            )
-            with transaction.atomic():
-                instance.update_perms()
+    for_classes: Optional[Iterable[Type["AccessControlled"]]] = None,
+    *,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    checkpoint_dir: Optional[str] = None,
+) -> int:
+    """
+    Resets the object permissions of every object of for_classes, which
+    defaults to every AccessControlled model, and returns the number of objects
+    processed. Objects are processed in chunks, optionally on several processes
+    and resumable from a checkpoint directory, see permissions.reset.run_reset().
+    """
+    permission_registry.clear()
+    invalidate_permission_context()
+    bump_global_version()
+    return run_reset(
+        access_controlled_models() if for_classes is None else for_classes,
+        workers=workers,
+        chunk_size=chunk_size,
+        checkpoint_dir=checkpoint_dir,
+    )
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from logging import getLogger
+from typing import AbstractSet, Any, Dict, FrozenSet, Sequence, Set, Type
+
+from django.db import models as m
+from django.db.models import CharField, Value
+
+from ..models import DCFAbstractUser, DCFPermission, UserGroup
+from .cache import cached_snapshot
+from .context import memoize
+from .identities import anyone_group_id
+
+LOG = getLogger(__name__)
+
+
+class PermissionSnapshot:
+    """
+    The model level permissions (as DCFPermission pks) granted to a user or a
+    group, split by where the grant comes from: the identity itself (own), the
+    groups the user belongs to (groups), and default_groups.anyone (anyone).
+    group_pks holds the groups the user belongs to, except anyone. Checking a
+    model level permission against a snapshot is a set lookup.
+    """
+
+    def __init__(
+        self,
+        own: AbstractSet[Any],
+        groups: AbstractSet[Any],
+        anyone: AbstractSet[Any],
+        group_pks: AbstractSet[Any],
+    ) -> None:
+        self.own: FrozenSet[Any] = frozenset(own)
+        self.groups: FrozenSet[Any] = frozenset(groups)
+        self.anyone: FrozenSet[Any] = frozenset(anyone)
+        self.group_pks: FrozenSet[Any] = frozenset(group_pks)
+
+    def __repr__(self) -> str:
+        return (
+            f"<PermissionSnapshot own={len(self.own)} groups={len(self.groups)}"
+            f" anyone={len(self.anyone)} group_pks={len(self.group_pks)}>"
+        )
+
+    @staticmethod
+    def grants_all(
+        granted: AbstractSet[Any], required: Sequence[Sequence[DCFPermission]]
+    ) -> bool:
+        """Returns True if granted contains at least one permission of every
+        item in required."""
+        return all(any(p.pk in granted for p in any_of) for any_of in required)
+
+
+def get_permission_snapshot(
+    identity: DCFAbstractUser | UserGroup,
+) -> PermissionSnapshot:
+    """Returns the snapshot of model level permissions of a user or a group,
+    memoized for the current request and held in the shared permission cache
+    when it is enabled."""
+    return memoize(
+        ("snapshot", identity._meta.label_lower, identity.pk),
+        lambda: cached_snapshot(
+            identity,
+            anyone_group_id(),
+            lambda: load_permission_snapshot(identity),
+        ),
+    )
+
+
+def load_permission_snapshot(
+    identity: DCFAbstractUser | UserGroup,
+) -> PermissionSnapshot:
+    """Loads the snapshot from the database in one query."""
+    anyone_pk = anyone_group_id()
+    if isinstance(identity, UserGroup):
+        group_perms = _through(UserGroup, "model_permissions")
+        rows = _tagged(group_perms, "own", **{group_perms.source: identity.pk}).union(
+            _tagged(group_perms, "anyone", **{group_perms.source: anyone_pk}),
+            all=True,
+        )
+    elif isinstance(identity, DCFAbstractUser):
+        user_perms = _through(identity._meta.model, "model_permissions")
+        group_perms = _through(UserGroup, "model_permissions")
+        membership = _through(identity._meta.model, "groups")
+        rows = _tagged(user_perms, "own", **{user_perms.source: identity.pk}).union(
+            _tagged(
+                group_perms,
+                "groups",
+                **{
+                    f"{group_perms.source}__in": membership.model.objects.filter(
+                        **{membership.source: identity.pk}
+                    ).values(membership.target)
+                },
+            ),
+            _tagged(group_perms, "anyone", **{group_perms.source: anyone_pk}),
+            _tagged(membership, "member", **{membership.source: identity.pk}),
+            all=True,
+        )
+    else:
+        raise TypeError(identity)
+
+    sets: Dict[str, Set[Any]] = {
+        "own": set(),
+        "groups": set(),
+        "anyone": set(),
+        "member": set(),
+    }
+    for pk, source in rows:
+        sets[source].add(pk)
+    sets["member"].discard(anyone_pk)
+    return PermissionSnapshot(
+        own=sets["own"],
+        groups=sets["groups"],
+        anyone=sets["anyone"],
+        group_pks=sets["member"],
+    )
+
+
+class _Through:
+    def __init__(self, model: Type[m.Model], source: str, target: str) -> None:
+        self.model = model
+        self.source = source
+        self.target = target
+
+
+def _through(model: Type[m.Model], field_name: str) -> _Through:
+    """Returns the auto created through model of a many to many field, and the
+    attnames of its source and target columns."""
+    field: Any = model._meta.get_field(field_name)
+    return _Through(
+        field.remote_field.through,
+        field.m2m_field_name() + "_id",
+        field.m2m_reverse_field_name() + "_id",
+    )
+
+
+def _tagged(through: _Through, tag: str, **filters: Any) -> m.QuerySet:
+    return (
+        through.model.objects.filter(**filters)
+        .annotate(source=Value(tag, output_field=CharField()))
+        .values_list(through.target, "source")
+    )
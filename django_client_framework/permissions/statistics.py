@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+from typing import Dict, Hashable
+
+from django.conf import settings
+
+LOG = getLogger(__name__)
+
+INLINE = "inline"
+SUBQUERY = "subquery"
+SKIP = "skip"
+
+
+class GrantStatistics:
+    """
+    Process-wide record of the sets of object grants, keyed by identity and
+    permissions, that were found too large to be inlined in a query. Those are
+    filtered with a subquery without fetching them first. Entries expire after
+    ttl seconds so that a set that shrank is inlined again. The statistics only
+    affect how a query is written, never its result.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 10000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._large: Dict[Hashable, float] = {}
+
+    def is_large(self, key: Hashable) -> bool:
+        expires = self._large.get(key)
+        if expires is None:
+            return False
+        if expires < monotonic():
+            with self._lock:
+                self._large.pop(key, None)
+            return False
+        return True
+
+    def record_large(self, key: Hashable) -> None:
+        with self._lock:
+            self._large.pop(key, None)
+            while len(self._large) >= self.max_entries:
+                # dicts are ordered, drop the oldest entry
+                del self._large[next(iter(self._large))]
+            self._large[key] = monotonic() + self.ttl
+
+    def clear(self) -> None:
+        with self._lock:
+            self._large.clear()
+
+
+grant_statistics = GrantStatistics()
+
+
+def get_inline_limit() -> int:
+    """Returns settings.DCF_PERMISSION_INLINE_LIMIT, the largest number of
+    granted pks written inline in a query as an IN list (500 by default). 0
+    always uses subqueries."""
+    return getattr(settings, "DCF_PERMISSION_INLINE_LIMIT", 500)
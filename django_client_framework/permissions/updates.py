@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from logging import getLogger
+from threading import Lock, local
+from typing import Any, Dict, Hashable, List, Optional, Set, Type
+
+from django.conf import settings
+from django.db import connections, transaction
+
+LOG = getLogger(__name__)
+
+IMMEDIATE = "immediate"
+ON_COMMIT = "on_commit"
+BACKGROUND = "background"
+
+
+class PendingPermissionUpdates:
+    """
+    The instances whose permissions must be reset when the current transaction
+    commits, de-duplicated by model and pk. Saving the same instance several
+    times in a transaction resets its permissions once. The instances are
+    reloaded before their permissions are reset, see reload_instances().
+    """
+
+    def __init__(self, using: str) -> None:
+        self.using = using
+        self.instances: Dict[Hashable, Any] = {}
+
+    def add(self, instance: Any) -> None:
+        key = (instance._meta.label_lower, instance.pk)
+        # the latest saved state wins
+        self.instances.pop(key, None)
+        self.instances[key] = instance
+
+    def take(self) -> List[Any]:
+        instances = list(self.instances.values())
+        self.instances.clear()
+        return instances
+
+    def __call__(self) -> None:
+        instances = self.take()
+        if not instances:
+            return
+        if get_update_mode() == BACKGROUND:
+            _submit(instances, self.using)
+        else:
+            reset_instances(reload_instances(instances, self.using), self.using)
+
+
+_local = local()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+_futures: Set[Future] = set()
+
+
+def get_update_mode() -> str:
+    """Returns settings.DCF_PERMISSION_UPDATE_MODE, which is one of:
+
+    - "immediate" (default): reset the permissions on every save
+    - "on_commit": reset the permissions once when the transaction commits
+    - "background": same as "on_commit", but on a thread pool of
+      settings.DCF_PERMISSION_UPDATE_WORKERS threads
+    """
+    mode = getattr(settings, "DCF_PERMISSION_UPDATE_MODE", IMMEDIATE)
+    if mode not in (IMMEDIATE, ON_COMMIT, BACKGROUND):
+        raise ValueError(f"Unknown DCF_PERMISSION_UPDATE_MODE: {mode}")
+    return mode
+
+
+def schedule_permission_update(instance: Any) -> None:
+    """Resets the permissions of instance, now or when the transaction commits
+    depending on get_update_mode()."""
+    using = instance._state.db or "default"
+    if get_update_mode() == IMMEDIATE or not connections[using].in_atomic_block:
+        reset_instances([instance], using)
+        return
+    _get_pending(using).add(instance)
+
+
+def flush_permission_updates() -> None:
+    """Resets the permissions of the instances saved in the current transaction
+    of this thread, so that permission checks within the transaction see
+    them."""
+    pending: Dict[str, PendingPermissionUpdates] = getattr(_local, "pending", {})
+    for using, updates in pending.items():
+        if updates.instances:
+            reset_instances(reload_instances(updates.take(), using), using)
+
+
+def reload_instances(instances: List[Any], using: str) -> List[Any]:
+    """
+    Returns instances as they are in the database, without the deleted ones.
+    An instance saved in a savepoint that was rolled back still holds the
+    state that was rolled back, which must not grant permissions.
+    """
+    pks: Dict[Type[Any], List[Any]] = {}
+    for instance in instances:
+        pks.setdefault(type(instance), []).append(instance.pk)
+    return [
+        reloaded
+        for model, model_pks in pks.items()
+        for reloaded in model._base_manager.using(using).filter(pk__in=model_pks)
+    ]
+
+
+def reset_instances(instances: List[Any], using: str) -> None:
+    with transaction.atomic(using=using):
+        for instance in instances:
+            instance.get_permissionmanager_class()().reset_perms(instance=instance)
+
+
+def _get_pending(using: str) -> PendingPermissionUpdates:
+    if not hasattr(_local, "pending"):
+        _local.pending = {}
+    updates: Optional[PendingPermissionUpdates] = _local.pending.get(using)
+    # A rolled back transaction discards the callback, together with the
+    # instances saved in it.
+    if updates is None or not any(
+        callback is updates for _, callback, *_ in connections[using].run_on_commit
+    ):
+        updates = _local.pending[using] = PendingPermissionUpdates(using)
+        transaction.on_commit(updates, using=using)
+    return updates
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "DCF_PERMISSION_UPDATE_WORKERS", 2),
+                thread_name_prefix="dcf-permissions",
+            )
+        return _executor
+
+
+def _submit(instances: List[Any], using: str) -> None:
+    future = _get_executor().submit(_reset_in_background, instances, using)
+    with _executor_lock:
+        _futures.add(future)
+    future.add_done_callback(_forget)
+
+
+def _forget(future: Future) -> None:
+    with _executor_lock:
+        _futures.discard(future)
+
+
+def _reset_in_background(instances: List[Any], using: str) -> None:
+    try:
+        reset_instances(reload_instances(instances, using), using)
+    except Exception:
+        LOG.exception(f"failed to reset permissions of {len(instances)} objects")
+    finally:
+        # worker threads own their connections
+        connections.close_all()
+
+
+def wait_for_background_updates() -> None:
+    """Blocks until the permission updates submitted so far have run."""
+    with _executor_lock:
+        futures = list(_futures)
+    wait(futures)
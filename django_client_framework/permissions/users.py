@@ -1,6 +1,7 @@
 from typing import Any, Callable, Dict, TypeVar
 
 from ..models.abstract.user import DCFAbstractUser, get_dcf_user_model
+from .identities import identity_registry
 
 T = TypeVar("T", bound="DCFAbstractUser")
 
@@ -30,8 +31,7 @@ class DefaultUsers:
     def __getattr__(self, name: str) -> DCFAbstractUser:
 
         if name in self.usernames:
-            User = get_dcf_user_model()
-            return User.objects.get_or_create(username=name)[0]
+            return identity_registry.get(get_dcf_user_model(), "username", name)
         else:
             raise AttributeError(f"{name} is not a default user")
 
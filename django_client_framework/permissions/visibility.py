@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+from itertools import islice
+from logging import getLogger
+from threading import local
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db import models as m
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models import (
+    DCFAbstractUser,
+    DCFPermission,
+    GroupObjectPermission,
+    ReadVisibility,
+    UserGroup,
+    UserObjectPermission,
+    get_dcf_user_model,
+)
+from ..models.object_permissions import delete_rows
+from .identities import anyone_group_id
+from .registry import permission_registry
+
+LOG = getLogger(__name__)
+
+VISIBILITY_CHUNK_SIZE = 2000
+
+
+def visibility_index_enabled(model: Type[m.Model]) -> bool:
+    """Returns whether model is listed in settings.DCF_VISIBILITY_INDEX, as
+    "app_label.ModelName"."""
+    labels = getattr(settings, "DCF_VISIBILITY_INDEX", ())
+    if not labels:
+        return False
+    return model._meta.label_lower in {label.lower() for label in labels}
+
+
+def indexed_models() -> List[Type[m.Model]]:
+    return [
+        apps.get_model(label) for label in getattr(settings, "DCF_VISIBILITY_INDEX", ())
+    ]
+
+
+def visibility_predicate(
+    identity: DCFAbstractUser | UserGroup,
+    group_pks: Iterable[Any],
+    model: Type[m.Model],
+) -> m.Q:
+    """Keeps the objects of model on which identity, or one of group_pks, has
+    an object read permission, with a single lookup in the index."""
+    if isinstance(identity, UserGroup):
+        grantee = m.Q(
+            identity_kind=ReadVisibility.GROUP,
+            identity_id__in=[identity.pk, anyone_group_id()],
+        )
+    else:
+        grantee = m.Q(identity_kind=ReadVisibility.USER, identity_id=identity.pk) | m.Q(
+            identity_kind=ReadVisibility.GROUP,
+            identity_id__in=[*group_pks, anyone_group_id()],
+        )
+    return m.Q(
+        pk__in=ReadVisibility.objects.filter(
+            grantee, model=model._meta.label_lower
+        ).values("object_pk")
+    )
+
+
+def refresh_visibility(
+    model: Type[m.Model],
+    object_pks: Iterable[Any] | m.QuerySet,
+    identity: Optional[DCFAbstractUser | UserGroup] = None,
+) -> None:
+    """Rebuilds the index rows of the objects of model whose pks are
+    object_pks, which may also be a queryset of pks, optionally only the rows
+    of identity. Does nothing if the model is not indexed."""
+    if not visibility_index_enabled(model):
+        return
+    if not isinstance(object_pks, m.QuerySet):
+        object_pks = list(object_pks)
+    rows = ReadVisibility.objects.filter(
+        model=model._meta.label_lower, object_pk__in=object_pks
+    )
+    sources = _sources()
+    if identity is not None:
+        kind = _identity_kind(identity)
+        rows = rows.filter(identity_kind=kind, identity_id=identity.pk)
+        sources = [source for source in sources if source[0] == kind]
+    with transaction.atomic():
+        delete_rows(rows)
+        for kind, perm_model, identity_field in sources:
+            lookups = {"object_pk__in": object_pks}
+            if identity is not None:
+                lookups[identity_field] = identity.pk
+            _insert_rows(model, kind, perm_model, identity_field, lookups)
+
+
+def rebuild_visibility_index(models: Optional[Iterable[Type[m.Model]]] = None) -> int:
+    """Rebuilds the index of models, which defaults to every indexed model,
+    from the object permissions. Returns the number of rows written."""
+    total = 0
+    for model in indexed_models() if models is None else models:
+        with transaction.atomic():
+            delete_rows(ReadVisibility.objects.filter(model=model._meta.label_lower))
+            count = sum(
+                _insert_rows(model, kind, perm_model, identity_field, {})
+                for kind, perm_model, identity_field in _sources()
+            )
+        LOG.info(f"indexed {count} read permissions of {model._meta.label}")
+        total += count
+    return total
+
+
+def check_visibility_index(
+    models: Optional[Iterable[Type[m.Model]]] = None,
+) -> Dict[str, Dict[str, int]]:
+    """Compares the index of models, which defaults to every indexed model,
+    with the object permissions. Returns the number of missing and extra rows
+    of each model whose index is inconsistent."""
+    flush_visibility_refreshes()
+    problems: Dict[str, Dict[str, int]] = {}
+    for model in indexed_models() if models is None else models:
+        label = model._meta.label_lower
+        missing = 0
+        for kind, perm_model, identity_field in _sources():
+            missing += (
+                _source_rows(perm_model, model, {})
+                .exclude(
+                    m.Exists(
+                        ReadVisibility.objects.filter(
+                            model=label,
+                            identity_kind=kind,
+                            identity_id=m.OuterRef(identity_field),
+                            object_pk=m.OuterRef("object_pk"),
+                        )
+                    )
+                )
+                .count()
+            )
+        extra = (
+            ReadVisibility.objects.filter(model=label)
+            .exclude(
+                m.Q(identity_kind=ReadVisibility.USER)
+                & m.Q(
+                    m.Exists(
+                        _source_rows(UserObjectPermission, model, {}).filter(
+                            user_id=m.OuterRef("identity_id"),
+                            object_pk=m.OuterRef("object_pk"),
+                        )
+                    )
+                )
+            )
+            .exclude(
+                m.Q(identity_kind=ReadVisibility.GROUP)
+                & m.Q(
+                    m.Exists(
+                        _source_rows(GroupObjectPermission, model, {}).filter(
+                            group_id=m.OuterRef("identity_id"),
+                            object_pk=m.OuterRef("object_pk"),
+                        )
+                    )
+                )
+            )
+            .count()
+        )
+        if missing or extra:
+            problems[model._meta.label] = {"missing": missing, "extra": extra}
+    return problems
+
+
+def _sources() -> List[tuple]:
+    return [
+        (ReadVisibility.USER, UserObjectPermission, "user_id"),
+        (ReadVisibility.GROUP, GroupObjectPermission, "group_id"),
+    ]
+
+
+def _source_rows(
+    perm_model: Type[m.Model], model: Type[m.Model], lookups: Dict[str, Any]
+) -> m.QuerySet:
+    return perm_model.objects.filter(  # type: ignore
+        permission=permission_registry.get("r", model, None), **lookups
+    )
+
+
+def _identity_kind(identity: DCFAbstractUser | UserGroup) -> str:
+    if isinstance(identity, UserGroup):
+        return ReadVisibility.GROUP
+    return ReadVisibility.USER
+
+
+def _insert_rows(
+    model: Type[m.Model],
+    kind: str,
+    perm_model: Type[m.Model],
+    identity_field: str,
+    lookups: Dict[str, Any],
+) -> int:
+    count = 0
+    rows = (
+        _source_rows(perm_model, model, lookups)
+        .values_list(identity_field, "object_pk")
+        .iterator(chunk_size=VISIBILITY_CHUNK_SIZE)
+    )
+    while chunk := list(islice(rows, VISIBILITY_CHUNK_SIZE)):
+        ReadVisibility.objects.bulk_create(
+            [
+                ReadVisibility(
+                    model=model._meta.label_lower,
+                    identity_kind=kind,
+                    identity_id=identity_id,
+                    object_pk=object_pk,
+                )
+                for identity_id, object_pk in chunk
+            ],
+            ignore_conflicts=True,
+        )
+        count += len(chunk)
+    return count
+
+
+class PendingVisibilityRefreshes:
+    """
+    The objects whose index rows must be refreshed when the current
+    transaction commits, grouped by model and identity, so that writing many
+    object permissions in a transaction, such as resetting the permissions of
+    an object, refreshes the index once per model and identity.
+    """
+
+    def __init__(self, using: str) -> None:
+        self.using = using
+        self.object_pks: Dict[Tuple[Type[m.Model], str, Any], Set[Any]] = {}
+
+    def add(self, model: Type[m.Model], kind: str, identity_pk: Any, pk: Any) -> None:
+        self.object_pks.setdefault((model, kind, identity_pk), set()).add(pk)
+
+    def __call__(self) -> None:
+        object_pks, self.object_pks = self.object_pks, {}
+        for (model, kind, identity_pk), pks in object_pks.items():
+            refresh_visibility(model, pks, _identity(kind, identity_pk))
+
+
+_local = local()
+
+
+def flush_visibility_refreshes() -> None:
+    """Refreshes the index rows of the object permissions written so far in the
+    current transaction of this thread, so that filters within the transaction
+    see them."""
+    pending: Dict[str, PendingVisibilityRefreshes] = getattr(_local, "pending", {})
+    for refreshes in pending.values():
+        refreshes()
+
+
+def _get_pending(using: str) -> PendingVisibilityRefreshes:
+    if not hasattr(_local, "pending"):
+        _local.pending = {}
+    refreshes: Optional[PendingVisibilityRefreshes] = _local.pending.get(using)
+    # A rolled back transaction discards the callback, together with the
+    # rows written in it.
+    if refreshes is None or not any(
+        callback is refreshes for _, callback, *_ in connections[using].run_on_commit
+    ):
+        refreshes = _local.pending[using] = PendingVisibilityRefreshes(using)
+        transaction.on_commit(refreshes, using=using)
+    return refreshes
+
+
+@receiver(post_save, sender=UserObjectPermission)
+@receiver(post_delete, sender=UserObjectPermission)
+@receiver(post_save, sender=GroupObjectPermission)
+@receiver(post_delete, sender=GroupObjectPermission)
+def refresh_visibility_on_change(sender: Any, instance: Any, **kwargs: Any) -> None:
+    if not getattr(settings, "DCF_VISIBILITY_INDEX", None):
+        return
+    perm = permission_registry.get_by_pk(instance.permission_id)
+    if perm is None:
+        perm = DCFPermission.objects.filter(pk=instance.permission_id).first()
+        if perm is None:
+            # deleted together with its permission
+            return
+    if perm.action != "read" or perm.field_name is not None:
+        return
+    try:
+        model = apps.get_model(perm.app_name, perm.model_name)
+    except LookupError:
+        return
+    if not visibility_index_enabled(model):
+        return
+    if isinstance(instance, GroupObjectPermission):
+        kind, identity_pk = ReadVisibility.GROUP, instance.group_id
+    else:
+        kind, identity_pk = ReadVisibility.USER, instance.user_id  # type: ignore
+    using = instance._state.db or "default"
+    if connections[using].in_atomic_block:
+        _get_pending(using).add(model, kind, identity_pk, instance.object_pk)
+    else:
+        refresh_visibility(model, [instance.object_pk], _identity(kind, identity_pk))
+
+
+def _identity(kind: str, pk: Any) -> DCFAbstractUser | UserGroup:
+    # only the pk and the type of the identity are needed
+    if kind == ReadVisibility.GROUP:
+        return UserGroup(pk=pk)  # type: ignore
+    return get_dcf_user_model()(pk=pk)  # type: ignore
@@ -3,6 +3,8 @@ from django.db import transaction
 from django.db.models import *
 
 from .brand import Brand, BrandSerializer
+from .document import Document
 from .product import Product, ProductSerializer
+from .project import Project, Team
 from .throttled import ThrottledModel, ThrottledModelSerializer
 from .user import User
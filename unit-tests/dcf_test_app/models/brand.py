@@ -3,10 +3,9 @@ from __future__ import annotations
 from typing import *
 
 from django.db import models as m
-from django.db.models.manager import Manager
 
 from django_client_framework.api import register_api_model
-from django_client_framework.models import DCFModel, Serializable
+from django_client_framework.models import DCFManager, DCFModel, Serializable
 from django_client_framework.serializers import DCFModelSerializer
 
 if TYPE_CHECKING:
@@ -16,7 +15,7 @@ if TYPE_CHECKING:
 
 @register_api_model
 class Brand(DCFModel["Brand"], Serializable):
-    objects: Manager["Brand"] = Manager()
+    objects: DCFManager["Brand"] = DCFManager()
 
     name = m.CharField(max_length=100, unique=True, null=True)
     priority = m.IntegerField(default=1)
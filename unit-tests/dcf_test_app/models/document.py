@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from typing import *
+
+from django_client_framework import models as m
+from django_client_framework.models import AccessControlled, DCFManager, DCFModel
+from django_client_framework.permissions import PermissionGrant, default_groups
+
+
+class Document(DCFModel["Document"], AccessControlled["Document"]):
+    objects: DCFManager["Document"] = DCFManager()
+
+    owner = m.ForeignKey(
+        "User", null=True, on_delete=m.SET_NULL, related_name="documents"
+    )
+    owner_id: Any
+    title = m.CharField(max_length=100, blank=True, default="")
+    is_public = m.BooleanField(default=False)
+    view_count = m.IntegerField(default=0)
+
+    class PermissionManager(AccessControlled.PermissionManager["Document"]):
+        depends_on = ["owner", "is_public"]
+
+        def get_perms(self, document: Document) -> List[PermissionGrant]:
+            grants = []
+            if document.owner_id:
+                grants.append(PermissionGrant(document.owner, "rwd"))
+            if document.is_public:
+                grants.append(PermissionGrant(default_groups.anyone, "r"))
+            return grants
@@ -3,11 +3,9 @@ from __future__ import annotations
 import logging
 from typing import *
 
-from django.db.models.manager import Manager
-
 from django_client_framework import models as m
 from django_client_framework.api import register_api_model
-from django_client_framework.models import DCFModel, Serializable
+from django_client_framework.models import DCFManager, DCFModel, Serializable
 from django_client_framework.serializers.model_serializer import DCFModelSerializer
 
 from .brand import BrandSerializer
@@ -17,7 +15,7 @@ LOG = logging.getLogger(__name__)
 
 @register_api_model
 class Product(DCFModel["Product"], Serializable["Product", Any]):
-    objects: Manager["Product"] = Manager()
+    objects: DCFManager["Product"] = DCFManager()
 
     barcode = m.CharField(max_length=255, blank=True, default="")
     priority = m.IntegerField(default=1)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from django_client_framework import models as m
+from django_client_framework.models import AccessControlled, DCFManager, DCFModel
+from django_client_framework.permissions import USER, PermissionRule
+
+
+class Team(DCFModel["Team"]):
+    leader = m.ForeignKey("User", null=True, on_delete=m.SET_NULL, related_name="+")
+
+
+class Project(DCFModel["Project"], AccessControlled["Project"]):
+    objects: DCFManager["Project"] = DCFManager()
+
+    owner = m.ForeignKey(
+        "User", null=True, on_delete=m.SET_NULL, related_name="owned_projects"
+    )
+    members = m.ManyToManyField("User", related_name="projects")
+    team = m.ForeignKey(Team, null=True, on_delete=m.SET_NULL, related_name="projects")
+    title = m.CharField(max_length=100, blank=True, default="")
+
+    class PermissionManager(AccessControlled.PermissionManager["Project"]):
+        rules = [
+            PermissionRule("rwd", m.Q(owner=USER)),
+            PermissionRule("r", m.Q(members=USER)),
+            PermissionRule("r", m.Q(team__leader=USER)),
+            PermissionRule("w", m.Q(members=USER), field_name="title"),
+        ]
@@ -12,7 +12,7 @@ from django_client_framework.serializers import DCFModelSerializer, SerializerCo
 
 @register_api_model
 class ThrottledModel(DCFModel, Serializable, RateLimited):
-    class Meta:
+    class Meta(DCFModel.Meta):
         pass
 
     @classmethod
@@ -1,9 +1,21 @@
+import base64
+import json
+from unittest import skipUnless
 from uuid import UUID
 
-from dcf_test_app.models import Brand, Product
-from django.test import TestCase
+from dcf_test_app.models import Brand, Product, ThrottledModel
+from django.db import connection, transaction
+from django.db.migrations.state import ModelState
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
+from django_client_framework.api import parallel_count
+from django_client_framework.models import (
+    DCFPermission,
+    UserGroup,
+    UserObjectPermission,
+)
 from django_client_framework.permissions import default_users
 
 
@@ -262,3 +274,271 @@ class TestPagination(TestCase):
     def test_order_malformed(self) -> None:
         resp = self.superuser_client.get("/product?_order_by=xxxxx")
         self.assertEquals(400, resp.status_code)
+
+    def _walk_cursor(self, url: str) -> list:
+        objects: list = []
+        cursor = ""
+        while cursor is not None:
+            resp = self.superuser_client.get(f"{url}&_cursor={cursor}")
+            self.assertEqual(200, resp.status_code, resp.content)
+            data = resp.json()
+            self.assertNotIn("objects_count", data)
+            objects += data["objects"]
+            cursor = data["next_cursor"]
+        return objects
+
+    def test_cursor_first_page(self) -> None:
+        resp = self.superuser_client.get(
+            "/product?_cursor=&_order_by=priority&_limit=30"
+        )
+        data = resp.json()
+        self.assertEqual(30, data["limit"])
+        self.assertIsNotNone(data["next_cursor"])
+        self.assertEqual(
+            [f"product_{i}" for i in range(30)],
+            [obj["barcode"] for obj in data["objects"]],
+        )
+
+    def test_cursor_walk(self) -> None:
+        objects = self._walk_cursor("/product?_order_by=-priority&_limit=30")
+        self.assertEqual(
+            [f"product_{i}" for i in range(100, -1, -1)],
+            [obj["barcode"] for obj in objects],
+        )
+
+    def test_cursor_walk_default_order(self) -> None:
+        objects = self._walk_cursor("/product?_limit=7")
+        self.assertEqual(101, len({obj["id"] for obj in objects}))
+
+    def test_cursor_ties(self) -> None:
+        """Objects with the same sort values are ordered by id, and never
+        skipped or repeated across pages."""
+        Product.objects.update(priority=1)
+        objects = self._walk_cursor("/product?_order_by=priority&_limit=10")
+        ids = [obj["id"] for obj in objects]
+        self.assertEqual(101, len(set(ids)))
+        self.assertEqual(sorted(ids), ids)
+
+    def test_cursor_stable_under_insert(self) -> None:
+        resp = self.superuser_client.get(
+            "/product?_cursor=&_order_by=priority&_limit=30"
+        )
+        cursor = resp.json()["next_cursor"]
+        Product.objects.create(barcode="product_new", priority=-1)
+        resp = self.superuser_client.get(
+            "/product", {"_cursor": cursor, "_order_by": "priority", "_limit": 30}
+        )
+        self.assertEqual("product_30", resp.json()["objects"][0]["barcode"])
+
+    def test_cursor_with_filter(self) -> None:
+        objects = self._walk_cursor(
+            "/product?_order_by=priority&_limit=10&brand_id__isnull=true"
+        )
+        self.assertEqual(51, len(objects))
+
+    def test_cursor_nullable_order(self) -> None:
+        resp = self.superuser_client.get("/product?_cursor=&_order_by=brand_id")
+        self.assertEqual(400, resp.status_code)
+
+    def test_cursor_invalid(self) -> None:
+        resp = self.superuser_client.get("/product?_cursor=xxxxx&_order_by=priority")
+        self.assertEqual(400, resp.status_code)
+
+    def test_cursor_malformed_values(self) -> None:
+        for values in [5, [1, 2], [None, None], ["1"], ["x", "y"], "ab"]:
+            with self.subTest(values=values):
+                payload = json.dumps({"o": ["priority", "pk"], "v": values})
+                cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+                resp = self.superuser_client.get(
+                    "/product", {"_cursor": cursor, "_order_by": "priority"}
+                )
+                self.assertEqual(400, resp.status_code, resp.content)
+
+    def test_cursor_other_order(self) -> None:
+        resp = self.superuser_client.get("/product?_cursor=&_order_by=priority")
+        cursor = resp.json()["next_cursor"]
+        resp = self.superuser_client.get(
+            "/product", {"_cursor": cursor, "_order_by": "-priority"}
+        )
+        self.assertEqual(400, resp.status_code)
+
+    def test_cursor_index(self) -> None:
+        def indexed(model: type) -> bool:
+            state = ModelState.from_model(model)
+            fields = [index.fields for index in state.options.get("indexes", [])]
+            return ["created_at", "id"] in fields
+
+        # ThrottledModel declares a Meta that subclasses DCFModel.Meta
+        for model in [Product, ThrottledModel]:
+            with self.subTest(model=model):
+                self.assertTrue(indexed(model))
+        # the permission tables are never paginated
+        for model in [DCFPermission, UserGroup, UserObjectPermission]:
+            with self.subTest(model=model):
+                self.assertFalse(indexed(model))
+
+    def _get_counted(self, url: str) -> tuple:
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.superuser_client.get(url)
+        self.assertEqual(200, resp.status_code, resp.content)
+        counts = [q for q in queries if "COUNT(" in q["sql"]]
+        return resp.json(), len(counts)
+
+    def test_count_none(self) -> None:
+        data, counts = self._get_counted("/product?_order_by=priority&_count=none")
+        self.assertEqual({"page", "limit", "has_next", "objects"}, set(data))
+        self.assertTrue(data["has_next"])
+        self.assertEqual(50, len(data["objects"]))
+        self.assertEqual(0, counts)
+
+    def test_count_none_last_page(self) -> None:
+        data, _ = self._get_counted("/product?_order_by=priority&_count=none&_page=3")
+        self.assertFalse(data["has_next"])
+        self.assertEqual(["product_100"], [obj["barcode"] for obj in data["objects"]])
+
+    def test_count_none_invalid_page(self) -> None:
+        resp = self.superuser_client.get("/product?_count=none&_page=0")
+        self.assertEqual(404, resp.status_code)
+        resp = self.superuser_client.get("/product?_count=none&_page=4")
+        self.assertEqual(404, resp.status_code)
+
+    def test_count_last_page(self) -> None:
+        resp = self.superuser_client.get("/product?_count=exact&_page=last")
+        self.assertEqual(200, resp.status_code)
+        for strategy in ["capped", "estimate", "none"]:
+            with self.subTest(strategy=strategy):
+                resp = self.superuser_client.get(
+                    f"/product?_count={strategy}&_page=last"
+                )
+                self.assertEqual(400, resp.status_code)
+                self.assertIn("_count=exact", resp.json()["message"])
+
+    def test_count_capped(self) -> None:
+        with override_settings(DCF_COUNT_CAP=60):
+            data, counts = self._get_counted("/product?_count=capped")
+        self.assertDictContainsSubset(
+            {
+                "objects_count": 60,
+                "objects_count_capped": True,
+                "objects_count_estimated": False,
+                "pages_count": 2,
+                "has_next": True,
+            },
+            data,
+        )
+        self.assertEqual(1, counts)
+
+    def test_count_capped_past_cap(self) -> None:
+        """Pages past the cap already tell that there are more objects."""
+        with override_settings(DCF_COUNT_CAP=20):
+            data, counts = self._get_counted("/product?_count=capped&_limit=30")
+        self.assertDictContainsSubset(
+            {"objects_count": 31, "objects_count_capped": True}, data
+        )
+        self.assertEqual(0, counts)
+
+    def test_count_capped_below_cap(self) -> None:
+        data, counts = self._get_counted("/product?_count=capped")
+        self.assertDictContainsSubset(
+            {"objects_count": 101, "objects_count_capped": False, "pages_count": 3},
+            data,
+        )
+        self.assertEqual(1, counts)
+
+    def test_count_capped_last_page(self) -> None:
+        data, counts = self._get_counted("/product?_count=capped&_page=3")
+        self.assertDictContainsSubset({"objects_count": 101, "has_next": False}, data)
+        self.assertEqual(0, counts)
+
+    def test_count_estimate_fallback(self) -> None:
+        """SQLite has no planner estimate, the count is capped instead."""
+        with override_settings(DCF_COUNT_CAP=60):
+            data, _ = self._get_counted("/product?_count=estimate")
+        self.assertDictContainsSubset(
+            {
+                "objects_count": 60,
+                "objects_count_capped": True,
+                "objects_count_estimated": False,
+            },
+            data,
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "planner estimates need PostgreSQL")
+    def test_count_estimate(self) -> None:
+        with override_settings(DCF_COUNT_CAP=60):
+            data, counts = self._get_counted("/product?_count=estimate")
+        self.assertTrue(data["objects_count_estimated"])
+        self.assertFalse(data["objects_count_capped"])
+        self.assertGreaterEqual(data["objects_count"], 51)
+        self.assertEqual(0, counts)
+
+    @override_settings(DCF_COUNT_STRATEGIES={"dcf_test_app.Product": "none"})
+    def test_count_model_default(self) -> None:
+        data, _ = self._get_counted("/product")
+        self.assertNotIn("objects_count", data)
+        data, _ = self._get_counted("/product?_count=exact")
+        self.assertEqual(101, data["objects_count"])
+        data, _ = self._get_counted("/brand")
+        self.assertEqual(100, data["objects_count"])
+
+    def test_count_invalid(self) -> None:
+        resp = self.superuser_client.get("/product?_count=xxxxx")
+        self.assertEqual(400, resp.status_code)
+
+
+@override_settings(DCF_PARALLEL_COUNT=True)
+class TestParallelCount(TransactionTestCase):
+    def setUp(self) -> None:
+        self.superuser_client = APIClient()
+        self.superuser_client.force_authenticate(default_users.root)
+        for i in range(30):
+            Product.objects.create(barcode=f"product_{i}", priority=i)
+
+    def _get(self, url: str) -> tuple:
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.superuser_client.get(url)
+        counts = [q for q in queries if "COUNT(" in q["sql"]]
+        return resp, len(counts)
+
+    def test_count_on_other_connection(self) -> None:
+        resp, counts = self._get("/product?_order_by=priority&_limit=20&_page=2")
+        self.assertDictContainsSubset(
+            {"page": 2, "objects_count": 30, "pages_count": 2}, resp.json()
+        )
+        self.assertEqual(
+            [f"product_{i}" for i in range(20, 30)],
+            [obj["barcode"] for obj in resp.json()["objects"]],
+        )
+        self.assertEqual(0, counts)
+
+    def test_last_page(self) -> None:
+        resp, _ = self._get("/product?_order_by=priority&_limit=20&_page=last")
+        self.assertEqual(2, resp.json()["page"])
+        self.assertEqual(10, len(resp.json()["objects"]))
+
+    def test_invalid_page(self) -> None:
+        resp, _ = self._get("/product?_limit=20&_page=3")
+        self.assertEqual(404, resp.status_code)
+        resp, _ = self._get("/product?_limit=20&_page=xxx")
+        self.assertEqual(404, resp.status_code)
+
+    def test_sequential_when_workers_are_busy(self) -> None:
+        _, idle = parallel_count._get_executor()
+        busy = 0
+        while idle.acquire(blocking=False):
+            busy += 1
+        try:
+            resp, counts = self._get("/product")
+        finally:
+            for _ in range(busy):
+                idle.release()
+        self.assertEqual(30, resp.json()["objects_count"])
+        self.assertEqual(1, counts)
+
+    def test_sequential_in_transaction(self) -> None:
+        """Another connection would not see the writes of the transaction."""
+        with transaction.atomic():
+            Product.objects.create(barcode="product_new")
+            resp, counts = self._get("/product")
+        self.assertEqual(31, resp.json()["objects_count"])
+        self.assertEqual(1, counts)
@@ -346,3 +346,24 @@ class TestPagination(TestCase):
             },
             objects[2],
         )
+
+    def test_cursor(self) -> None:
+        url = f"/brand/{self.brand.id}/products"
+        resp = self.superuser_client.get(
+            url, {"_cursor": "", "_order_by": "priority", "_limit": 60}
+        )
+        data = resp.json()
+        self.assertNotIn("objects_count", data)
+        self.assertEqual(
+            [f"product_{i}" for i in range(60)],
+            [obj["barcode"] for obj in data["objects"]],
+        )
+        resp = self.superuser_client.get(
+            url, {"_cursor": data["next_cursor"], "_order_by": "priority", "_limit": 60}
+        )
+        data = resp.json()
+        self.assertIsNone(data["next_cursor"])
+        self.assertEqual(
+            [f"product_{i}" for i in range(60, 100)],
+            [obj["barcode"] for obj in data["objects"]],
+        )
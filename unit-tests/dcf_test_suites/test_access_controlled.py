@@ -0,0 +1,346 @@
+import json
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+from dcf_test_app.models import Document, Product
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django_client_framework.models import (
+    GroupObjectPermission,
+    UserObjectPermission,
+    get_user_model,
+)
+from django_client_framework.permissions import (
+    add_perms_shortcut,
+    default_groups,
+    has_perms_shortcut,
+    reset_permissions,
+)
+from django_client_framework.permissions.context import permission_context
+from django_client_framework.permissions.orphans import collect_orphaned_permissions
+from django_client_framework.permissions.reset import (
+    ResetTask,
+    plan_reset,
+    reset_objects,
+)
+from django_client_framework.permissions.updates import wait_for_background_updates
+
+
+class TestIncrementalResetPerms(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.alice = get_user_model().objects.create(username="alice")
+        self.bob = get_user_model().objects.create(username="bob")
+        self.document = Document.objects.create(owner=self.alice, is_public=True)
+
+    def test_grants_are_added(self) -> None:
+        self.assertEqual(UserObjectPermission.objects.count(), 3)
+        self.assertEqual(GroupObjectPermission.objects.count(), 1)
+        self.assertTrue(has_perms_shortcut(self.alice, self.document, "rwd"))
+        self.assertTrue(has_perms_shortcut(default_groups.anyone, self.document, "r"))
+
+    def test_unchanged_save_writes_nothing(self) -> None:
+        with CaptureQueriesContext(connection) as queries:
+            self.document.save()
+        writes = [
+            q["sql"]
+            for q in queries.captured_queries
+            if "objectpermission" in q["sql"] and not q["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(writes, [])
+
+    def test_stale_grants_are_removed(self) -> None:
+        rows = set(UserObjectPermission.objects.values_list("permission", flat=True))
+        self.document.owner = self.bob
+        self.document.is_public = False
+        self.document.save()
+        self.assertFalse(has_perms_shortcut(self.alice, self.document, "r"))
+        self.assertTrue(has_perms_shortcut(self.bob, self.document, "rwd"))
+        self.assertFalse(has_perms_shortcut(default_groups.anyone, self.document, "r"))
+        self.assertEqual(GroupObjectPermission.objects.count(), 0)
+        self.assertEqual(
+            set(
+                UserObjectPermission.objects.filter(user=self.bob).values_list(
+                    "permission", flat=True
+                )
+            ),
+            rows,
+        )
+
+
+class TestPermissionDependencies(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.alice = get_user_model().objects.create(username="alice")
+        self.bob = get_user_model().objects.create(username="bob")
+        self.document = Document.objects.create(owner=self.alice)
+
+    def count_permission_queries(self, document: Document, **kwargs: Any) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            document.save(**kwargs)
+        return len([q for q in queries.captured_queries if "permission" in q["sql"]])
+
+    def test_update_fields_without_dependency(self) -> None:
+        self.document.view_count += 1
+        self.assertEqual(
+            self.count_permission_queries(self.document, update_fields=["view_count"]),
+            0,
+        )
+
+    def test_unchanged_dependencies(self) -> None:
+        document = Document.objects.get(pk=self.document.pk)
+        document.title = "draft"
+        self.assertEqual(self.count_permission_queries(document), 0)
+
+    def test_changed_dependency(self) -> None:
+        document = Document.objects.get(pk=self.document.pk)
+        document.owner = self.bob
+        self.assertGreater(self.count_permission_queries(document), 0)
+        self.assertTrue(has_perms_shortcut(self.bob, document, "rwd"))
+        self.assertFalse(has_perms_shortcut(self.alice, document, "r"))
+
+    def test_changed_dependency_in_update_fields(self) -> None:
+        self.document.is_public = True
+        self.document.save(update_fields=["is_public"])
+        self.assertTrue(has_perms_shortcut(default_groups.anyone, self.document, "r"))
+
+    def test_deferred_dependency(self) -> None:
+        document = Document.objects.only("id").get(pk=self.document.pk)
+        document.is_public = True
+        document.save()
+        self.assertTrue(has_perms_shortcut(default_groups.anyone, document, "r"))
+
+
+@override_settings(DCF_PERMISSION_UPDATE_MODE="on_commit")
+class TestDeferredPermissionUpdates(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.alice = get_user_model().objects.create(username="alice")
+        self.bob = get_user_model().objects.create(username="bob")
+
+    def test_coalesced_on_commit(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            document = Document.objects.create(owner=self.alice)
+            document.is_public = True
+            document.save()
+            document.owner = self.bob
+            document.save()
+            self.assertEqual(UserObjectPermission.objects.count(), 0)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            set(UserObjectPermission.objects.values_list("user", flat=True)),
+            {self.bob.pk},
+        )
+        self.assertEqual(GroupObjectPermission.objects.count(), 1)
+
+    def test_flushed_before_permission_check(self) -> None:
+        document = Document.objects.create(owner=self.alice)
+        self.assertEqual(UserObjectPermission.objects.count(), 0)
+        self.assertTrue(has_perms_shortcut(self.alice, document, "rwd"))
+
+    def test_rolled_back_savepoint(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            document = Document.objects.create(owner=self.alice)
+            try:
+                with transaction.atomic():
+                    document.owner = self.bob
+                    document.save()
+                    Document.objects.create(owner=self.bob)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertTrue(has_perms_shortcut(self.alice, document, "rwd"))
+        self.assertFalse(has_perms_shortcut(self.bob, document, "w"))
+        self.assertFalse(UserObjectPermission.objects.filter(user=self.bob).exists())
+
+
+@override_settings(DCF_PERMISSION_UPDATE_MODE="background")
+class TestBackgroundPermissionUpdates(TransactionTestCase):
+    def setUp(self) -> None:
+        self.alice = get_user_model().objects.create(username="alice")
+
+    def test_reset_after_commit(self) -> None:
+        with transaction.atomic():
+            document = Document.objects.create(owner=self.alice, is_public=True)
+            document.title = "title"
+            document.save()
+        wait_for_background_updates()
+        self.assertTrue(has_perms_shortcut(self.alice, document, "rwd"))
+        self.assertEqual(GroupObjectPermission.objects.count(), 1)
+
+    def test_rolled_back(self) -> None:
+        try:
+            with transaction.atomic():
+                Document.objects.create(owner=self.alice)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        wait_for_background_updates()
+        self.assertEqual(UserObjectPermission.objects.count(), 0)
+
+
+class TestResetPermissions(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.alice = get_user_model().objects.create(username="alice")
+        self.documents = [
+            Document.objects.create(owner=self.alice, is_public=i % 2 == 0)
+            for i in range(5)
+        ]
+        UserObjectPermission.objects.all().delete()
+        GroupObjectPermission.objects.all().delete()
+
+    def assertRestored(self) -> None:
+        self.assertEqual(UserObjectPermission.objects.count(), 15)
+        self.assertEqual(GroupObjectPermission.objects.count(), 3)
+
+    def test_reset_all_models_by_default(self) -> None:
+        self.assertEqual(reset_permissions(chunk_size=2), 5)
+        self.assertRestored()
+
+    def test_pk_ranges(self) -> None:
+        tasks = plan_reset([Document], ranges=4, chunk_size=2)
+        self.assertEqual(len(tasks), 4)
+        self.assertEqual(sum(task.run() for task in tasks), 5)
+        self.assertRestored()
+
+    def test_resume_from_checkpoint(self) -> None:
+        with TemporaryDirectory() as checkpoint_dir:
+            task = ResetTask(Document, chunk_size=2, checkpoint_dir=checkpoint_dir)
+            chunks = task.chunks(None)
+            first = next(chunks)
+            reset_objects(Document, first)
+            task.save_checkpoint(first[-1].pk, len(first), done=False)
+            self.assertEqual(reset_permissions(checkpoint_dir=checkpoint_dir), 3)
+            self.assertRestored()
+            self.assertEqual(reset_permissions(checkpoint_dir=checkpoint_dir), 0)
+
+    def test_resume_with_other_workers(self) -> None:
+        with TemporaryDirectory() as checkpoint_dir:
+            ResetTask(Document, checkpoint_dir=checkpoint_dir).save_checkpoint(
+                self.documents[0].pk, 1, done=False
+            )
+            with self.assertRaises(ValueError):
+                reset_permissions(workers=2, checkpoint_dir=checkpoint_dir)
+            with self.assertRaises(CommandError):
+                call_command(
+                    "reset_permissions",
+                    "--workers=2",
+                    f"--checkpoint-dir={checkpoint_dir}",
+                    stdout=StringIO(),
+                )
+            self.assertEqual(UserObjectPermission.objects.count(), 0)
+
+    def test_workers(self) -> None:
+        """The tasks run in forked processes, each with its own copy of the
+        in-memory test database, so only their results are checked."""
+        with TemporaryDirectory() as checkpoint_dir:
+            total = reset_permissions(
+                [Document], workers=2, chunk_size=2, checkpoint_dir=checkpoint_dir
+            )
+            self.assertEqual(total, 5)
+            checkpoints = []
+            for name in os.listdir(checkpoint_dir):
+                with open(os.path.join(checkpoint_dir, name)) as f:
+                    checkpoints.append(json.load(f))
+            self.assertEqual(len(checkpoints), 8)
+            self.assertTrue(all(c["done"] and c["ranges"] == 8 for c in checkpoints))
+            self.assertEqual(sum(c["rows"] for c in checkpoints), 5)
+            self.assertEqual(
+                reset_permissions([Document], workers=2, checkpoint_dir=checkpoint_dir),
+                0,
+            )
+
+    def test_overridden_reset_perms(self) -> None:
+        with patch.object(
+            Document.PermissionManager, "reset_perms", autospec=True
+        ) as reset_perms:
+            reset_objects(Document, self.documents)
+        self.assertEqual(
+            [call.args[1] for call in reset_perms.call_args_list], self.documents
+        )
+        self.assertEqual(UserObjectPermission.objects.count(), 0)
+
+    def test_legacy_add_perms(self) -> None:
+        """Managers without get_perms() have the user object permissions of
+        the objects deleted in one query, then add_perms() called on each."""
+        bob = get_user_model().objects.create(username="bob")
+        add_perms_shortcut(bob, self.documents[0], "r")
+
+        def add_perms(manager: Any, document: Document) -> None:
+            add_perms_shortcut(document.owner, document, "rw")
+
+        with patch.object(
+            Document.PermissionManager, "get_perms", return_value=None
+        ), patch.object(
+            Document.PermissionManager,
+            "add_perms",
+            autospec=True,
+            side_effect=add_perms,
+        ), permission_context():
+            self.assertTrue(has_perms_shortcut(bob, self.documents[0], "r"))
+            deleted = MagicMock()
+            post_delete.connect(deleted, sender=UserObjectPermission)
+            try:
+                reset_objects(Document, self.documents)
+            finally:
+                post_delete.disconnect(deleted, sender=UserObjectPermission)
+            self.assertFalse(has_perms_shortcut(bob, self.documents[0], "r"))
+        # the rows are neither loaded nor signaled one by one
+        deleted.assert_not_called()
+        self.assertEqual(UserObjectPermission.objects.count(), 10)
+
+    def test_command(self) -> None:
+        stdout = StringIO()
+        call_command("reset_permissions", "dcf_test_app.Document", stdout=stdout)
+        self.assertIn("Reset permissions of 5 objects", stdout.getvalue())
+        self.assertRestored()
+
+
+class TestOrphanedPermissions(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.alice = get_user_model().objects.create(username="alice")
+        self.documents = [
+            Document.objects.create(owner=self.alice, is_public=True) for _ in range(3)
+        ]
+
+    def test_deleted_on_delete(self) -> None:
+        self.documents[0].delete()
+        self.assertEqual(UserObjectPermission.objects.count(), 6)
+        self.assertEqual(GroupObjectPermission.objects.count(), 2)
+        Document.objects.all().delete()
+        self.assertFalse(UserObjectPermission.objects.exists())
+        self.assertFalse(GroupObjectPermission.objects.exists())
+
+    def test_collect_in_chunks(self) -> None:
+        products = [Product.objects.create() for _ in range(5)]
+        add_perms_shortcut(self.alice, Product.objects.all(), "rw")
+        Product.objects.filter(pk__in=[p.pk for p in products[:3]]).delete()
+        self.assertEqual(
+            collect_orphaned_permissions(dry_run=True), {"dcf_test_app.Product": 6}
+        )
+        self.assertEqual(UserObjectPermission.objects.count(), 19)
+        self.assertEqual(
+            collect_orphaned_permissions([Product], chunk_size=4),
+            {"dcf_test_app.Product": 6},
+        )
+        self.assertEqual(UserObjectPermission.objects.count(), 13)
+        self.assertEqual(collect_orphaned_permissions(), {})
+
+    def test_command(self) -> None:
+        product = Product.objects.create()
+        add_perms_shortcut(self.alice, product, "r")
+        Product.objects.all().delete()
+        stdout = StringIO()
+        call_command("delete_orphaned_permissions", stdout=stdout)
+        self.assertIn("dcf_test_app.Product: 1", stdout.getvalue())
+        self.assertIn("Deleted 1 orphaned permissions", stdout.getvalue())
@@ -0,0 +1,135 @@
+from unittest.mock import patch
+from uuid import UUID
+
+from dcf_test_app.models import Brand, Product
+from django.db import connection
+from django.db.models import Count
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from django_client_framework.api.filter_plan import (
+    FilterPlan,
+    compile_paths,
+    ordering_is_multi_valued,
+)
+from django_client_framework.exceptions import ParseError
+from django_client_framework.permissions import default_users
+
+
+def make_plan(query: str, queryset=None) -> FilterPlan:
+    request = Request(APIRequestFactory().get(f"/product?{query}"))
+    if queryset is None:
+        queryset = Product.objects.all()
+    return FilterPlan.from_request(request, queryset)
+
+
+def search_barcode(text: str, queryset: QuerySet) -> QuerySet:
+    return queryset.filter(barcode=text)
+
+
+class TestFilterPlan(TestCase):
+    def test_values_are_coerced(self) -> None:
+        plan = make_plan(
+            f"id__in[]={UUID(int=1)},{UUID(int=2)}&priority__gte=3"
+            "&brand__isnull=true&barcode=abc"
+        )
+        self.assertEqual(
+            plan.filters,
+            {
+                "id__in": [UUID(int=1), UUID(int=2)],
+                "priority__gte": 3,
+                "brand__isnull": True,
+                "barcode": "abc",
+            },
+        )
+
+    def test_relations(self) -> None:
+        plan = make_plan("brand__name__icontains=a&brand__products__barcode=x")
+        self.assertEqual(plan.relations, {"brand": Brand, "brand__products": Product})
+        self.assertEqual(make_plan("barcode__icontains=a").relations, {})
+
+    def test_invalid_paths(self) -> None:
+        for query in [
+            "xxxxxx=1",
+            "brand__xxxxxx=1",
+            "barcode__xxxxxx=1",
+            "priority__year__xxxxxx=1",
+        ]:
+            with self.subTest(query), self.assertRaises(ParseError):
+                make_plan(query)
+
+    def test_invalid_values(self) -> None:
+        for query in ["priority=abc", "id__in[]=1,2", "brand__isnull=1"]:
+            with self.subTest(query), self.assertRaises(ParseError):
+                make_plan(query)
+
+    def test_multi_valued(self) -> None:
+        self.assertFalse(make_plan("brand__name=a&barcode=b").multi_valued)
+        self.assertTrue(make_plan("brand__products__barcode=b").multi_valued)
+        self.assertTrue(make_plan("products__in[]=", Brand.objects.all()).multi_valued)
+
+    def test_ordering_is_multi_valued(self) -> None:
+        self.assertFalse(ordering_is_multi_valued(Product, ("-brand__name", "pk")))
+        self.assertTrue(ordering_is_multi_valued(Brand, ("products__priority",)))
+        self.assertTrue(ordering_is_multi_valued(Product, ("xxxxxx",)))
+
+    def test_transforms_are_not_coerced(self) -> None:
+        self.assertEqual(
+            make_plan("created_at__year=2020").filters, {"created_at__year": "2020"}
+        )
+
+    def test_annotations(self) -> None:
+        queryset = Brand.objects.annotate(n=Count("products"))
+        self.assertEqual(make_plan("n__gte=1", queryset).filters, {"n__gte": "1"})
+
+    def test_paths_are_cached(self) -> None:
+        compile_paths.cache_clear()
+        make_plan("barcode=a&priority=1")
+        make_plan("priority=2&barcode=b")
+        self.assertEqual(compile_paths.cache_info().hits, 1)
+
+
+class TestFilterPlanAPI(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.force_authenticate(default_users.root)
+        self.brand = Brand.objects.create(name="brand")
+        Product.objects.create(barcode="a", brand=self.brand, priority=1)
+        Product.objects.create(barcode="b", priority=2)
+
+    def test_filter(self) -> None:
+        resp = self.client.get("/product?brand__name=brand&priority__lte=1")
+        self.assertEqual(resp.json()["objects_count"], 1)
+
+    def test_invalid_value(self) -> None:
+        resp = self.client.get("/product?priority=abc")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_fulltext(self) -> None:
+        self.assertEqual(self.client.get("/product?_fulltext=a").status_code, 400)
+        # Searchable only runs on PostgreSQL, Product stands in for one
+        with patch("django_client_framework.api.filter_plan.Searchable", Product):
+            with patch.object(
+                Product,
+                "filter_by_text_search",
+                side_effect=search_barcode,
+                create=True,
+            ) as filter_by_text_search:
+                resp = self.client.get("/product?_fulltext=b&priority__gte=1")
+        filter_by_text_search.assert_called_once()
+        self.assertEqual(
+            [product["barcode"] for product in resp.json()["objects"]], ["b"]
+        )
+
+    def get_sql(self, url: str) -> str:
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return " ".join(q["sql"] for q in queries)
+
+    def test_distinct_only_for_multi_valued_joins(self) -> None:
+        self.assertNotIn("DISTINCT", self.get_sql("/product?brand__name=brand"))
+        self.assertIn("DISTINCT", self.get_sql("/brand?products__barcode=a"))
+        self.assertIn("DISTINCT", self.get_sql("/brand?_order_by=products__barcode"))
@@ -0,0 +1,96 @@
+import warnings
+from typing import Any
+
+from dcf_test_app.models import Product
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django_client_framework.models import UserGroup, get_user_model
+from django_client_framework.permissions import (
+    add_perms_shortcut,
+    default_groups,
+    has_perms_shortcut,
+    reset_permissions,
+)
+from django_client_framework.permissions.context import permission_context
+
+
+@override_settings(DCF_PERMISSION_CACHE="default")
+class TestPermissionCache(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        reset_permissions()
+        self.user = get_user_model().objects.create()
+        self.group = UserGroup.objects.create(name="staff")
+        self.product = Product.objects.create()
+
+    def can_read(self, instance: Any) -> bool:
+        """Checks the read permission of the user in a new request."""
+        with permission_context():
+            return has_perms_shortcut(self.user, instance, "r")
+
+    def count_permission_queries(self, instance: Any) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self.can_read(instance)
+        return len(
+            [
+                q
+                for q in queries.captured_queries
+                if "permission" in q["sql"] or "_groups" in q["sql"]
+            ]
+        )
+
+    def test_model_verdict_is_shared_between_requests(self) -> None:
+        add_perms_shortcut(self.user, Product, "r")
+        self.assertTrue(self.can_read(Product))
+        self.assertEqual(self.count_permission_queries(Product), 0)
+
+    def test_object_verdict_is_shared_between_requests(self) -> None:
+        add_perms_shortcut(self.user, self.product, "r")
+        self.assertTrue(self.can_read(self.product))
+        self.assertEqual(self.count_permission_queries(self.product), 0)
+
+    def test_model_grant_takes_effect_immediately(self) -> None:
+        self.assertFalse(self.can_read(Product))
+        add_perms_shortcut(self.user, Product, "r")
+        self.assertTrue(self.can_read(Product))
+        self.user.model_permissions.clear()
+        self.assertFalse(self.can_read(Product))
+
+    def test_object_grant_takes_effect_immediately(self) -> None:
+        self.assertFalse(self.can_read(self.product))
+        add_perms_shortcut(self.user, self.product, "r")
+        self.assertTrue(self.can_read(self.product))
+
+    def test_group_grant_takes_effect_immediately(self) -> None:
+        self.user.groups.add(self.group)
+        self.assertFalse(self.can_read(self.product))
+        add_perms_shortcut(self.group, self.product, "r")
+        self.assertTrue(self.can_read(self.product))
+
+    def test_group_membership_takes_effect_immediately(self) -> None:
+        add_perms_shortcut(self.group, Product, "r")
+        self.assertFalse(self.can_read(Product))
+        self.group.user_set.add(self.user)  # type: ignore
+        self.assertTrue(self.can_read(Product))
+        self.user.groups.remove(self.group)
+        self.assertFalse(self.can_read(Product))
+
+    def test_anyone_grant_takes_effect_immediately(self) -> None:
+        self.assertFalse(self.can_read(Product))
+        add_perms_shortcut(default_groups.anyone, Product, "r")
+        self.assertTrue(self.can_read(Product))
+
+    def test_keys_are_bounded(self) -> None:
+        """A user in many groups has as many version tokens, which must not
+        make keys longer than memcached allows."""
+        groups = [UserGroup.objects.create(name=f"group_{i}") for i in range(20)]
+        self.user.groups.add(*groups)
+        add_perms_shortcut(groups[-1], self.product, "r")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", CacheKeyWarning)
+            self.assertTrue(self.can_read(self.product))
+            self.assertTrue(self.can_read(self.product))
@@ -0,0 +1,93 @@
+from dcf_test_app.models import Document, Product, Project, Team
+from django.test import TestCase
+
+from django_client_framework.models import get_user_model
+from django_client_framework.permissions import (
+    add_perms_shortcut,
+    has_perms_shortcut,
+    reset_permissions,
+)
+from django_client_framework.permissions.context import (
+    get_permission_context,
+    permission_context,
+)
+
+
+class TestPermissionContext(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.user = get_user_model().objects.create()
+        self.product = Product.objects.create()
+
+    def test_no_context_outside_of_request(self) -> None:
+        self.assertIsNone(get_permission_context())
+        with permission_context() as context:
+            self.assertIs(get_permission_context(), context)
+            with permission_context() as inner:
+                self.assertIs(inner, context)
+        self.assertIsNone(get_permission_context())
+
+    def test_object_verdict_is_memoized(self) -> None:
+        add_perms_shortcut(self.user, self.product, "r")
+        with permission_context():
+            self.assertTrue(has_perms_shortcut(self.user, self.product, "r"))
+            with self.assertNumQueries(0):
+                self.assertTrue(has_perms_shortcut(self.user, self.product, "r"))
+
+    def test_model_verdict_is_memoized(self) -> None:
+        with permission_context():
+            self.assertFalse(has_perms_shortcut(self.user, Product, "r"))
+            with self.assertNumQueries(0):
+                self.assertFalse(has_perms_shortcut(self.user, Product, "r"))
+
+    def test_dropped_after_adding_object_perms(self) -> None:
+        with permission_context() as context:
+            self.assertFalse(has_perms_shortcut(self.user, self.product, "r"))
+            add_perms_shortcut(self.user, self.product, "r")
+            self.assertEqual(len(context), 0)
+            self.assertTrue(has_perms_shortcut(self.user, self.product, "r"))
+
+    def test_dropped_after_adding_model_perms(self) -> None:
+        with permission_context():
+            self.assertFalse(has_perms_shortcut(self.user, Product, "r"))
+            add_perms_shortcut(self.user, Product, "r")
+            self.assertTrue(has_perms_shortcut(self.user, Product, "r"))
+
+    def test_dropped_after_save(self) -> None:
+        document = Document.objects.create()
+        with permission_context() as context:
+            has_perms_shortcut(self.user, document, "r")
+            self.assertGreater(len(context), 0)
+            document.save()
+            self.assertEqual(len(context), 0)
+
+    def test_dropped_after_delete(self) -> None:
+        document = Document.objects.create()
+        with permission_context() as context:
+            has_perms_shortcut(self.user, document, "r")
+            Document.objects.filter(pk=document.pk).delete()
+            self.assertEqual(len(context), 0)
+
+    def test_kept_after_unrelated_save(self) -> None:
+        """Writes to models permissions do not depend on keep the context."""
+        with permission_context() as context:
+            has_perms_shortcut(self.user, self.product, "r")
+            self.product.save()
+            self.assertGreater(len(context), 0)
+
+    def test_dropped_after_user_save(self) -> None:
+        with permission_context() as context:
+            has_perms_shortcut(self.user, self.product, "r")
+            self.user.save()
+            self.assertEqual(len(context), 0)
+
+    def test_dropped_after_rule_model_save(self) -> None:
+        """Writes to the models that permission rules traverse, here the
+        leader of the Team of a Project, drop the context."""
+        team = Team.objects.create()
+        project = Project.objects.create(team=team)
+        with permission_context():
+            self.assertFalse(has_perms_shortcut(self.user, project, "r"))
+            team.leader = self.user
+            team.save()
+            self.assertTrue(has_perms_shortcut(self.user, project, "r"))
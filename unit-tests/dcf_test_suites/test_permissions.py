@@ -1,13 +1,57 @@
-from dcf_test_app.models import Product
-from django.test import TestCase
+from io import StringIO
+from unittest import skipUnless
 
-from django_client_framework.models import UserObjectPermission, get_user_model
+from dcf_test_app.models import Brand, Product, Project, Team
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import (
+    BooleanField,
+    Exists,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django_client_framework.models import (
+    DCFPermission,
+    GroupObjectPermission,
+    ReadVisibility,
+    UserGroup,
+    UserObjectPermission,
+    get_user_model,
+)
 from django_client_framework.permissions import (
+    USER,
+    PermissionRule,
     add_perms_shortcut,
+    anyone_group_id,
+    bulk_has_perms,
+    default_groups,
+    default_users,
     filter_queryset_by_perms_shortcut,
+    get_permission_for_model,
+    get_permission_snapshot,
+    get_permitted_fields,
+    get_rule_models,
     has_perms_shortcut,
+    is_root,
+    load_permission_snapshot,
+    remove_perms_shortcut,
     reset_permissions,
 )
+from django_client_framework.permissions.context import permission_context
+from django_client_framework.permissions.registry import permission_registry
+from django_client_framework.permissions.statistics import grant_statistics
+from django_client_framework.permissions.visibility import (
+    check_visibility_index,
+    rebuild_visibility_index,
+)
 
 
 class TestHasPermission(TestCase):
@@ -81,6 +125,49 @@ class TestAddPermissions(TestCase):
             self.assertEqual(uop.content_object, self.product)
             self.assertEqual(uop.permission.field_name, "barcode")
 
+    def test_queryset_permission(self) -> None:
+        group = UserGroup.objects.create(name="staff")
+        for _ in range(5):
+            Product.objects.create(barcode="x")
+        Product.objects.create()
+        add_perms_shortcut(group, Product.objects.filter(barcode="x"), "rw")
+        self.assertEqual(GroupObjectPermission.objects.count(), 10)
+        add_perms_shortcut(group, Product.objects.filter(barcode="x"), "r")
+        self.assertEqual(GroupObjectPermission.objects.count(), 10)
+        self.assertEqual(
+            filter_queryset_by_perms_shortcut("rw", group, Product.objects.all())
+            .filter(barcode="x")
+            .count(),
+            5,
+        )
+
+    def test_queryset_permission_loads_no_objects(self) -> None:
+        Product.objects.create()
+        get_permission_for_model("r", Product, field_name=None)
+        with CaptureQueriesContext(connection) as queries:
+            add_perms_shortcut(self.user, Product.objects.all(), "r")
+        self.assertEqual(UserObjectPermission.objects.count(), 2)
+        self.assertNotIn("barcode", " ".join(q["sql"] for q in queries))
+
+    @skipUnless(
+        connection.vendor == "postgresql"
+        and getattr(connection, "pg_version", 0) >= 130000,
+        "INSERT ... SELECT is only used on PostgreSQL 13+",
+    )
+    def test_queryset_permission_insert_from_select(self) -> None:
+        for _ in range(3):
+            Product.objects.create(barcode="x")
+        get_permission_for_model("r", Product, field_name=None)
+        get_permission_for_model("w", Product, field_name=None)
+        with CaptureQueriesContext(connection) as queries:
+            add_perms_shortcut(self.user, Product.objects.filter(barcode="x"), "rw")
+        inserts = [q["sql"] for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn("SELECT", inserts[0])
+        self.assertEqual(UserObjectPermission.objects.count(), 6)
+        add_perms_shortcut(self.user, Product.objects.filter(barcode="x"), "r")
+        self.assertEqual(UserObjectPermission.objects.count(), 6)
+
     def test_add_model_permission(self) -> None:
         add_perms_shortcut(self.user, Product, "rwcd", field_name="barcode")
         self.assertEqual(self.user.model_permissions.count(), 4)
@@ -88,6 +175,52 @@ class TestAddPermissions(TestCase):
             self.assertEqual(perm.field_name, "barcode")
 
 
+class TestRemovePermissions(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.user = get_user_model().objects.create()
+        self.product = Product.objects.create()
+
+    def test_remove_object_permission(self) -> None:
+        add_perms_shortcut(self.user, self.product, "rw")
+        self.assertTrue(has_perms_shortcut(self.user, self.product, "w"))
+        self.assertEqual(remove_perms_shortcut(self.user, self.product, "w"), 1)
+        self.assertFalse(has_perms_shortcut(self.user, self.product, "w"))
+        self.assertTrue(has_perms_shortcut(self.user, self.product, "r"))
+        self.assertEqual(remove_perms_shortcut(self.user, self.product, "w"), 0)
+
+    def test_remove_queryset_permission_in_one_query(self) -> None:
+        group = UserGroup.objects.create(name="staff")
+        for _ in range(5):
+            Product.objects.create(barcode="x")
+        add_perms_shortcut(group, Product.objects.all(), "r")
+        add_perms_shortcut(self.user, Product.objects.all(), "r")
+        with self.assertNumQueries(1):
+            removed = remove_perms_shortcut(
+                group, Product.objects.filter(barcode="x"), "r"
+            )
+        self.assertEqual(removed, 5)
+        self.assertEqual(GroupObjectPermission.objects.count(), 1)
+        self.assertEqual(UserObjectPermission.objects.count(), 6)
+
+    def test_remove_field_permission(self) -> None:
+        add_perms_shortcut(self.user, self.product, "w", field_name="barcode")
+        add_perms_shortcut(self.user, self.product, "w")
+        self.assertEqual(
+            remove_perms_shortcut(self.user, self.product, "w", field_name="barcode"),
+            1,
+        )
+        self.assertEqual(UserObjectPermission.objects.get().permission.field_name, None)
+
+    def test_remove_model_permission(self) -> None:
+        add_perms_shortcut(self.user, Product, "rw")
+        with permission_context():
+            self.assertTrue(has_perms_shortcut(self.user, Product, "w"))
+            self.assertEqual(remove_perms_shortcut(self.user, Product, "w"), 1)
+            self.assertFalse(has_perms_shortcut(self.user, Product, "w"))
+        self.assertEqual(self.user.model_permissions.count(), 1)
+
+
 class TestAddFilterByPermissions(TestCase):
     def setUp(self) -> None:
         reset_permissions()
@@ -151,3 +284,613 @@ class TestAddFilterByPermissions(TestCase):
             "r", self.user, Product.objects.all()
         )
         self.assertEqual(queryset.count(), 1)
+
+    @override_settings(DCF_PERMISSION_INLINE_LIMIT=0)
+    def test_single_statement(self) -> None:
+        group = UserGroup.objects.create(name="staff")
+        self.user.groups.add(group)
+        products = [Product.objects.create() for _ in range(3)]
+        add_perms_shortcut(self.user, products[0], "rw")
+        add_perms_shortcut(group, products[1], "rw")
+        add_perms_shortcut(self.user, products[2], "r")
+        with permission_context():
+            has_perms_shortcut(self.user, Product, "d")
+            queryset = filter_queryset_by_perms_shortcut(
+                "rw", self.user, Product.objects.all()
+            )
+            sql = str(queryset.query)
+            with self.assertNumQueries(1):
+                self.assertEqual(
+                    set(queryset.values_list("pk", flat=True)),
+                    {products[0].pk, products[1].pk},
+                )
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn("UNION", sql)
+
+    def test_small_grant_sets_are_inlined(self) -> None:
+        products = [Product.objects.create() for _ in range(3)]
+        add_perms_shortcut(self.user, products[0], "r")
+        add_perms_shortcut(self.user, products[1], "r")
+        with self.assertLogs("django_client_framework.permissions", "DEBUG") as logs:
+            queryset = filter_queryset_by_perms_shortcut(
+                "r", self.user, Product.objects.all(), adaptive=True
+            )
+        self.assertNotIn("objectpermission", str(queryset.query))
+        self.assertEqual(set(queryset), set(products[:2]))
+        self.assertIn("UserObjectPermission of Product: inline (2)", logs.output[0])
+
+    @override_settings(DCF_PERMISSION_INLINE_LIMIT=2)
+    def test_large_grant_sets_use_a_subquery(self) -> None:
+        grant_statistics.clear()
+        products = [Product.objects.create() for _ in range(4)]
+        add_perms_shortcut(self.user, Product.objects.all(), "r")
+        with self.assertLogs("django_client_framework.permissions", "DEBUG") as logs:
+            queryset = filter_queryset_by_perms_shortcut(
+                "r", self.user, Product.objects.all(), adaptive=True
+            )
+        self.assertIn("UserObjectPermission of Product: subquery", logs.output[0])
+        self.assertIn("EXISTS", str(queryset.query))
+        self.assertEqual(queryset.count(), 4)
+        # the large set is remembered, and not fetched again
+        with permission_context():
+            get_permission_snapshot(self.user)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(
+                    filter_queryset_by_perms_shortcut(
+                        "r",
+                        self.user,
+                        Product.objects.filter(pk=products[0].pk),
+                        adaptive=True,
+                    ).count(),
+                    1,
+                )
+        self.assertFalse(
+            any(
+                q["sql"].startswith(
+                    'SELECT "django_client_framework_userobjectpermission"'
+                )
+                for q in queries
+            )
+        )
+        grant_statistics.clear()
+
+    def test_model_permission_skips_the_filter(self) -> None:
+        Product.objects.create()
+        add_perms_shortcut(self.user, Product, "r")
+        with self.assertLogs("django_client_framework.permissions", "DEBUG") as logs:
+            queryset = filter_queryset_by_perms_shortcut(
+                "r", self.user, Product.objects.all(), adaptive=True
+            )
+        self.assertIn("UserObjectPermission of Product: skip", logs.output[0])
+        self.assertEqual(queryset.count(), 1)
+
+    def test_has_perms_on_queryset(self) -> None:
+        products = [Product.objects.create() for _ in range(2)]
+        add_perms_shortcut(self.user, products[0], "rw")
+        add_perms_shortcut(self.user, products[1], "r")
+        self.assertTrue(has_perms_shortcut(self.user, Product.objects.all(), "r"))
+        self.assertFalse(has_perms_shortcut(self.user, Product.objects.all(), "rw"))
+
+
+class TestPermissionSnapshot(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.user = get_user_model().objects.create()
+        self.group = UserGroup.objects.create(name="staff")
+        self.user.groups.add(self.group)
+        self.read = get_permission_for_model("r", Product, field_name=None)
+        self.write = get_permission_for_model("w", Product, field_name=None)
+        self.create = get_permission_for_model("c", Product, field_name=None)
+
+    def test_loads_in_one_query(self) -> None:
+        add_perms_shortcut(self.user, Product, "r")
+        add_perms_shortcut(self.group, Product, "w")
+        add_perms_shortcut(default_groups.anyone, Product, "c")
+        with self.assertNumQueries(1):
+            snapshot = load_permission_snapshot(self.user)
+        self.assertEqual(snapshot.own, {self.read.pk})
+        self.assertEqual(snapshot.groups, {self.write.pk})
+        self.assertEqual(snapshot.anyone, {self.create.pk})
+        self.assertEqual(snapshot.group_pks, {self.group.pk})
+
+    def test_group_snapshot(self) -> None:
+        add_perms_shortcut(self.group, Product, "w")
+        add_perms_shortcut(default_groups.anyone, Product, "c")
+        snapshot = load_permission_snapshot(self.group)
+        self.assertEqual(snapshot.own, {self.write.pk})
+        self.assertEqual(snapshot.anyone, {self.create.pk})
+        self.assertEqual(snapshot.group_pks, set())
+
+    def test_model_perm_from_group(self) -> None:
+        add_perms_shortcut(self.group, Product, "rw")
+        self.assertTrue(has_perms_shortcut(self.user, Product, "rw"))
+        self.assertFalse(has_perms_shortcut(self.user, Product, "rwc"))
+
+    def test_public_model_needs_no_subquery(self) -> None:
+        Product.objects.create()
+        add_perms_shortcut(default_groups.anyone, Product, "r")
+        queryset = filter_queryset_by_perms_shortcut(
+            "r", self.user, Product.objects.all()
+        )
+        self.assertNotIn("objectpermission", str(queryset.query))
+        self.assertEqual(queryset.count(), 1)
+
+
+class TestHasPermissionOnObject(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.user = get_user_model().objects.create()
+        self.group = UserGroup.objects.create(name="staff")
+        self.user.groups.add(self.group)
+        self.product = Product.objects.create()
+
+    def test_single_query(self) -> None:
+        add_perms_shortcut(self.user, self.product, "rw")
+        with permission_context():
+            has_perms_shortcut(self.user, Product, "d")
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(has_perms_shortcut(self.user, self.product, "rw"))
+        self.assertEqual(len(queries), 1)
+        self.assertIn("EXISTS", queries[0]["sql"])
+
+    def test_no_query_with_model_perms(self) -> None:
+        add_perms_shortcut(self.group, Product, "r")
+        with permission_context():
+            has_perms_shortcut(self.user, Product, "d")
+            with self.assertNumQueries(0):
+                self.assertTrue(has_perms_shortcut(self.user, self.product, "r"))
+
+    def test_group_object_perms(self) -> None:
+        add_perms_shortcut(self.group, self.product, "r")
+        self.assertTrue(has_perms_shortcut(self.user, self.product, "r"))
+        self.assertTrue(has_perms_shortcut(self.group, self.product, "r"))
+        self.assertFalse(has_perms_shortcut(self.group, self.product, "rw"))
+
+    def test_mixed_user_and_group_perms(self) -> None:
+        add_perms_shortcut(self.user, self.product, "r")
+        add_perms_shortcut(self.group, self.product, "w")
+        self.assertTrue(has_perms_shortcut(self.user, self.product, "r"))
+        self.assertTrue(has_perms_shortcut(self.user, self.product, "w"))
+        self.assertFalse(has_perms_shortcut(self.user, self.product, "rw"))
+
+    def test_model_perm_completes_object_perm(self) -> None:
+        add_perms_shortcut(self.user, Product, "r")
+        add_perms_shortcut(self.user, self.product, "w")
+        self.assertTrue(has_perms_shortcut(self.user, self.product, "rw"))
+        self.assertFalse(has_perms_shortcut(self.user, Product.objects.create(), "rw"))
+
+    def test_other_object(self) -> None:
+        add_perms_shortcut(self.user, self.product, "r")
+        self.assertFalse(has_perms_shortcut(self.user, Product.objects.create(), "r"))
+
+
+class TestBulkHasPermissions(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.user = get_user_model().objects.create()
+        self.group = UserGroup.objects.create(name="staff")
+        self.user.groups.add(self.group)
+        self.products = [Product.objects.create() for _ in range(4)]
+
+    def test_single_query(self) -> None:
+        add_perms_shortcut(self.user, self.products[0], "w", field_name="brand")
+        add_perms_shortcut(self.group, self.products[1], "w")
+        pks = [product.pk for product in self.products]
+        with permission_context():
+            has_perms_shortcut(self.user, Product, "d")
+            with self.assertNumQueries(1):
+                verdicts = bulk_has_perms(
+                    self.user, Product, pks, "w", field_name="brand"
+                )
+            self.assertEqual(verdicts, dict(zip(pks, [True, True, False, False])))
+            with self.assertNumQueries(0):
+                self.assertTrue(
+                    has_perms_shortcut(
+                        self.user, self.products[0], "w", field_name="brand"
+                    )
+                )
+
+    def test_queryset_of_pks(self) -> None:
+        add_perms_shortcut(self.user, self.products[2], "r")
+        verdicts = bulk_has_perms(self.user, Product, Product.objects.values("pk"), "r")
+        self.assertEqual(len(verdicts), 4)
+        self.assertEqual(
+            [pk for pk, ok in verdicts.items() if ok], [self.products[2].pk]
+        )
+
+    def test_model_perms(self) -> None:
+        add_perms_shortcut(self.user, Product, "r")
+        pks = [product.pk for product in self.products]
+        with permission_context():
+            has_perms_shortcut(self.user, Product, "d")
+            with self.assertNumQueries(0):
+                verdicts = bulk_has_perms(self.user, Product, pks, "r")
+        self.assertTrue(all(verdicts.values()))
+
+    def test_missing_objects_are_denied(self) -> None:
+        pk = self.products[0].pk
+        self.products[0].delete()
+        add_perms_shortcut(self.user, self.products[1], "r")
+        verdicts = bulk_has_perms(self.user, Product, [pk, self.products[1].pk], "r")
+        self.assertEqual(verdicts, {pk: False, self.products[1].pk: True})
+
+    def test_string_pks(self) -> None:
+        add_perms_shortcut(self.user, self.products[0], "r")
+        pks = [self.products[0].pk, str(self.products[0].pk), str(self.products[1].pk)]
+        verdicts = bulk_has_perms(self.user, Product, pks, "r")
+        self.assertEqual(
+            verdicts, {self.products[0].pk: True, self.products[1].pk: False}
+        )
+
+
+class TestPermissionRegistry(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+
+    def test_registered_models_are_preloaded(self) -> None:
+        get_permission_for_model("r", Product, field_name=None)
+        with self.assertNumQueries(0):
+            get_permission_for_model("w", Product, field_name="barcode")
+            get_permission_for_model("w", Brand, field_name="products")
+        self.assertTrue(
+            DCFPermission.objects.filter(
+                model_name="brand", action="delete", field_name="name"
+            ).exists()
+        )
+
+    def test_reloaded_after_clear(self) -> None:
+        read = get_permission_for_model("r", Product, field_name=None)
+        permission_registry.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_permission_for_model("r", Product, field_name=None), read
+            )
+
+    def test_oldest_duplicate_wins(self) -> None:
+        read = get_permission_for_model("r", Product, field_name=None)
+        DCFPermission.objects.create(
+            app_name=read.app_name, model_name=read.model_name, action="read"
+        )
+        permission_registry.clear()
+        self.assertEqual(get_permission_for_model("r", Product, field_name=None), read)
+
+    def test_rolled_back_rows_are_forgotten(self) -> None:
+        # Brand permissions are created by load(), the ones of the unregistered
+        # UserGroup by get()
+        for model in [Brand, UserGroup]:
+            with self.subTest(model=model):
+                DCFPermission.objects.filter(model_name=model._meta.model_name).delete()
+                permission_registry.clear()
+                with self.assertRaises(Rollback):
+                    with transaction.atomic():
+                        rolled_back = get_permission_for_model(
+                            "r", model, field_name=None
+                        )
+                        raise Rollback()
+                perm = get_permission_for_model("r", model, field_name=None)
+                self.assertNotEqual(perm.pk, rolled_back.pk)
+                self.assertTrue(DCFPermission.objects.filter(pk=perm.pk).exists())
+
+    def test_created_rows_are_held_on_commit(self) -> None:
+        DCFPermission.objects.filter(model_name="usergroup").delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            perm = get_permission_for_model("r", UserGroup, field_name=None)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_permission_for_model("r", UserGroup, field_name=None), perm
+            )
+
+
+class Rollback(Exception):
+    pass
+
+
+class TestIdentityRegistry(TestCase):
+    def test_no_query_once_resolved(self) -> None:
+        # identities created in the test are only remembered on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            root = default_users.root
+            anyone = default_groups.anyone
+            anonymous = default_users.anonymous
+        with self.assertNumQueries(0):
+            self.assertEqual(default_users.root, root)
+            self.assertEqual(anyone_group_id(), anyone.pk)
+            self.assertTrue(is_root(root))
+            self.assertFalse(is_root(default_users.anonymous))
+            self.assertEqual(default_users.anonymous, anonymous)
+
+    def test_returns_copies(self) -> None:
+        self.assertIsNot(default_groups.anyone, default_groups.anyone)
+
+    def test_forgotten_on_delete(self) -> None:
+        root = default_users.root
+        root.delete()
+        self.assertNotEqual(default_users.root.pk, root.pk)
+        self.assertFalse(is_root(root))
+
+
+class TestVisibleTo(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.user = get_user_model().objects.create()
+        self.brand = Brand.objects.create(name="brand")
+        self.products = [
+            Product.objects.create(brand=self.brand, priority=i) for i in range(3)
+        ]
+        add_perms_shortcut(self.user, self.products[0], "r")
+        add_perms_shortcut(self.user, self.products[2], "r")
+
+    def test_keeps_queryset_state(self) -> None:
+        queryset = (
+            Product.objects.select_related("brand")
+            .annotate(double_priority=F("priority") * 2)
+            .order_by("-priority")
+            .visible_to(self.user)
+            .filter(priority__gte=0)
+        )
+        with self.assertNumQueries(1):
+            products = list(queryset)
+            self.assertEqual(products, [self.products[2], self.products[0]])
+            self.assertEqual(products[0].double_priority, 4)
+            self.assertEqual(products[0].brand, self.brand)
+
+    def test_lazy(self) -> None:
+        """The object permissions are only read when the queryset is
+        evaluated, and grants added in between are seen."""
+        get_permission_snapshot(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            queryset = Product.objects.visible_to(self.user)
+        self.assertFalse(any("objectpermission" in q["sql"] for q in queries))
+        add_perms_shortcut(self.user, self.products[1], "r")
+        self.assertEqual(set(queryset), set(self.products))
+
+    def test_as_subquery(self) -> None:
+        other = Brand.objects.create(name="other")
+        Product.objects.create(brand=other)
+        brands = Brand.objects.filter(
+            pk__in=Product.objects.visible_to(self.user).values("brand")
+        )
+        self.assertEqual(list(brands), [self.brand])
+
+
+class TestPermittedFields(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.user = get_user_model().objects.create()
+        self.group = UserGroup.objects.create(name="staff")
+        self.user.groups.add(self.group)
+        self.product = Product.objects.create()
+
+    def test_fields_in_one_query(self) -> None:
+        add_perms_shortcut(self.user, self.product, "w", field_name="barcode")
+        add_perms_shortcut(self.group, self.product, "w", field_name="priority")
+        add_perms_shortcut(self.user, Product, "w", field_name="brand")
+        add_perms_shortcut(self.user, self.product, "r", field_name="created_at")
+        with permission_context():
+            has_perms_shortcut(self.user, Product, "d")
+            with self.assertNumQueries(1):
+                fields = get_permitted_fields(self.user, self.product, "w")
+        self.assertFalse(fields.all_fields)
+        self.assertEqual(fields.fields, {"barcode", "priority", "brand"})
+        self.assertNotIn("created_at", fields)
+
+    def test_object_perm_permits_all_fields(self) -> None:
+        add_perms_shortcut(self.group, self.product, "w")
+        fields = get_permitted_fields(self.user, self.product, "w")
+        self.assertTrue(fields.all_fields)
+        self.assertIn("barcode", fields)
+
+    def test_model_perm_permits_all_fields(self) -> None:
+        add_perms_shortcut(default_groups.anyone, Product, "w")
+        with permission_context():
+            has_perms_shortcut(self.user, Product, "d")
+            with self.assertNumQueries(0):
+                self.assertIn("barcode", get_permitted_fields(self.user, self.product))
+
+
+class TestPermissionRules(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        User = get_user_model()
+        self.owner = User.objects.create(username="owner")
+        self.member = User.objects.create(username="member")
+        self.stranger = User.objects.create(username="stranger")
+        self.project = Project.objects.create(owner=self.owner)
+        self.project.members.add(self.member, self.owner)
+        self.other = Project.objects.create(owner=self.stranger)
+
+    def test_nothing_is_stored(self) -> None:
+        self.assertEqual(UserObjectPermission.objects.count(), 0)
+        self.assertEqual(GroupObjectPermission.objects.count(), 0)
+
+    def test_save_resets_nothing(self) -> None:
+        add_perms_shortcut(self.stranger, self.project, "r")
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                self.project.title = "renamed"
+                self.project.save()
+                Project.objects.create(owner=self.owner)
+        self.assertFalse([q for q in queries if "objectpermission" in q["sql"].lower()])
+        self.assertTrue(has_perms_shortcut(self.stranger, self.project, "r"))
+
+    def test_has_perms(self) -> None:
+        self.assertTrue(has_perms_shortcut(self.owner, self.project, "rwd"))
+        self.assertTrue(has_perms_shortcut(self.member, self.project, "r"))
+        self.assertFalse(has_perms_shortcut(self.member, self.project, "w"))
+        self.assertTrue(
+            has_perms_shortcut(self.member, self.project, "w", field_name="title")
+        )
+        self.assertFalse(has_perms_shortcut(self.stranger, self.project, "r"))
+        self.assertFalse(has_perms_shortcut(self.owner, Project, "r"))
+
+    def test_rules_follow_the_object(self) -> None:
+        self.assertFalse(has_perms_shortcut(self.stranger, self.project, "r"))
+        self.project.members.add(self.stranger)
+        self.assertTrue(has_perms_shortcut(self.stranger, self.project, "r"))
+
+    def test_filter_without_duplicates(self) -> None:
+        self.other.members.add(self.member)
+        queryset = filter_queryset_by_perms_shortcut(
+            "r", self.member, Project.objects.all()
+        )
+        self.assertEqual(set(queryset), {self.project, self.other})
+        self.assertEqual(
+            list(
+                filter_queryset_by_perms_shortcut(
+                    "rw", self.owner, Project.objects.all()
+                )
+            ),
+            [self.project],
+        )
+
+    def test_rules_combine_with_object_permissions(self) -> None:
+        add_perms_shortcut(self.member, self.project, "w")
+        self.assertTrue(has_perms_shortcut(self.member, self.project, "rw"))
+        self.assertTrue(
+            has_perms_shortcut(
+                self.member, Project.objects.filter(pk=self.project.pk), "rw"
+            )
+        )
+        self.assertEqual(
+            bulk_has_perms(
+                self.member, Project, [self.project.pk, self.other.pk], "rw"
+            ),
+            {self.project.pk: True, self.other.pk: False},
+        )
+
+    def test_rules_never_apply_to_groups(self) -> None:
+        group = UserGroup.objects.create(name="staff")
+        self.assertFalse(has_perms_shortcut(group, self.project, "r"))
+
+    def test_permitted_fields(self) -> None:
+        self.assertEqual(
+            get_permitted_fields(self.member, self.project, "w").fields, {"title"}
+        )
+        self.assertTrue(get_permitted_fields(self.owner, self.project, "w").all_fields)
+        self.assertFalse(get_permitted_fields(self.stranger, self.project, "w").fields)
+
+    def test_rule_models(self) -> None:
+        self.assertEqual(get_rule_models(Project), {get_user_model(), Team})
+
+    def test_user_placeholder(self) -> None:
+        self.assertEqual(repr(USER), "USER")
+
+    def test_resolve_nested_conditions(self) -> None:
+        members = Project.members.through.objects.filter(
+            project_id=OuterRef("pk"), user_id=self.member.pk
+        )
+        rule = PermissionRule(
+            "r", Q(Exists(members)) | Q(Q(owner__in=[USER]) & ~Q(owner=None))
+        )
+        projects = Project.objects.all()
+        self.assertEqual(set(projects.filter(rule.resolve(self.owner))), {self.project})
+        self.assertEqual(
+            set(projects.filter(rule.resolve(self.stranger))),
+            {self.project, self.other},
+        )
+
+    def test_resolve_unsupported_position(self) -> None:
+        for condition in [
+            Q(owner=Value(USER)),
+            Q(owner=Coalesce(F("owner"), Value(USER))),
+            Q(ExpressionWrapper(Q(owner=USER), output_field=BooleanField())),
+        ]:
+            with self.subTest(condition=condition):
+                with self.assertRaisesRegex(ValueError, "USER is only supported"):
+                    PermissionRule("r", condition).resolve(self.owner)
+
+
+@override_settings(DCF_VISIBILITY_INDEX=["dcf_test_app.Product"])
+class TestVisibilityIndex(TestCase):
+    def setUp(self) -> None:
+        reset_permissions()
+        self.user = get_user_model().objects.create(username="user")
+        self.group = UserGroup.objects.create(name="staff")
+        self.user.groups.add(self.group)
+        self.products = [Product.objects.create(barcode=str(i)) for i in range(4)]
+
+    def visible(self, identity) -> set:
+        return set(
+            filter_queryset_by_perms_shortcut("r", identity, Product.objects.all())
+        )
+
+    def test_filter_uses_the_index(self) -> None:
+        add_perms_shortcut(self.user, self.products[0], "r")
+        add_perms_shortcut(self.group, Product.objects.filter(barcode="1"), "rw")
+        add_perms_shortcut(default_groups.anyone, self.products[2], "r")
+        add_perms_shortcut(self.user, self.products[3], "w")
+        self.assertEqual(ReadVisibility.objects.count(), 3)
+        queryset = filter_queryset_by_perms_shortcut(
+            "r", self.user, Product.objects.all()
+        )
+        self.assertIn("readvisibility", str(queryset.query))
+        self.assertNotIn("objectpermission", str(queryset.query))
+        self.assertEqual(set(queryset), set(self.products[:3]))
+        self.assertEqual(self.visible(self.group), set(self.products[1:3]))
+
+    def test_model_permissions_and_membership(self) -> None:
+        add_perms_shortcut(self.group, self.products[0], "r")
+        self.assertEqual(self.visible(self.user), {self.products[0]})
+        self.user.groups.remove(self.group)
+        self.assertEqual(self.visible(self.user), set())
+        add_perms_shortcut(self.user, Product, "r")
+        self.assertEqual(self.visible(self.user), set(self.products))
+
+    def test_maintained_on_changes(self) -> None:
+        add_perms_shortcut(self.user, Product.objects.all(), "r")
+        remove_perms_shortcut(self.user, Product.objects.filter(barcode="0"), "r")
+        UserObjectPermission.objects.filter(object_pk=self.products[1].pk).delete()
+        GroupObjectPermission.objects.create(
+            group=self.group,
+            permission=get_permission_for_model("r", Product, field_name=None),
+            object_pk=self.products[0].pk,
+        )
+        self.assertEqual(
+            self.visible(self.user), set(self.products[0:1] + self.products[2:])
+        )
+        self.assertEqual(check_visibility_index(), {})
+
+    def test_refreshed_once_per_transaction(self) -> None:
+        perm = get_permission_for_model("r", Product, field_name=None)
+        with CaptureQueriesContext(connection) as queries:
+            for product in self.products:
+                UserObjectPermission.objects.create(
+                    user=self.user, permission=perm, object_pk=product.pk
+                )
+        self.assertFalse(any("readvisibility" in q["sql"] for q in queries))
+        self.assertFalse(any("dcfpermission" in q["sql"] for q in queries))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.visible(self.user), set(self.products))
+        refreshes = [
+            q
+            for q in queries
+            if q["sql"].startswith(
+                'DELETE FROM "django_client_framework_readvisibility"'
+            )
+        ]
+        self.assertEqual(len(refreshes), 1)
+
+    def test_rebuild_and_check(self) -> None:
+        add_perms_shortcut(self.user, Product.objects.all(), "r")
+        ReadVisibility.objects.all().delete()
+        self.assertEqual(
+            check_visibility_index(),
+            {"dcf_test_app.Product": {"missing": 4, "extra": 0}},
+        )
+        with self.assertRaises(CommandError):
+            call_command("check_visibility_index", stdout=StringIO())
+        self.assertEqual(rebuild_visibility_index(), 4)
+        call_command("rebuild_visibility_index", stdout=StringIO())
+        call_command("check_visibility_index", stdout=StringIO())
+        self.assertEqual(self.visible(self.user), set(self.products))
+
+    def test_unindexed_models_are_unaffected(self) -> None:
+        brand = Brand.objects.create()
+        add_perms_shortcut(self.user, brand, "r")
+        self.assertFalse(ReadVisibility.objects.exists())
+        self.assertEqual(
+            list(
+                filter_queryset_by_perms_shortcut("r", self.user, Brand.objects.all())
+            ),
+            [brand],
+        )